@@ -9,8 +9,10 @@ import subprocess
 import argparse
 import zipfile
 import tempfile
-from pathlib import Path
-from typing import List, Tuple, Dict, Optional
+from contextlib import nullcontext
+from typing import List, Tuple, Optional
+
+from zip_index import PDB_SUFFIX, ZipIndex
 
 
 def parse_domain_boundaries(boundary_str: str, level: str) -> List[Tuple[str, List[Tuple[int, int]]]]:
@@ -143,9 +145,14 @@ def process_from_directory(consensus_file: str, pdb_dir: str, output_dir: str) -
     return consensus_count, processed_count, missing_count
 
 
-def process_from_zip(consensus_file: str, pdb_zip: str, output_dir: str) -> Tuple[int, int, int, int]:
+def process_from_zip(consensus_file: str, pdb_zip: str, output_dir: str,
+                     zip_index: Optional[str] = None, index: Optional[ZipIndex] = None) -> Tuple[int, int, int, int]:
     """
     Process PDB files from a zip archive.
+
+    Members are looked up by stem with ZipIndex, from the sidecar index zip_index if given,
+    otherwise from the zip's central directory. An already open ZipIndex of pdb_zip can be
+    passed as index (it is left open).
     
     Returns:
         Tuple of (consensus_count, processed_count, missing_count, error_count)
@@ -155,10 +162,7 @@ def process_from_zip(consensus_file: str, pdb_zip: str, output_dir: str) -> Tupl
     missing_count = 0
     error_count = 0
     
-    with zipfile.ZipFile(pdb_zip, 'r') as zip_ref:
-        # Build lookup dictionary
-        zip_contents: Dict[str, str] = {Path(name).stem: name for name in zip_ref.namelist()}
-        
+    with nullcontext(index) if index is not None else ZipIndex(pdb_zip, zip_index, PDB_SUFFIX) as zip_ref:
         with open(consensus_file, 'r', encoding='utf-8') as f:
             for line_num, line in enumerate(f, start=1):
                 line = line.strip()
@@ -182,14 +186,14 @@ def process_from_zip(consensus_file: str, pdb_zip: str, output_dir: str) -> Tupl
                     error_count += 1
                     continue
                 
-                if pdb_id not in zip_contents:
+                if pdb_id not in zip_ref:
                     print(f"⚠️  PDB not found in zip: {pdb_id}.pdb", file=sys.stderr)
                     missing_count += 1
                     continue
                 
                 try:
                     # Extract PDB content from zip (in memory)
-                    pdb_bytes = zip_ref.read(zip_contents[pdb_id])
+                    pdb_bytes = zip_ref.read(pdb_id)
                     pdb_content = pdb_bytes.decode('utf-8', errors='replace')
                     
                     # Combine and sort all domains
@@ -242,6 +246,8 @@ Examples:
                         help='Zip file containing PDB files')
     parser.add_argument('--output', '-o',
                         help='Output directory for chopped domain PDB files')
+    parser.add_argument('--zip-index',
+                        help='Sidecar index of the zip archive (see zip_index.py)')
     
     # Support legacy positional arguments for backward compatibility
     parser.add_argument('legacy_consensus', nargs='?',
@@ -279,7 +285,7 @@ Examples:
     # Process based on input type
     if use_zip:
         consensus_count, processed_count, missing_count, error_count = process_from_zip(
-            consensus_file, pdb_source, output_dir
+            consensus_file, pdb_source, output_dir, args.zip_index
         )
         print(f"✓ Processed {consensus_count} consensus entries, generated {processed_count} domain files")
         if missing_count > 0:
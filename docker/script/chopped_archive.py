@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Archives of chopped domain PDB files, the intermediate passed from chop_pdb_from_zip to the
+domain analyses.
+
+Four formats are supported, chosen with params.chopped_format:
+
+    tar.gz   gzip-compressed tar (default; single-threaded gzip on both sides)
+    tar      uncompressed tar: no compression cost, larger files on the shared filesystem
+    tar.zst  zstd-compressed tar, compressed with --threads workers; decompresses several
+             times faster than gzip at a similar size
+    zip      deflated zip: the central directory is a member index (see zip_index.py), so
+             members can be read individually without decompressing the rest
+
+Every archive is written deterministically (members sorted by name, fixed timestamps and
+owners), so resumed and repeated runs produce identical files. The shell consumers extract
+them with `tar -xf` (GNU tar detects gzip and zstd) or `unzip`; the Python consumers read
+members in memory with iter_members.
+
+Usage:
+    chopped_archive.py pack --input chopped_pdbs --output chunk_chopped_pdbs.tar.zst [--threads 4] [--level 3]
+    chopped_archive.py unpack --input chunk_chopped_pdbs.tar.zst --outdir pdb
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tarfile
+import zipfile
+
+from zip_index import ZipIndex
+
+FORMATS = ("tar.gz", "tar", "tar.zst", "zip")
+SUFFIXES = {
+    ".tar.gz": "tar.gz",
+    ".tgz": "tar.gz",
+    ".tar": "tar",
+    ".tar.zst": "tar.zst",
+    ".tzst": "tar.zst",
+    ".zip": "zip",
+}
+# GNU tar options for a reproducible archive (as chop_pdb_from_zip has always used)
+TAR_OPTIONS = ["--sort=name", "--mtime=UTC 1970-01-01", "--owner=0", "--group=0", "--numeric-owner"]
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+DEFAULT_LEVELS = {"tar.gz": 6, "tar.zst": 3, "zip": 6}
+
+
+def archive_format(path):
+    """Returns the format of an archive from its file name, or None if it is not a chopped archive."""
+    for suffix, fmt in SUFFIXES.items():
+        if path.endswith(suffix):
+            return fmt
+    return None
+
+
+def _run_pipeline(producer, consumer):
+    """Runs producer | consumer and raises CalledProcessError if either fails."""
+    first = subprocess.Popen(producer, stdout=subprocess.PIPE)
+    second = subprocess.run(consumer, stdin=first.stdout)
+    first.stdout.close()
+    if first.wait() != 0:
+        raise subprocess.CalledProcessError(first.returncode, producer)
+    second.check_returncode()
+
+
+def pack(input_dir, archive, threads=1, level=None):
+    """
+    Writes the files of a directory to an archive, in the format given by its file name.
+
+    Args:
+        input_dir: Directory of chopped PDB files.
+        archive: Output archive (.tar.gz, .tar, .tar.zst or .zip).
+        threads: zstd compression threads (tar.zst only).
+        level: Compression level, or None for the format default.
+
+    Returns:
+        Number of files written.
+    """
+    fmt = archive_format(archive)
+    if fmt is None:
+        raise ValueError(f"Unsupported archive (expected one of {', '.join(SUFFIXES)}): {archive}")
+    level = level if level is not None else DEFAULT_LEVELS.get(fmt)
+    names = sorted(name for name in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, name)))
+
+    if fmt == "zip":
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED, compresslevel=level) as zf:
+            for name in names:
+                info = zipfile.ZipInfo(name, date_time=ZIP_DATE_TIME)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.external_attr = 0o644 << 16
+                with open(os.path.join(input_dir, name), "rb") as f:
+                    zf.writestr(info, f.read(), compresslevel=level)
+        return len(names)
+
+    tar = ["tar"] + TAR_OPTIONS + ["-C", input_dir]
+    if fmt == "tar":
+        subprocess.run(tar + ["-cf", archive, "."], check=True)
+    elif fmt == "tar.gz":
+        subprocess.run(tar + ["-I", f"gzip -n -{level}", "-cf", archive, "."], check=True)
+    else:
+        _run_pipeline(tar + ["-cf", "-", "."], ["zstd", "-q", "-f", f"-T{threads}", f"-{level}", "-o", archive])
+    return len(names)
+
+
+def iter_members(archive, suffix=".pdb"):
+    """
+    Yields (file name, contents) for every member of an archive whose name ends with suffix.
+
+    Tars are read as a stream, so the archive is decompressed once (tar.zst through `zstd -dc`);
+    zip members are read directly at their offsets from the central directory.
+    """
+    fmt = archive_format(archive)
+    if fmt == "zip":
+        with ZipIndex(archive) as zf:
+            for i, name in enumerate(zf.names()):
+                if name.endswith(suffix) and not name.endswith("/"):
+                    yield os.path.basename(name), zf.read_at(i)
+        return
+    if fmt is None:
+        raise ValueError(f"Unsupported archive (expected one of {', '.join(SUFFIXES)}): {archive}")
+
+    process = None
+    if fmt == "tar.zst":
+        process = subprocess.Popen(["zstd", "-dcq", archive], stdout=subprocess.PIPE)
+        tar = tarfile.open(fileobj=process.stdout, mode="r|")
+    else:
+        tar = tarfile.open(archive, "r|*")
+    try:
+        for member in tar:
+            if member.isfile() and member.name.endswith(suffix):
+                yield os.path.basename(member.name), tar.extractfile(member).read()
+    finally:
+        tar.close()
+        if process is not None:
+            process.stdout.close()
+            if process.wait() != 0:
+                raise subprocess.CalledProcessError(process.returncode, process.args)
+
+
+def unpack(archive, outdir):
+    """Extracts an archive into outdir (created if needed) and returns the number of files."""
+    os.makedirs(outdir, exist_ok=True)
+    count = 0
+    for name, data in iter_members(archive, suffix=""):
+        with open(os.path.join(outdir, name), "wb") as out:
+            out.write(data)
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack and unpack archives of chopped domain PDB files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pack_parser = subparsers.add_parser("pack", help="Write a directory of PDB files to an archive")
+    pack_parser.add_argument("--input", required=True, help="Directory of chopped PDB files")
+    pack_parser.add_argument("--output", required=True, help=f"Output archive ({', '.join(SUFFIXES)})")
+    pack_parser.add_argument("--threads", type=int, default=1, help="zstd compression threads (default: 1)")
+    pack_parser.add_argument("--level", type=int, default=None,
+                             help="Compression level (default: 6 for gzip and zip, 3 for zstd)")
+
+    unpack_parser = subparsers.add_parser("unpack", help="Extract an archive")
+    unpack_parser.add_argument("--input", required=True, help="Archive to extract")
+    unpack_parser.add_argument("--outdir", required=True, help="Output directory")
+
+    args = parser.parse_args()
+    if args.command == "pack":
+        count = pack(args.input, args.output, args.threads, args.level)
+        print(f"Packed {count} files into '{args.output}'", file=sys.stderr)
+    else:
+        count = unpack(args.input, args.outdir)
+        print(f"Extracted {count} files to '{args.outdir}'", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
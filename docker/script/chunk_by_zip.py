@@ -2,61 +2,278 @@
 
 import os
 import argparse
+import itertools
+import math
+import tempfile
+from array import array
 from collections import defaultdict
 
+import numpy as np
+
+from external_sort import external_sort
+
 # Usage:
 # python3 chunk_by_zip.py \
-#    --input_file   tsv file containing pdb id and zip file name \
+#    --input_file   tsv file containing pdb id, zip file name and (optionally) residue count \
 #    --chunk_size   numeric chunk size \
 #    --outdir       directory for output file \
-#    --file_list    output mapping.tsv
+#    --file_list    output mapping.tsv \
+#    [--cost_model count|poly --cost_coefficients c0,c1,c2] \
+#    [--giant_residues N --giant_chunk_size M --giant_file_list giant_mapping.tsv] \
+#    [--max_memory_mb MB] \
+#    [--plan]
+#
+# With --cost_model count (default) every zip is cut into slices of chunk_size ids.
+# With --cost_model poly each chain costs c0 + c1*n + c2*n^2 for n residues (third input
+# column), and every zip is cut into the same number of chunks as the count model would
+# give, but with roughly equal predicted cost. Chunks stay contiguous in sorted id order.
+#
+# With --giant_residues N, chains with more than N residues are taken out of the normal
+# chunks and written to chunks of --giant_chunk_size ids listed in --giant_file_list (same
+# format, chunk ids continue after the normal chunks), so they can run with more memory.
+#
+# With --max_memory_mb the input is sorted in bounded memory (sorted runs spilled to disk,
+# then a k-way merge streamed zip by zip, see external_sort.py). The output is identical.
+#
+# With --plan no chunk files are written: all ids go into one file, <outdir>/chunk_plan.ids,
+# and every mapping row points at it with two extra columns, byte_offset and length, so a
+# task reads only its own slice (tail -c +<byte_offset + 1> | head -c <length>).
+
+
+def count_cost(residues, coefficients):
+    """Every chain costs the same, so chunks hold chunk_size ids."""
+    return np.ones(len(residues))
+
+
+def poly_cost(residues, coefficients):
+    """Polynomial in the residue count: c0 + c1*n + c2*n^2 + ..."""
+    return np.polynomial.polynomial.polyval(residues, coefficients)
+
+
+COST_MODELS = {
+    "count": count_cost,
+    "poly": poly_cost,
+}
+
+
+def parse_coefficients(text):
+    return [float(c) for c in text.split(",") if c.strip()]
 
-parser = argparse.ArgumentParser()
 
-parser.add_argument("--input_file", required=True)
-parser.add_argument("--chunk_size", type=int, required=True)
-parser.add_argument("--outdir", required=True)
-parser.add_argument("--file_list", required=True)
+def residue_array(residue_counts):
+    """Returns residue counts as floats, filling unknown (None or NaN) counts with the mean of the known ones."""
+    residues = np.array(residue_counts, dtype=np.float64)
+    unknown = np.isnan(residues)
+    residues[unknown] = residues[~unknown].mean() if (~unknown).any() else 0.0
+    return residues
 
-args = parser.parse_args()
 
-input_file = args.input_file
-chunk_size = args.chunk_size
-outdir = args.outdir
-file_list = args.file_list
+def split_by_cost(costs, n_chunks):
+    """
+    Splits ids (already sorted) into at most n_chunks contiguous runs of roughly equal total cost.
 
-os.makedirs(outdir, exist_ok=True)
+    Args:
+        costs: Predicted cost per id.
+        n_chunks: Number of chunks to aim for.
 
-# Read all IDs and group them by zip file
-ids_by_zip = defaultdict(list)
+    Returns:
+        List of (start, end) index pairs.
+    """
+    total = costs.sum()
+    if n_chunks <= 1 or total <= 0:
+        return [(0, len(costs))]
+    # each id goes to the chunk that contains the midpoint of its cost interval
+    midpoints = np.cumsum(costs) - costs / 2
+    chunk_of = np.minimum((midpoints / total * n_chunks).astype(np.int64), n_chunks - 1)
+    bounds = np.flatnonzero(np.diff(chunk_of)) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [len(costs)]))
+    return list(zip(starts.tolist(), ends.tolist()))
 
-with open(input_file) as f:
-    for line in f:
-        line = line.strip()
-        if not line:
-            continue
 
-        pdb_id, zip_name = line.split("\t")
-        ids_by_zip[zip_name].append(pdb_id)
+def plan_chunks(residue_counts, chunk_size, cost_model="count", coefficients=(0.0, 1.0)):
+    """
+    Returns (start, end) index ranges over the sorted ids of one zip.
 
-# Write chunk files and file_list
-chunk_id = 0
+    Args:
+        residue_counts: Residue count per sorted id (None or NaN if unknown).
+        chunk_size: Ids per chunk for the count model; sets the number of chunks for other models.
+        cost_model: Name of a model in COST_MODELS (zips without residue counts use the count model).
+        coefficients: Coefficients passed to the cost model.
+    """
+    n_ids = len(residue_counts)
+    residues = np.array(residue_counts, dtype=np.float64)
+    if cost_model == "count" or np.isnan(residues).all():
+        return [(start, min(start + chunk_size, n_ids)) for start in range(0, n_ids, chunk_size)]
+    n_chunks = -(-n_ids // chunk_size)
+    costs = COST_MODELS[cost_model](residue_array(residues), coefficients)
+    return split_by_cost(np.maximum(costs, 0.0), n_chunks)
 
-with open(file_list, "w") as mapping:
-    mapping.write("chunk_id\tchunk_file\tzip_name\n")
+
+def is_giant(residues, giant_residues):
+    return giant_residues > 0 and residues is not None and residues > giant_residues
+
+
+def zips_in_memory(input_file, giant_residues):
+    """
+    Yields (zip_name, ids, residue counts, giant ids) per zip in sorted order, holding every id in memory.
+    """
+    # Read all IDs and group them by zip file; the optional third column is the residue count
+    ids_by_zip = defaultdict(dict)
+
+    with open(input_file) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            fields = line.split("\t")
+            pdb_id, zip_name = fields[0], fields[1]
+            residues = int(fields[2]) if len(fields) > 2 and fields[2] else None
+            if residues is not None or pdb_id not in ids_by_zip[zip_name]:
+                ids_by_zip[zip_name][pdb_id] = residues
 
     for zip_name in sorted(ids_by_zip):
-        ids = sorted(set(ids_by_zip[zip_name]))
+        residues_by_id = ids_by_zip[zip_name]
+        ids = sorted(pdb_id for pdb_id in residues_by_id if not is_giant(residues_by_id[pdb_id], giant_residues))
+        giants = sorted(pdb_id for pdb_id in residues_by_id if is_giant(residues_by_id[pdb_id], giant_residues))
+        yield zip_name, ids, [residues_by_id[pdb_id] for pdb_id in ids], giants
+
+
+def _sort_key(line):
+    zip_name, pdb_id, _ = line.split("\t", 2)
+    return zip_name, pdb_id
+
+
+def zips_external(input_file, giant_residues, max_memory_mb, tmp_dir=None):
+    """
+    Yields the same as zips_in_memory, but sorts with spilled runs and a k-way merge. The ids of
+    the zip being yielded are spooled to disk, so only its residue counts (8 bytes per id) and
+    giant ids are held in memory.
+    """
+    def lines():
+        with open(input_file) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                fields = line.split("\t")
+                residues = fields[2] if len(fields) > 2 else ""
+                yield f"{fields[1]}\t{fields[0]}\t{residues}"
+
+    merged = external_sort(lines(), key=_sort_key, max_memory_mb=max_memory_mb, tmp_dir=tmp_dir)
+    for zip_name, zip_lines in itertools.groupby(merged, key=lambda line: line.split("\t", 1)[0]):
+        residue_counts = array("d")
+        giants = []
+        with tempfile.TemporaryFile("w+", dir=tmp_dir) as spool:
+            for pdb_id, id_lines in itertools.groupby(zip_lines, key=lambda line: line.split("\t", 2)[1]):
+                # duplicates are adjacent and in input order; as in memory, the last known residue count wins
+                residues = None
+                for line in id_lines:
+                    value = line.split("\t", 2)[2]
+                    if value:
+                        residues = int(value)
+                if is_giant(residues, giant_residues):
+                    giants.append(pdb_id)
+                    continue
+                spool.write(pdb_id + "\n")
+                residue_counts.append(math.nan if residues is None else residues)
+            spool.seek(0)
+            yield zip_name, (line[:-1] for line in spool), residue_counts, giants
+
+
+PLAN_FILE = "chunk_plan.ids"
+MAPPING_HEADER = "chunk_id\tchunk_file\tzip_name\n"
+PLAN_MAPPING_HEADER = "chunk_id\tchunk_file\tzip_name\tbyte_offset\tlength\n"
+
+
+def write_chunk(mapping, outdir, chunk_id, zip_name, chunk_ids, plan=None):
+    """Writes one chunk (its own file, or a slice of the open binary plan file) and its mapping row."""
+    if plan is not None:
+        offset = plan.tell()
+        for pdb_id in chunk_ids:
+            plan.write(pdb_id.encode() + b"\n")
+        mapping.write(f"{chunk_id}\t{plan.name}\t{zip_name}\t{offset}\t{plan.tell() - offset}\n")
+        return
+
+    zip_stem = os.path.basename(zip_name).replace(".zip", "")
+    chunk_file = f"{outdir}/{zip_stem}_ids_mapping.{chunk_id}.txt"
+
+    with open(chunk_file, "w") as out:
+        for pdb_id in chunk_ids:
+            out.write(pdb_id + "\n")
+
+    mapping.write(f"{chunk_id}\t{chunk_file}\t{zip_name}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--input_file", required=True)
+    parser.add_argument("--chunk_size", type=int, required=True)
+    parser.add_argument("--outdir", required=True)
+    parser.add_argument("--file_list", required=True)
+    parser.add_argument("--cost_model", choices=sorted(COST_MODELS), default="count",
+                        help="Per-chain cost used to balance chunks (default: count)")
+    parser.add_argument("--cost_coefficients", type=parse_coefficients, default=[0.0, 1.0],
+                        help="Comma separated polynomial coefficients c0,c1,c2,... in residue count (poly model)")
+    parser.add_argument("--giant_residues", type=int, default=0,
+                        help="Chains with more residues than this go to the giant lane (default: 0, disabled)")
+    parser.add_argument("--giant_chunk_size", type=int, default=1, help="Ids per giant chunk (default: 1)")
+    parser.add_argument("--giant_file_list", default=None, help="Output mapping for giant chunks")
+    parser.add_argument("--max_memory_mb", type=int, default=0,
+                        help="Sort with at most this much buffer, spilling sorted runs to disk (default: 0, in memory)")
+    parser.add_argument("--tmp_dir", default=None, help="Directory for spilled runs (default: system temp)")
+    parser.add_argument("--plan", action="store_true",
+                        help=f"Write all ids to <outdir>/{PLAN_FILE} and index chunks by byte offset")
+
+    args = parser.parse_args()
+    if args.giant_residues > 0 and not args.giant_file_list:
+        parser.error("--giant_residues requires --giant_file_list")
+
+    input_file = args.input_file
+    chunk_size = args.chunk_size
+    outdir = args.outdir
+    file_list = args.file_list
+
+    os.makedirs(outdir, exist_ok=True)
+
+    if args.max_memory_mb:
+        zips = zips_external(input_file, args.giant_residues, args.max_memory_mb, args.tmp_dir)
+    else:
+        zips = zips_in_memory(input_file, args.giant_residues)
+
+    # Write chunk files and file_list; giant chunks are numbered after all the normal chunks
+    giants_by_zip = {}
+    chunk_id = 0
+    plan = open(os.path.join(outdir, PLAN_FILE), "wb") if args.plan else None
+    header = PLAN_MAPPING_HEADER if args.plan else MAPPING_HEADER
+
+    with open(file_list, "w") as mapping:
+        mapping.write(header)
+
+        for zip_name, ids, residue_counts, giants in zips:
+            if giants:
+                giants_by_zip[zip_name] = giants
+            ids = iter(ids)
+
+            for start, end in plan_chunks(residue_counts, chunk_size, args.cost_model, args.cost_coefficients):
+                write_chunk(mapping, outdir, chunk_id, zip_name, itertools.islice(ids, end - start), plan)
+                chunk_id += 1
+
+    if args.giant_file_list:
+        with open(args.giant_file_list, "w") as mapping:
+            mapping.write(header)
 
-        for start in range(0, len(ids), chunk_size):
-            chunk_ids = ids[start:start + chunk_size]
+            for zip_name in sorted(giants_by_zip):
+                ids = giants_by_zip[zip_name]
 
-            zip_stem = os.path.basename(zip_name).replace(".zip", "")
-            chunk_file = f"{outdir}/{zip_stem}_ids_mapping.{chunk_id}.txt"
+                for start in range(0, len(ids), args.giant_chunk_size):
+                    write_chunk(mapping, outdir, chunk_id, zip_name, ids[start:start + args.giant_chunk_size], plan)
+                    chunk_id += 1
 
-            with open(chunk_file, "w") as out:
-                for pdb_id in chunk_ids:
-                    out.write(pdb_id + "\n")
+    if plan is not None:
+        plan.close()
 
-            mapping.write(f"{chunk_id}\t{chunk_file}\t{zip_name}\n")
-            chunk_id += 1
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,22 @@
 
 import os
 import argparse
+import itertools
 from collections import defaultdict
 
+from external_sort import external_sort
+
 # Usage:
 # python3 chunk_consensus_by_zip.py \
 #   --consensus_file  output from consensus chopping channel \
 #   --chunk_size      numeric light_chunk_size \
 #   --outdir          directory for output file \
-#   --file_list       light_chunk_mapping.tsv
+#   --file_list       light_chunk_mapping.tsv \
+#   [--max_memory_mb  MB]
+#
+# With --max_memory_mb the rows are grouped by zip in bounded memory (a stable sort on the
+# zip name with sorted runs spilled to disk and a k-way merge, see external_sort.py), so rows
+# keep their input order within each zip and the output is identical to the in-memory mode.
 
 parser = argparse.ArgumentParser()
 
@@ -17,6 +25,8 @@ parser.add_argument("--consensus_file", required=True)
 parser.add_argument("--chunk_size", type=int, required=True)
 parser.add_argument("--outdir", required=True)
 parser.add_argument("--file_list", required=True)
+parser.add_argument("--max_memory_mb", type=int, default=0)
+parser.add_argument("--tmp_dir", default=None)
 
 args = parser.parse_args()
 
@@ -28,32 +38,55 @@ file_list = args.file_list
 
 # Make sure the output directory exists.
 os.makedirs(outdir, exist_ok=True)
-rows_by_zip = defaultdict(list)
-
-# Input rows are:
-# consensus_col1<TAB>consensus_col2<...><TAB>zip_name
-with open(args.consensus_file) as f:
-    for line in f:
-        line = line.rstrip("\n")
-        if not line.strip():
-            continue
-        fields = line.split("\t")
-        if len(fields) < 2:
-            raise ValueError(f"Invalid consensus_file row: {line}")
-        zip_name = fields[-1]
-        consensus_row = "\t".join(fields[:-1])
+
+
+def read_rows(consensus_file):
+    """Yields (zip_name, consensus_row) in input order."""
+    # Input rows are:
+    # consensus_col1<TAB>consensus_col2<...><TAB>zip_name
+    with open(consensus_file) as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            fields = line.split("\t")
+            if len(fields) < 2:
+                raise ValueError(f"Invalid consensus_file row: {line}")
+            yield fields[-1], "\t".join(fields[:-1])
+
+
+def rows_in_memory(consensus_file):
+    """Yields (zip_name, rows) per zip in sorted zip order, holding every row in memory."""
+    rows_by_zip = defaultdict(list)
+    for zip_name, consensus_row in read_rows(consensus_file):
         rows_by_zip[zip_name].append(consensus_row)
+    for zip_name in sorted(rows_by_zip):
+        yield zip_name, rows_by_zip[zip_name]
+
+
+def rows_external(consensus_file, max_memory_mb, tmp_dir=None):
+    """Yields the same as rows_in_memory, streaming the rows of each zip from a k-way merge."""
+    lines = (f"{zip_name}\t{row}" for zip_name, row in read_rows(consensus_file))
+    merged = external_sort(lines, key=lambda line: line.split("\t", 1)[0], max_memory_mb=max_memory_mb, tmp_dir=tmp_dir)
+    for zip_name, zip_lines in itertools.groupby(merged, key=lambda line: line.split("\t", 1)[0]):
+        yield zip_name, (line.split("\t", 1)[1] for line in zip_lines)
+
+
+if args.max_memory_mb:
+    zips = rows_external(consensus_file, args.max_memory_mb, args.tmp_dir)
+else:
+    zips = rows_in_memory(consensus_file)
+
 chunk_id = 0
 with open(args.file_list, "w") as mapping:
     mapping.write("chunk_id\tchunk_file\tzip_name\n")
 
-    for zip_name in sorted(rows_by_zip):
-        rows = rows_by_zip[zip_name]
+    for zip_name, rows in zips:
+        rows = iter(rows)
 
         zip_stem = os.path.basename(zip_name).replace(".zip", "")
 
-        for start in range(0, len(rows), args.chunk_size):
-            chunk_rows = rows[start:start + args.chunk_size]
+        for chunk_rows in iter(lambda: list(itertools.islice(rows, args.chunk_size)), []):
 
             chunk_file = f"{args.outdir}/{zip_stem}_consensus_chunks.{chunk_id}.tsv"
 
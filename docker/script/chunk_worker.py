@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Long-lived worker that runs many light per-chunk jobs in one process.
+
+Each of filter_pdb_from_zip, chop_pdb_from_zip, create_md5_batch and run_plddt normally
+starts a container and a Python interpreter for every chunk, which for small chunks costs
+more than the work itself. The worker reads a list of jobs (JSON lines), imports the
+scripts once and runs the jobs one after the other in the same process, keeping the
+ZipIndex of every input zip open (up to --max_open_zips, least recently used closed first),
+so chunks of the same zip do not re-read its central directory or sidecar index.
+
+Every job writes the same files, with the same names and contents, as its per-chunk
+process, into its own output directory ("outdir", default: the job id). The outputs are
+written to a temporary directory next to it that is renamed into place when the job has
+finished, so an output directory is always complete; jobs whose output directory already
+exists are skipped (unless --force), so a worker can be rerun after a failure.
+
+Jobs (one JSON object per line; paths relative to the working directory):
+
+    {"task": "filter", "id": "3", "pdb_zip": "a.zip", "zip_index": "a.zidx", "id_file": "chunk_3.txt",
+     "id_slice": [offset, length], "min_residues": 48, "min_mean_plddt": 0, "plddt_cutoff": 70,
+     "min_fraction_above": 0, "coordinate_hash": false, "cpus": 1}
+        -> filtered_ids.txt, residue_counts.tsv, filter_reasons.tsv, no_domains.tsv
+    {"task": "chop", "id": "3_1", "consensus": "3_1.tsv", "pdb_zip": "a.zip", "zip_index": null,
+     "format": "tar.gz", "level": null, "threads": 1}
+        -> <id>_chopped_pdbs.<format>
+    {"task": "md5", "id": "3_1", "archive": "3_1_chopped_pdbs.tar.gz", "chain": "A", "cpus": 1}
+        -> output_<id>.tsv
+    {"task": "plddt", "id": "3_1", "archive": "3_1_chopped_pdbs.tar.gz"}
+        -> domain_avg_plddt.tsv
+
+Only "task" and "id" and the inputs are required; the other fields default as in the
+per-chunk processes. id_slice selects the ids of a chunk from a single-file chunk plan.
+
+Usage:
+    chunk_worker.py --jobs jobs.jsonl [--max_open_zips 8] [--force]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import chop_pdbs
+import filter_chains
+from chopped_archive import pack
+from fetch_avg_plDDT import write_avg_plddt
+from pdb_to_md5 import batch_md5
+from zip_index import PDB_SUFFIX, ZipIndex
+
+
+class IndexCache:
+    """
+    Open ZipIndex objects of the .pdb members of input zips, keyed by (zip, sidecar index),
+    closing the least recently used beyond max_open.
+    """
+
+    def __init__(self, max_open=8):
+        self.max_open = max_open
+        self._indexes = OrderedDict()
+
+    def get(self, pdb_zip, zip_index=None):
+        key = (os.path.realpath(pdb_zip), zip_index and os.path.realpath(zip_index))
+        if key in self._indexes:
+            self._indexes.move_to_end(key)
+            return self._indexes[key]
+        index = ZipIndex(pdb_zip, zip_index, PDB_SUFFIX)
+        self._indexes[key] = index
+        while len(self._indexes) > self.max_open:
+            _, oldest = self._indexes.popitem(last=False)
+            oldest.close()
+        return index
+
+    def close(self):
+        while self._indexes:
+            self._indexes.popitem()[1].close()
+
+
+def read_chunk_ids(id_file, id_slice=None):
+    """Returns the ids of a chunk file, or of the [offset, length] byte slice of a chunk plan."""
+    if not id_slice:
+        return filter_chains.read_ids(id_file)
+    offset, length = id_slice
+    with open(id_file, "rb") as f:
+        f.seek(offset)
+        text = f.read(length).decode()
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def run_filter(job, outdir, indexes):
+    prescreen = None
+    min_mean_plddt = job.get("min_mean_plddt", 0)
+    min_fraction_above = job.get("min_fraction_above", 0)
+    if min_mean_plddt > 0 or min_fraction_above > 0:
+        prescreen = (min_mean_plddt, job.get("plddt_cutoff", 70), min_fraction_above)
+    cpus = job.get("cpus", 1)
+    # worker pools open their own handles, so the cached index is only used in this process
+    index = indexes.get(job["pdb_zip"], job.get("zip_index")) if cpus <= 1 else None
+    results = filter_chains.filter_chains(
+        job["pdb_zip"], read_chunk_ids(job["id_file"], job.get("id_slice")), job["min_residues"],
+        job.get("zip_index"), cpus, prescreen, job.get("coordinate_hash", False), index=index,
+    )
+    tally = filter_chains.write_outputs(
+        results,
+        os.path.join(outdir, "filtered_ids.txt"),
+        os.path.join(outdir, "residue_counts.tsv"),
+        os.path.join(outdir, "filter_reasons.tsv"),
+        os.path.join(outdir, "no_domains.tsv"),
+    )
+    return ", ".join(f"{reason}: {count}" for reason, count in sorted(tally.items())) or "No ids"
+
+
+def run_chop(job, outdir, indexes):
+    fmt = job.get("format", "tar.gz")
+    # a plain directory as in chop_pdb_from_zip, so the archive's root entry has the same mode
+    chopped_dir = os.path.join(outdir, "chopped_pdbs")
+    os.makedirs(chopped_dir)
+    consensus_count, processed_count, missing_count, error_count = chop_pdbs.process_from_zip(
+        job["consensus"], job["pdb_zip"], chopped_dir, job.get("zip_index"),
+        index=indexes.get(job["pdb_zip"], job.get("zip_index")),
+    )
+    # the same failure conditions as chop_pdbs.py
+    if error_count > 0 or (processed_count == 0 and missing_count > 0):
+        raise RuntimeError(f"{error_count} errors, {missing_count} PDB files not found in zip")
+    pack(chopped_dir, os.path.join(outdir, f"{job['id']}_chopped_pdbs.{fmt}"), job.get("threads", 1),
+         job.get("level"))
+    shutil.rmtree(chopped_dir)
+    return f"{consensus_count} consensus entries, {processed_count} domain files"
+
+
+def run_md5(job, outdir, indexes):
+    count = batch_md5(job["archive"], os.path.join(outdir, f"output_{job['id']}.tsv"), chain=job.get("chain", "A"),
+                      cpus=job.get("cpus", 1))
+    return f"{count} sequence md5s"
+
+
+def run_plddt(job, outdir, indexes):
+    count = write_avg_plddt(job["archive"], os.path.join(outdir, "domain_avg_plddt.tsv"))
+    return f"{count} domains"
+
+
+TASKS = {"filter": run_filter, "chop": run_chop, "md5": run_md5, "plddt": run_plddt}
+
+
+def run_job(job, indexes, force=False):
+    """
+    Runs one job into its output directory, atomically. Returns False if it was skipped
+    because the output directory exists.
+    """
+    if job.get("task") not in TASKS:
+        raise ValueError(f"Unknown task {job.get('task')!r} (expected one of {', '.join(TASKS)})")
+    outdir = job.get("outdir") or str(job["id"])
+    if os.path.exists(outdir):
+        if not force:
+            return False
+        shutil.rmtree(outdir)
+
+    parent = os.path.dirname(os.path.abspath(outdir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(outdir)}.", dir=parent)
+    # mkdtemp creates the directory private (0700); give it the mode of a directory made with mkdir
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(tmp_dir, 0o777 & ~umask)
+    try:
+        summary = TASKS[job["task"]](job, tmp_dir, indexes)
+        os.replace(tmp_dir, outdir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    print(f"{job['task']} {job['id']}: {summary}", file=sys.stderr)
+    return True
+
+
+def read_jobs(jobs_file):
+    """Reads one JSON job per line, skipping blank lines."""
+    with open(jobs_file) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many per-chunk jobs (filter, chop, md5, plddt) in one process.")
+    parser.add_argument("--jobs", required=True, help="Jobs, one JSON object per line")
+    parser.add_argument("--max_open_zips", type=int, default=8,
+                        help="Zip indexes kept open between jobs (default: 8)")
+    parser.add_argument("--force", action="store_true", help="Rerun jobs whose output directory exists")
+    args = parser.parse_args()
+
+    jobs = read_jobs(args.jobs)
+    indexes = IndexCache(args.max_open_zips)
+    start = time.perf_counter()
+    done, skipped, failed = 0, 0, []
+    try:
+        for job in jobs:
+            try:
+                if run_job(job, indexes, args.force):
+                    done += 1
+                else:
+                    skipped += 1
+            except Exception as e:
+                print(f"ERROR: {job.get('task')} {job.get('id')}: {e}", file=sys.stderr)
+                failed.append(str(job.get("id")))
+    finally:
+        indexes.close()
+
+    print(f"Ran {done} jobs, skipped {skipped} with existing outputs, {len(failed)} failed "
+          f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    if failed:
+        print(f"Failed jobs: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
+import itertools
+
 import click
-import pandas as pd
+
+from tsv_io import is_missing, read_rows, write_rows
 
 MERIZO_COLS = "af_chain_id md5 nres ndom result score".split()
 UNIDOC_COLS = "af_chain_id md5 nres ndom result score".split()
@@ -42,44 +45,38 @@ OUTPUT_COLS = {
 )
 def run(merizo_file, unidoc_file, chainsaw_file, output_file):
 
-    # read merizo results
-    merizo_df = pd.read_csv(merizo_file, sep="\t", header=None, names=MERIZO_COLS)
-    merizo_df = normalise_df(merizo_df)
-    merizo_df.rename(columns={"result": "result_merizo"}, inplace=True)
+    # read results
+    merizo = read_results(merizo_file, MERIZO_COLS)
+    unidoc = read_results(unidoc_file, UNIDOC_COLS)
+    chainsaw = read_results(chainsaw_file, CHAINSAW_COLS)
 
-    # read unidoc results
-    unidoc_df = pd.read_csv(unidoc_file, sep="\t", header=None, names=UNIDOC_COLS)
-    unidoc_df = normalise_df(unidoc_df)
-    unidoc_df.rename(columns={"result": "result_unidoc"}, inplace=True)
+    # merge results (outer join on af_chain_id), sorted by af_chain_id for deterministic output
+    rows = []
+    for af_chain_id in sorted(set(merizo) | set(unidoc) | set(chainsaw)):
+        for result_merizo, result_unidoc, result_chainsaw in itertools.product(
+            merizo.get(af_chain_id, [None]),
+            unidoc.get(af_chain_id, [None]),
+            chainsaw.get(af_chain_id, [None]),
+        ):
+            rows.append((af_chain_id, result_chainsaw, result_merizo, result_unidoc))
 
-    # read chainsaw results
-    chainsaw_df = pd.read_csv(chainsaw_file, sep="\t", header=None, names=CHAINSAW_COLS)
-    chainsaw_df = normalise_df(chainsaw_df)
-    chainsaw_df.rename(columns={"result": "result_chainsaw"}, inplace=True)
+    # format output
+    write_rows(output_file, rows, header=OUTPUT_COLS.values())
 
-    # merge results
-    result_df = merizo_df.merge(unidoc_df, on="af_chain_id", how="outer")
-    result_df = result_df.merge(chainsaw_df, on="af_chain_id", how="outer")
-    result_df = result_df.sort_values("af_chain_id") # New line to ensure deterministic sorting
 
-    # format output
-    result_df = result_df[OUTPUT_COLS.keys()].rename(columns=OUTPUT_COLS)
-    result_df.to_csv(output_file, sep="\t", index=False, header=True)
+def read_results(f, columns):
+    """Returns {af_chain_id: [result, ...]} (None for a missing result) from a results file."""
+    af_chain_id_col, result_col = columns.index("af_chain_id"), columns.index("result")
+    results = {}
+    for row in read_rows(f, len(columns)):
+        result = row[result_col]
+        results.setdefault(normalise_id(row[af_chain_id_col]), []).append(None if is_missing(result) else result)
+    return results
 
 
-def normalise_df(df):
+def normalise_id(af_chain_id):
     # index by file stem (no suffix)
-    df["af_chain_id"] = (
-        df["af_chain_id"]
-        .astype("string")
-        .str.replace(".pdb", "")
-        .str.replace(".cif", "")
-    )
-    # bad_matches_idx = df['af_chain_id'].str.match(r'(?!AF-)')
-    # if bad_matches_idx.any():
-    #    bad_matches = df.loc[bad_matches_idx, 'af_chain_id'].unique()
-    #    raise RuntimeError(f"Invalid AlphaFold ID: {bad_matches}")
-    return df
+    return af_chain_id.replace(".pdb", "").replace(".cif", "")
 
 
 if __name__ == "__main__":
@@ -8,9 +8,10 @@ usage:
 
 """
 
-import pandas as pd
 import argparse
 
+from tsv_io import is_missing, read_rows, write_rows
+
 #
 
 VALID_TYPES = ["merizo", "unidoc"]
@@ -48,78 +49,76 @@ parser.add_argument(
 )
 
 
+def read_chainsaw(chainsaw_file):
+    """Returns {AF_chain_id: [(sequence_md5, nres), ...]} from the chainsaw results (in file order)."""
+    chainsaw = {}
+    for chain_id, md5, nres in read_rows(chainsaw_file, 3):
+        chainsaw.setdefault(chain_id, []).append((missing_to_none(md5), as_number(nres, int)))
+    return chainsaw
+
+
+def missing_to_none(value):
+    return None if is_missing(value) else value
+
+
+def as_number(value, cast):
+    """Formats a numeric field as pandas wrote it (e.g. '0.50000' as 0.5); None if missing."""
+    if is_missing(value):
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        return value
+
+
+def left_join(rows, chainsaw):
+    """Yields (row, md5, nres) for every row and its chainsaw matches (None if there are none), as a left merge."""
+    for row in rows:
+        for md5, nres in chainsaw.get(row[0], [(None, None)]):
+            yield row, md5, nres
+
+
 def process_merizo(chainsaw_file, merizo_file, output_file):
-    # Load chainsaw file
-    chainsaw_df = pd.read_csv(
-        chainsaw_file,
-        sep="\t",
-        header=None,
-        usecols=[0, 1],
-        names=["AF_chain_id", "sequence_md5"],
-    )
-    chainsaw_df["AF_chain_id"] = chainsaw_df["AF_chain_id"].astype("string")
-
-    # Load merizo file
-    merizo_df = pd.read_csv(
-        merizo_file,
-        sep="\t",
-        header=None,
-        usecols=[0, 1, 4, 5, 7],
-        names=["AF_chain_id", "nres", "ndom", "PIoU", "result"],
-    )
-    merizo_df["AF_chain_id"] = (
-        merizo_df["AF_chain_id"].astype("string").str.replace(".pdb", "", regex=False)
-    )
-    # Fill empty result values with a placeholder
-    merizo_df["result"] = merizo_df["result"].fillna("0")
+    chainsaw = read_chainsaw(chainsaw_file)
+
+    # Merizo columns 0, 1, 4, 5 and 7: AF_chain_id, nres, ndom, PIoU, result
+    merizo_rows = []
+    for row in read_rows(merizo_file, 8):
+        chain_id = row[0].replace(".pdb", "")
+        # Fill empty result values with a placeholder
+        result = "0" if is_missing(row[7]) else row[7]
+        merizo_rows.append((chain_id, as_number(row[1], int), as_number(row[4], int), as_number(row[5], float), result))
 
     # Merge with chainsaw data
-    merged_df = merizo_df.merge(chainsaw_df, on="AF_chain_id", how="left")
-    final_df = merged_df[
-        ["AF_chain_id", "sequence_md5", "nres", "ndom", "result", "PIoU"]
-    ]
+    output_rows = (
+        (chain_id, md5, nres, ndom, result, piou)
+        for (chain_id, nres, ndom, piou, result), md5, _ in left_join(merizo_rows, chainsaw)
+    )
 
     # Save output
-    final_df.to_csv(output_file, sep="\t", index=False, header=False)
+    write_rows(output_file, output_rows)
     print(f"Processed merizo file saved to {output_file}")
 
 
 def process_unidoc(chainsaw_file, unidoc_file, output_file):
-    # Load chainsaw file
-    chainsaw_df = pd.read_csv(
-        chainsaw_file,
-        sep="\t",
-        header=None,
-        usecols=[0, 1, 2],
-        names=["AF_chain_id", "sequence_md5", "nres"],
-    )
-    chainsaw_df["AF_chain_id"] = chainsaw_df["AF_chain_id"].astype("string")
+    chainsaw = read_chainsaw(chainsaw_file)
 
-    # Load unidoc file
-    unidoc_df = pd.read_csv(
-        unidoc_file, sep="\t", header=None, names=["AF_chain_id", "result"]
-    )
-    unidoc_df["AF_chain_id"] = unidoc_df["AF_chain_id"].astype("string")
-
-    # Fill empty result values with a placeholder
-    unidoc_df["result"] = unidoc_df["result"].fillna("0")
-
-    # Count unique domains
-    unidoc_df["ndom"] = unidoc_df["result"].apply(
-        lambda x: (
-            len(set([seg.split("_")[0] for seg in x.split(",")])) if pd.notna(x) else 0
-        )
-    )
+    unidoc_rows = []
+    for chain_id, result in read_rows(unidoc_file, 2):
+        # Fill empty result values with a placeholder
+        result = "0" if is_missing(result) else result
+        # Count unique domains
+        ndom = len(set(seg.split("_")[0] for seg in result.split(",")))
+        unidoc_rows.append((chain_id, ndom, result))
 
     # Merge with chainsaw data
-    merged_df = unidoc_df.merge(chainsaw_df, on="AF_chain_id", how="left")
-    merged_df["PIoU"] = 1.00
-    merged_df = merged_df[
-        ["AF_chain_id", "sequence_md5", "nres", "ndom", "result", "PIoU"]
-    ]
+    output_rows = (
+        (chain_id, md5, nres, ndom, result, 1.0)
+        for (chain_id, ndom, result), md5, nres in left_join(unidoc_rows, chainsaw)
+    )
 
     # Save output
-    merged_df.to_csv(output_file, sep="\t", index=False, header=False)
+    write_rows(output_file, output_rows)
     print(f"Processed unidoc file saved to {output_file}")
 
 
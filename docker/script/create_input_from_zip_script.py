@@ -2,26 +2,145 @@
 
 import os
 import argparse
-import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from pdb_records import structure_counts
+from zip_index import ZipReader, iter_central_directory
 
 # Usage:
 # python3 create_input_from_zip_script.py \
 #    --input_zip_dir    input_zip_dir \
 #    --output           output file \
+#    [--manifest        manifest.tsv] \
+#    [--cache_dir       manifest cache directory] \
+#    [--counts] [--cpus N]
+#
+# --output lists "id <TAB> zip_name" for every .pdb/.cif member, zips and members in sorted order.
+#
+# --manifest also records, per member, the member name, uncompressed size and CRC-32 read from
+# the central directory, and with --counts the number of models, chains and residues of every
+# .pdb member (counted as pdb_wc does, see pdb_records.structure_counts). Columns:
+#    id  zip_name  member  file_size  crc  models  chains  residues
+#
+# With --cache_dir the rows of every zip are cached in <cache_dir>/<zip_name>.manifest.tsv, keyed
+# by the zip's real path, size and mtime (and whether counts were requested), so unchanged zips are
+# not read again on the next launch. Zips that are new or changed are scanned in parallel.
+
+MANIFEST_HEADER = "id\tzip_name\tmember\tfile_size\tcrc\tmodels\tchains\tresidues\n"
+MEMBER_SUFFIXES = (".pdb", ".cif")
+
+
+def zip_key(zip_path, counts):
+    """Cache key of a zip: real path, size, mtime and whether residue and chain counts are included."""
+    stat = os.stat(zip_path)
+    return f"#{os.path.realpath(zip_path)}\t{stat.st_size}\t{stat.st_mtime_ns}\tcounts={int(counts)}"
+
+
+def scan_zip(zip_path, counts=False):
+    """
+    Returns the manifest rows of one zip, in sorted member order.
+
+    Args:
+        zip_path: Path to the zip file.
+        counts: Also count models, chains and residues of the .pdb members.
+
+    Returns:
+        List of (id, member, file_size, crc, models, chains, residues) tuples; the counts are
+        empty strings when not requested or for .cif members.
+    """
+    members = sorted(
+        entry for entry in iter_central_directory(zip_path)
+        if entry[0].endswith(MEMBER_SUFFIXES)                     # Skip anything that's not a pdb or cif file.
+    )
+    rows = []
+    with ZipReader(zip_path) as reader:
+        for name, header_offset, compress_size, file_size, method, crc in members:
+            file_id = os.path.basename(name)[:-4]                   # Remove the .pdb/.cif suffix.
+            models = chains = residues = ""
+            if counts and name.endswith(".pdb"):
+                data = reader.read_entry(name, header_offset, compress_size, method, crc)
+                models, chains, residues = structure_counts(data)
+            rows.append((file_id, name, file_size, f"{crc:08x}", models, chains, residues))
+    return rows
+
+
+def read_cache(cache_file, key):
+    """Returns the cached rows of a zip if the cache file exists and its key matches, else None."""
+    if not os.path.exists(cache_file):
+        return None
+    with open(cache_file) as f:
+        if f.readline().rstrip("\n") != key:
+            return None
+        return [tuple(line.rstrip("\n").split("\t")) for line in f]
+
+
+def write_cache(cache_file, key, rows):
+    """Writes the rows of a zip to its cache file (atomically, via a temporary file and rename)."""
+    tmp_file = f"{cache_file}.tmp.{os.getpid()}"
+    with open(tmp_file, "w") as out:
+        out.write(key + "\n")
+        for row in rows:
+            out.write("\t".join(str(value) for value in row) + "\n")
+    os.replace(tmp_file, cache_file)
+
+
+def scan_and_cache(zip_path, counts, cache_file, key):
+    rows = scan_zip(zip_path, counts)
+    if cache_file:
+        write_cache(cache_file, key, rows)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--input_zip_dir",  required=True)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--manifest", default=None, help="Optional per-member manifest TSV")
+    parser.add_argument("--cache_dir", default=None, help="Directory of cached per-zip manifests")
+    parser.add_argument("--counts", action="store_true", help="Count models, chains and residues of .pdb members")
+    parser.add_argument("--cpus", type=int, default=None, help="Zips scanned in parallel (default: all available CPUs)")
+    args = parser.parse_args()
+
+    zip_names = [name for name in sorted(os.listdir(args.input_zip_dir)) if name.endswith(".zip")]
+    if args.cache_dir:
+        os.makedirs(args.cache_dir, exist_ok=True)
+
+    # Reuse cached rows of unchanged zips and scan the others in parallel
+    rows_by_zip, to_scan = {}, []
+    for zip_name in zip_names:
+        zip_path = os.path.join(args.input_zip_dir, zip_name)    # Build a path to zip (/data/zips/bfvd_zip1.zip)
+        key = zip_key(zip_path, args.counts)
+        cache_file = os.path.join(args.cache_dir, f"{zip_name}.manifest.tsv") if args.cache_dir else None
+        cached = read_cache(cache_file, key) if cache_file else None
+        if cached is None:
+            to_scan.append((zip_name, zip_path, cache_file, key))
+        else:
+            rows_by_zip[zip_name] = cached
+
+    print(f"{len(zip_names) - len(to_scan)} zips cached, {len(to_scan)} to scan")
+    if to_scan:
+        cpus = args.cpus or len(os.sched_getaffinity(0))
+        with ProcessPoolExecutor(max_workers=min(cpus, len(to_scan))) as pool:
+            futures = {
+                zip_name: pool.submit(scan_and_cache, zip_path, args.counts, cache_file, key)
+                for zip_name, zip_path, cache_file, key in to_scan
+            }
+            for zip_name, future in futures.items():
+                rows_by_zip[zip_name] = future.result()
+
+    with open(args.output, "w") as out:
+        for zip_name in zip_names:
+            for row in rows_by_zip[zip_name]:
+                out.write(f"{row[0]}\t{zip_name}\n")                # Write names to a tsv file.
+
+    if args.manifest:
+        with open(args.manifest, "w") as out:
+            out.write(MANIFEST_HEADER)
+            for zip_name in zip_names:
+                for file_id, member, *values in rows_by_zip[zip_name]:
+                    out.write("\t".join([file_id, zip_name, member] + [str(value) for value in values]) + "\n")
+
 
-parser = argparse.ArgumentParser()
-
-parser.add_argument("--input_zip_dir",  required=True)
-parser.add_argument("--output", required=True)
-args = parser.parse_args()
-
-with open(args.output, "w") as out:
-    for zip_name in sorted(os.listdir(args.input_zip_dir)):     # Create sorted list of zips in the directory.
-        if not zip_name.endswith(".zip"):                       # Skip anything that is not a .zip file.
-            continue
-        zip_path = os.path.join(args.input_zip_dir, zip_name)   # Build a path to zip (/data/zips/bfvd_zip1.zip)
-        with zipfile.ZipFile(zip_path) as z:                    # Open the zip file without extracting it.
-            for member in sorted(z.namelist()):                 # Get a sorted list of contents in each zip file.
-                if member.endswith((".pdb", ".cif")):           # Skip anything that's not a pdb or cif file.
-                    file_id = os.path.basename(member)[:-4]     # Remove the .pdb/.cif suffix.
-                    out.write(f"{file_id}\t{zip_name}\n")       # Write names to a tsv file.
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,13 @@ Script to summarize secondary structure information from one or more STRIDE file
 into a tab-separated CSV file with headers.
 
 Usage:
-    transform_consensus.py -o <output_summary_file.csv> <stride_file1> [<stride_file2> ...]
+    create_stride_summary.py -o <output_summary_file.tsv> -d <stride_dir> [--suffix .stride]
+    create_stride_summary.py -o <output_summary_file.tsv> --pdb_dir <pdb_dir> [--cpus N] [--engine stride|numpy]
+
+The second form runs STRIDE itself over every PDB file in <pdb_dir> using a process
+pool, parses each STRIDE report from stdout in memory and writes the sorted summary
+directly (no intermediate .stride files). With --engine numpy the counts come from
+the built-in secondary_structure.py engine instead, without running STRIDE.
 
 Raises:
     FileNotFoundError: If any STRIDE file does not exist.
@@ -15,26 +21,35 @@ Raises:
 import argparse
 import os
 import csv
+import subprocess
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
+SUMMARY_FIELDS = [
+    "id",
+    "chain_id",
+    "num_helix_strand_turn",
+    "num_helix",
+    "num_strand",
+    "num_helix_strand",
+    "num_turn",
+]
 
-def parse_stride_file(file_path):
+DEFAULT_STRIDE_EXEC = "stride"
+ENGINES = ["stride", "numpy"]
+
+
+def parse_stride_lines(lines):
     """
-    Parses a STRIDE file and extracts secondary structure information.
+    Extracts secondary structure counts from the lines of a STRIDE report.
 
     Args:
-        file_path (str): Path to the STRIDE file.
+        lines (iterable): Lines of STRIDE output (from a file or captured stdout).
 
     Returns:
         dict: A dictionary containing summarized secondary structure information.
-
-    Raises:
-        FileNotFoundError: If the file does not exist.
-        ValueError: If the file format is invalid.
     """
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"STRIDE file '{file_path}' does not exist.")
-
     summary = {
         "id": None,
         "chain_id": None,
@@ -45,31 +60,152 @@ def parse_stride_file(file_path):
         "num_turn": 0,
     }
 
+    for line in lines:
+        line = line.strip()
+        if line.startswith("CHN"):
+            parts = line.split()
+            summary["id"] = parts[1]
+            summary["chain_id"] = parts[2]
+        elif line.startswith("LOC"):
+            structure_type = line.split()[1]
+            if "HELIX" in structure_type.upper():
+                summary["num_helix"] += 1
+            elif "STRAND" in structure_type.upper():
+                summary["num_strand"] += 1
+            elif "TURN" in structure_type.upper():
+                summary["num_turn"] += 1
+
+    summary["num_helix_strand_turn"] = (
+        summary["num_helix"] + summary["num_strand"] + summary["num_turn"]
+    )
+    summary["num_helix_strand"] = summary["num_helix"] + summary["num_strand"]
+
+    return summary
+
+
+def parse_stride_file(file_path):
+    """
+    Parses a STRIDE file and extracts secondary structure information.
+
+    Args:
+        file_path (str): Path to the STRIDE file.
+
+    Returns:
+        dict: A dictionary containing summarized secondary structure information.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If the file format is invalid.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"STRIDE file '{file_path}' does not exist.")
+
     try:
         with open(file_path, "r") as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith("CHN"):
-                    parts = line.split()
-                    summary["id"] = parts[1]
-                    summary["chain_id"] = parts[2]
-                elif line.startswith("LOC"):
-                    structure_type = line.split()[1]
-                    if "HELIX" in structure_type.upper():
-                        summary["num_helix"] += 1
-                    elif "STRAND" in structure_type.upper():
-                        summary["num_strand"] += 1
-                    elif "TURN" in structure_type.upper():
-                        summary["num_turn"] += 1
-
-            summary["num_helix_strand_turn"] = (
-                summary["num_helix"] + summary["num_strand"] + summary["num_turn"]
-            )
-            summary["num_helix_strand"] = summary["num_helix"] + summary["num_strand"]
+            return parse_stride_lines(f)
     except Exception as e:
         raise ValueError(f"Error parsing STRIDE file '{file_path}': {e}")
 
-    return summary
+
+def run_stride(pdb_path, stride_exec=DEFAULT_STRIDE_EXEC):
+    """
+    Runs STRIDE on a single PDB file and parses the report from stdout.
+
+    The summary id is the PDB file name (as when STRIDE is run from inside the
+    PDB directory), so rows match the ids expected by transform_consensus.py.
+
+    Args:
+        pdb_path (str): Path to the PDB file.
+        stride_exec (str): STRIDE executable.
+
+    Returns:
+        tuple: (summary dict or None, error message or None)
+    """
+    try:
+        result = subprocess.run(
+            [stride_exec, pdb_path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=False,
+        )
+    except OSError as e:
+        return None, f"{os.path.basename(pdb_path)}: {e}"
+
+    if result.returncode != 0:
+        return None, f"{os.path.basename(pdb_path)}: {result.stderr.strip()}"
+
+    summary = parse_stride_lines(result.stdout.splitlines())
+    summary["id"] = os.path.basename(pdb_path)
+    return summary, None
+
+
+def default_cpus():
+    """Returns the number of CPUs available to this process (honours affinity masks)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def summarise_pdb_dir(
+    pdb_dir, stride_exec=DEFAULT_STRIDE_EXEC, cpus=None, pdb_suffix=".pdb", engine="stride"
+):
+    """
+    Summarises every PDB file in a directory using a process pool.
+
+    Args:
+        pdb_dir (str): Directory of PDB files.
+        stride_exec (str): STRIDE executable.
+        cpus (int): Number of worker processes (defaults to all available CPUs).
+            With a single CPU the files are processed in this process.
+        pdb_suffix (str): Suffix used to select PDB files.
+        engine (str): 'stride' to run STRIDE, 'numpy' for the built-in engine.
+
+    Returns:
+        tuple: (list of summaries sorted by id, list of error messages)
+    """
+    pdb_paths = sorted(
+        os.path.join(pdb_dir, f) for f in os.listdir(pdb_dir) if f.endswith(pdb_suffix)
+    )
+    cpus = cpus or default_cpus()
+
+    summaries = []
+    errors = []
+    if not pdb_paths:
+        return summaries, errors
+
+    if engine == "numpy":
+        from secondary_structure import summarise_pdb_file
+
+        worker = summarise_pdb_file
+        worker_args = [pdb_paths]
+    elif engine == "stride":
+        worker = run_stride
+        worker_args = [pdb_paths, [stride_exec] * len(pdb_paths)]
+    else:
+        raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+
+    if cpus == 1:
+        results = map(worker, *worker_args)
+        executor = None
+    else:
+        chunksize = max(1, len(pdb_paths) // (cpus * 4))
+        executor = ProcessPoolExecutor(max_workers=cpus)
+        results = executor.map(worker, *worker_args, chunksize=chunksize)
+
+    try:
+        for summary, error in results:
+            if error:
+                errors.append(error)
+            else:
+                summaries.append(summary)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    summaries.sort(key=lambda summary: summary["id"])
+    return summaries, errors
 
 
 def write_summary_to_tsv(summaries, output_file):
@@ -85,19 +221,7 @@ def write_summary_to_tsv(summaries, output_file):
     """
     try:
         with open(output_file, "w", newline="") as f:
-            writer = csv.DictWriter(
-                f,
-                fieldnames=[
-                    "id",
-                    "chain_id",
-                    "num_helix_strand_turn",
-                    "num_helix",
-                    "num_strand",
-                    "num_helix_strand",
-                    "num_turn",
-                ],
-                delimiter="\t",
-            )
+            writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, delimiter="\t")
             writer.writeheader()
             writer.writerows(summaries)
     except IOError as e:
@@ -118,7 +242,7 @@ def main(output_file, stride_dir, stride_suffix=".stride"):
             if not stride_file.endswith(stride_suffix):
                 continue
             print(f"Processing STRIDE file: {stride_file}")
-            summary = parse_stride_file(stride_file)
+            summary = parse_stride_file(os.path.join(stride_dir, stride_file))
             summaries.append(summary)
         write_summary_to_tsv(summaries, output_file)
         print(
@@ -130,6 +254,36 @@ def main(output_file, stride_dir, stride_suffix=".stride"):
     print("Done")
 
 
+def main_batch(output_file, pdb_dir, stride_exec=DEFAULT_STRIDE_EXEC, cpus=None, engine="stride"):
+    """
+    Summarises a directory of PDB files and writes the sorted summary TSV.
+
+    Args:
+        output_file (str): Path to the output TSV file.
+        pdb_dir (str): Directory of PDB files.
+        stride_exec (str): STRIDE executable.
+        cpus (int): Number of worker processes (defaults to all available CPUs).
+        engine (str): 'stride' to run STRIDE, 'numpy' for the built-in engine.
+    """
+    cpus = cpus or default_cpus()
+    start = time.perf_counter()
+    summaries, errors = summarise_pdb_dir(
+        pdb_dir, stride_exec=stride_exec, cpus=cpus, engine=engine
+    )
+    elapsed = time.perf_counter() - start
+
+    for error in errors:
+        print(f"{engine} failed on {error}", file=sys.stderr)
+
+    write_summary_to_tsv(summaries, output_file)
+
+    rate = len(summaries) / elapsed if elapsed > 0 else 0.0
+    print(
+        f"Summary successfully written {len(summaries)} summaries to '{output_file}' "
+        f"({engine} engine, {len(errors)} failed, {cpus} CPUs, {elapsed:.1f}s, {rate:.1f} domains/s)."
+    )
+
+
 if __name__ == "__main__":
 
     argparser = argparse.ArgumentParser(
@@ -152,6 +306,35 @@ if __name__ == "__main__":
         help="Directory of STRIDE files to parse.",
     )
 
+    argparser.add_argument(
+        "--pdb_dir",
+        type=str,
+        default=None,
+        help="Directory of PDB files: run STRIDE on each one and summarise the output in memory.",
+    )
+
+    argparser.add_argument(
+        "--engine",
+        type=str,
+        choices=ENGINES,
+        default="stride",
+        help="Secondary structure engine (used with --pdb_dir): run STRIDE, or the built-in NumPy engine.",
+    )
+
+    argparser.add_argument(
+        "--stride_exec",
+        type=str,
+        default=DEFAULT_STRIDE_EXEC,
+        help="STRIDE executable (used with --pdb_dir).",
+    )
+
+    argparser.add_argument(
+        "--cpus",
+        type=int,
+        default=None,
+        help="Number of worker processes (used with --pdb_dir, default: all available CPUs).",
+    )
+
     argparser.add_argument(
         "--suffix",
         type=str,
@@ -164,6 +347,10 @@ if __name__ == "__main__":
     stride_dir = args.stride_dir
     stride_suffix = args.suffix
 
+    if args.pdb_dir:
+        main_batch(output_file, args.pdb_dir, args.stride_exec, args.cpus, args.engine)
+        sys.exit(0)
+
     if not stride_dir:
         print("No STRIDE directory provided.")
         sys.exit(1)
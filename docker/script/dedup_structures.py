@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Within-run structure deduplication for segmentation.
+
+Some inputs (BFVD, some AFDB releases) hold coordinate-identical models under different ids.
+filter_chains.py --coordinate_hash adds a hash of the normalised coordinates of every kept
+chain (pdb_records.coordinate_hash) to the filtered id list, and:
+
+`plan` groups the chains of each zip by that hash. The first id of every group (in sorted
+order) is its representative and is the only one sent to segmentation; the others are
+written to the duplicates file with their representative. Duplicates are only looked for
+within a zip, since chopping and the stores read every chain from its own zip.
+
+    representatives.txt   id <TAB> zip_name <TAB> residues (input of heavy_chunk_by_zip)
+    duplicates.tsv        id <TAB> zip_name <TAB> representative id, sorted by id
+    dedup_report.tsv      metric <TAB> value: chains, residues and predicted segmentation cost saved
+
+`fanout` copies the segmentation rows of every representative in a chunk to its duplicates
+(first column replaced by the duplicate id) and re-sorts each file, so the chopping,
+consensus and store steps see every chain as if it had been segmented itself.
+
+Usage:
+    dedup_structures.py plan --input filtered_af_ids.txt --representatives representatives.txt \
+        --duplicates duplicates.tsv --report dedup_report.tsv
+    dedup_structures.py fanout --duplicates duplicates.tsv --zip_name pdbs.zip --id_file chunk_ids.txt \
+        --outdir fanned chopping_chainsaw_sorted.txt chopping_merizo_sorted.txt ... consensus_sorted.tsv
+"""
+
+import argparse
+import os
+import sys
+from collections import defaultdict
+
+
+def read_filtered(input_file):
+    """Yields (id, zip_name, residues, coordinate hash) rows; the hash is '' when the input has none."""
+    with open(input_file) as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if not fields[0].strip():
+                continue
+            fields += [""] * (4 - len(fields))
+            yield fields[0], fields[1], fields[2], fields[3]
+
+
+def plan(input_file, representatives_file, duplicates_file, report_file, cost_coefficients=(0, 1, 0.002)):
+    """
+    Picks one representative per (zip, coordinate hash) and writes the plan files.
+
+    Args:
+        input_file: Filtered ids (id, zip_name, residues, coordinate hash), sorted by id.
+        representatives_file: Output, the filtered rows of the representatives (without the hash).
+        duplicates_file: Output, duplicate id, zip_name and representative id.
+        report_file: Output, summary of the work saved.
+        cost_coefficients: Polynomial segmentation cost per chain of n residues (as chunk_by_zip.py --cost_model poly).
+
+    Returns:
+        Dict of report metrics.
+    """
+    def cost(residues):
+        return sum(c * residues ** power for power, c in enumerate(cost_coefficients))
+
+    representative_of = {}
+    duplicates = []
+    totals = defaultdict(float)
+    with open(representatives_file, "w") as out:
+        for chain_id, zip_name, residues, digest in read_filtered(input_file):
+            n = float(residues) if residues else 0.0
+            totals["chains"] += 1
+            totals["residues"] += n
+            totals["cost"] += cost(n)
+            key = (zip_name, digest)
+            if digest and key in representative_of:
+                duplicates.append((chain_id, zip_name, representative_of[key]))
+                continue
+            if digest:
+                representative_of[key] = chain_id
+            totals["representatives"] += 1
+            totals["residues_segmented"] += n
+            totals["cost_segmented"] += cost(n)
+            out.write(f"{chain_id}\t{zip_name}\t{residues}\n")
+
+    duplicates.sort()
+    with open(duplicates_file, "w") as out:
+        for row in duplicates:
+            out.write("\t".join(row) + "\n")
+
+    report = {
+        "chains": int(totals["chains"]),
+        "representatives": int(totals["representatives"]),
+        "duplicates": len(duplicates),
+        "duplicate_groups": len({(zip_name, rep) for _, zip_name, rep in duplicates}),
+        "residues": int(totals["residues"]),
+        "residues_segmented": int(totals["residues_segmented"]),
+        "residues_saved": int(totals["residues"] - totals["residues_segmented"]),
+        "fraction_chains_saved": len(duplicates) / totals["chains"] if totals["chains"] else 0.0,
+        "fraction_cost_saved": 1 - totals["cost_segmented"] / totals["cost"] if totals["cost"] else 0.0,
+    }
+    with open(report_file, "w") as out:
+        out.write("metric\tvalue\n")
+        for metric, value in report.items():
+            out.write(f"{metric}\t{value:.4f}\n" if isinstance(value, float) else f"{metric}\t{value}\n")
+    return report
+
+
+def read_duplicates(duplicates_file, zip_name):
+    """Returns {representative id: [duplicate ids]} for the duplicates in one zip."""
+    duplicates_of = defaultdict(list)
+    with open(duplicates_file) as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) == 3 and fields[1] == zip_name:
+                duplicates_of[fields[2]].append(fields[0])
+    return duplicates_of
+
+
+def fan_out(lines, duplicates_of):
+    """Returns the lines plus a copy of every representative's lines per duplicate, sorted."""
+    fanned = []
+    for line in lines:
+        if not line.strip():
+            continue
+        fanned.append(line)
+        chain_id, sep, rest = line.partition("\t")
+        for duplicate_id in duplicates_of.get(chain_id, ()):
+            fanned.append(f"{duplicate_id}{sep}{rest}")
+    return sorted(fanned)
+
+
+def fan_out_files(duplicates_file, zip_name, id_file, inputs, outdir):
+    """
+    Writes the fanned-out id file and segmentation files of one chunk to outdir (same file names).
+
+    Returns:
+        Number of duplicate ids added to the chunk.
+    """
+    duplicates_of = read_duplicates(duplicates_file, zip_name)
+    os.makedirs(outdir, exist_ok=True)
+    added = 0
+    for path in [id_file] + list(inputs):
+        with open(path) as f:
+            lines = [line.rstrip("\n") for line in f]
+        fanned = fan_out(lines, duplicates_of)
+        if path == id_file:
+            added = len(fanned) - sum(1 for line in lines if line.strip())
+        with open(os.path.join(outdir, os.path.basename(path)), "w") as out:
+            out.writelines(line + "\n" for line in fanned)
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Within-run deduplication of coordinate-identical structures.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    plan_parser = subparsers.add_parser("plan", help="Pick one representative per coordinate hash")
+    plan_parser.add_argument("--input", required=True, help="Filtered ids: id, zip_name, residues, coordinate hash")
+    plan_parser.add_argument("--representatives", required=True, help="Output ids to segment (id, zip_name, residues)")
+    plan_parser.add_argument("--duplicates", required=True, help="Output TSV: id, zip_name, representative id")
+    plan_parser.add_argument("--report", required=True, help="Output TSV summarising the segmentation work saved")
+    plan_parser.add_argument("--cost_coefficients", default="0,1,0.002",
+                             help="Segmentation cost per chain, c0 + c1*n + c2*n^2 for n residues (default: 0,1,0.002)")
+
+    fanout_parser = subparsers.add_parser("fanout", help="Copy segmentation rows of representatives to duplicates")
+    fanout_parser.add_argument("--duplicates", required=True, help="Duplicates TSV written by plan")
+    fanout_parser.add_argument("--zip_name", required=True, help="Zip of the chunk")
+    fanout_parser.add_argument("--id_file", required=True, help="Ids of the chunk, one per line")
+    fanout_parser.add_argument("--outdir", required=True, help="Output directory (same file names as the inputs)")
+    fanout_parser.add_argument("inputs", nargs="+", help="Segmentation files with the chain id in the first column")
+
+    args = parser.parse_args()
+    if args.command == "plan":
+        coefficients = [float(c) for c in args.cost_coefficients.split(",") if c.strip()]
+        report = plan(args.input, args.representatives, args.duplicates, args.report, coefficients)
+        print(
+            f"{report['representatives']} of {report['chains']} chains to segment, "
+            f"{report['duplicates']} duplicates ({report['fraction_cost_saved']:.1%} of predicted cost saved)",
+            file=sys.stderr,
+        )
+    else:
+        added = fan_out_files(args.duplicates, args.zip_name, args.id_file, args.inputs, args.outdir)
+        print(f"Added {added} duplicate ids", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
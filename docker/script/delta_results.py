@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Incremental (delta) runs: which ids to run, and merging their results into the previous ones.
+
+A delta index records the chain ids of a run as a sorted fixed-width bytes array, with the
+CRC-32 of every structure from the input manifest (-1 when unknown), in one .npz file:
+
+    ids   sorted chain ids (S<n>)
+    crc   CRC-32 of each structure, or -1
+
+`index` builds one from an input manifest (create_input_from_zip, intermediate/input_manifest.tsv)
+or, when no manifest was kept, from the ids of a final_results.tsv (no CRCs, so changed
+structures cannot be told apart from unchanged ones).
+
+`delta` compares the new input manifest (or id <TAB> zip_name mapping) with the previous index
+by binary search: ids that are new or whose CRC changed are written as the mapping to run, every
+new, changed and removed id is listed in the delta TSV, and the index of the new input is written
+for the next run.
+
+`merge` streams the previous final results, without the rows of changed and removed chains, and
+the final results of the delta into one file sorted by chain id. Both inputs are sorted in
+bounded memory (see external_sort.py) and combined with a k-way merge.
+
+Usage:
+    delta_results.py index --manifest input_manifest.tsv --output delta_index.npz
+    delta_results.py delta --previous_index delta_index.npz --manifest input_manifest.tsv \
+        --mapping delta_mapping.tsv --delta delta.tsv --index_out delta_index.npz
+    delta_results.py merge --previous final_results.tsv --delta_results delta_final_results.tsv \
+        --delta delta.tsv --output final_results.tsv
+"""
+
+import argparse
+import heapq
+import re
+import sys
+
+import numpy as np
+
+from external_sort import external_sort
+
+NEW = "new"
+CHANGED = "changed"
+REMOVED = "removed"
+UNKNOWN_CRC = -1
+DOMAIN_SUFFIX_RE = re.compile(r"_(?:TED)?[0-9]+$")   # as combine_results_final.strip_domain_suffix
+
+
+def chain_id(domain_id):
+    """Returns the chain id of a domain id like <chain>_01 or <chain>_TED01."""
+    return DOMAIN_SUFFIX_RE.sub("", domain_id)
+
+
+def read_manifest(path):
+    """
+    Yields (id, zip_name, crc) from an input manifest, or from an id <TAB> zip_name mapping (crc -1).
+    """
+    with open(path) as f:
+        first = f.readline()
+        columns = first.rstrip("\n").split("\t")
+        has_header = columns[:2] == ["id", "zip_name"]
+        crc_col = columns.index("crc") if has_header and "crc" in columns else None
+        lines = f if has_header else [first] + list(f)
+        for line in lines:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 2 or not fields[0].strip():
+                continue
+            crc = int(fields[crc_col], 16) if crc_col is not None and fields[crc_col] else UNKNOWN_CRC
+            yield fields[0].strip(), fields[1].strip(), crc
+
+
+def make_index(ids, crcs):
+    """Returns (sorted ids, crcs) arrays; the last entry of a duplicated id wins."""
+    ids = np.array(ids, dtype=bytes) if len(ids) else np.array([], dtype="S1")
+    crcs = np.array(crcs, dtype=np.int64)
+    order = np.argsort(ids, kind="stable")
+    ids, crcs = ids[order], crcs[order]
+    last = np.ones(ids.size, dtype=bool)
+    last[:-1] = ids[1:] != ids[:-1]
+    return ids[last], crcs[last]
+
+
+def write_index(path, ids, crcs):
+    with open(path, "wb") as out:
+        np.savez(out, ids=ids, crc=crcs)
+
+
+def load_index(path):
+    with np.load(path) as index:
+        return index["ids"], index["crc"]
+
+
+def index_from_results(results_file):
+    """Returns the index of the chains in a final_results.tsv (CRCs unknown)."""
+    with open(results_file) as f:
+        f.readline()
+        ids = {chain_id(line.split("\t", 1)[0]) for line in f if line.strip()}
+    return make_index(sorted(ids), [UNKNOWN_CRC] * len(ids))
+
+
+def compute_delta(previous_ids, previous_crcs, ids, crcs):
+    """
+    Compares the new ids with the previous index.
+
+    Returns:
+        Tuple of (status per new id: NEW, CHANGED or '' for unchanged, removed previous ids).
+    """
+    if previous_ids.size:
+        positions = np.minimum(np.searchsorted(previous_ids, ids), previous_ids.size - 1)
+        found = previous_ids[positions] == ids
+    else:
+        positions = np.zeros(ids.size, dtype=np.int64)
+        found = np.zeros(ids.size, dtype=bool)
+    previous_crc = np.where(found, previous_crcs[positions] if previous_ids.size else UNKNOWN_CRC, UNKNOWN_CRC)
+    changed = found & (previous_crc != UNKNOWN_CRC) & (crcs != UNKNOWN_CRC) & (previous_crc != crcs)
+    status = np.where(~found, NEW, np.where(changed, CHANGED, ""))
+
+    kept = np.zeros(previous_ids.size, dtype=bool)
+    kept[positions[found]] = True
+    return status, previous_ids[~kept]
+
+
+def read_results(path):
+    """Yields the header columns, then the data lines without newlines. The file is closed once they are read."""
+    with open(path) as f:
+        yield f.readline().rstrip("\n").split("\t")
+        for line in f:
+            if line.strip():
+                yield line.rstrip("\n")
+
+
+def merge_results(previous_file, delta_results_file, excluded_ids, output, max_memory_mb=1024, tmp_dir=None):
+    """
+    Writes the merged final results sorted by chain id, rows of one chain in their input order.
+
+    Args:
+        previous_file: Final results of the previous run.
+        delta_results_file: Final results of the delta run.
+        excluded_ids: Sorted array of chain ids whose previous rows are dropped (changed and removed).
+        output: Output file.
+
+    Returns:
+        Tuple of (previous rows kept, delta rows).
+    """
+    previous_lines = read_results(previous_file)
+    header = next(previous_lines)
+    delta_lines = read_results(delta_results_file)
+    delta_header = next(delta_lines)
+    if delta_header != header:
+        # align the delta columns with the previous file (columns it lacks are left empty)
+        positions = [delta_header.index(column) if column in delta_header else None for column in header]
+        delta_lines = (
+            "\t".join(fields[i] if i is not None else "" for i in positions)
+            for fields in (line.split("\t") for line in delta_lines)
+        )
+        print(f"WARNING: delta results columns differ from {previous_file}, aligned to its header", file=sys.stderr)
+
+    def key(line):
+        return chain_id(line.split("\t", 1)[0])
+
+    def is_kept(line):
+        chain = key(line).encode()
+        i = np.searchsorted(excluded_ids, chain)
+        return not (i < excluded_ids.size and excluded_ids[i] == chain)
+
+    counts = [0, 0]
+
+    def counted(lines, which):
+        for line in lines:
+            counts[which] += 1
+            yield line
+
+    # a chain's rows come from one side only: changed chains were excluded from the previous rows
+    previous_sorted = external_sort(
+        (line for line in previous_lines if is_kept(line)), key=key, max_memory_mb=max_memory_mb, tmp_dir=tmp_dir)
+    delta_sorted = external_sort(delta_lines, key=key, max_memory_mb=max_memory_mb, tmp_dir=tmp_dir)
+    with open(output, "w") as out:
+        out.write("\t".join(header) + "\n")
+        for line in heapq.merge(counted(previous_sorted, 0), counted(delta_sorted, 1), key=key):
+            out.write(line + "\n")
+    return counts[0], counts[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental runs: delta of the input and merge of the results.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = subparsers.add_parser("index", help="Build a delta index from a manifest or final results")
+    source = index_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--manifest", help="Input manifest (or id <TAB> zip_name mapping) of the run")
+    source.add_argument("--results", help="final_results.tsv of the run (no CRCs)")
+    index_parser.add_argument("--output", required=True, help="Output index (.npz)")
+
+    delta_parser = subparsers.add_parser("delta", help="Ids that are new, changed or removed since the previous run")
+    previous = delta_parser.add_mutually_exclusive_group(required=True)
+    previous.add_argument("--previous_index", help="Delta index of the previous run")
+    previous.add_argument("--previous_results", help="final_results.tsv of the previous run, if it has no index")
+    delta_parser.add_argument("--manifest", required=True, help="New input manifest (or id <TAB> zip_name mapping)")
+    delta_parser.add_argument("--mapping", required=True, help="Output id <TAB> zip_name of the new and changed ids")
+    delta_parser.add_argument("--delta", required=True, help="Output TSV of id and status (new, changed, removed)")
+    delta_parser.add_argument("--index_out", required=True, help="Output delta index of the new input")
+
+    merge_parser = subparsers.add_parser("merge", help="Merge the previous and delta final results")
+    merge_parser.add_argument("--previous", required=True, help="final_results.tsv of the previous run")
+    merge_parser.add_argument("--delta_results", required=True, help="final_results.tsv of the delta run")
+    merge_parser.add_argument("--delta", required=True, help="Delta TSV written by 'delta'")
+    merge_parser.add_argument("--output", required=True, help="Output merged final results")
+    merge_parser.add_argument("--max_memory_mb", type=int, default=1024, help="Sort buffer size in MB (default: 1024)")
+    merge_parser.add_argument("--tmp_dir", default=None, help="Directory for sorted runs (default: system temp)")
+
+    args = parser.parse_args()
+
+    if args.command == "index":
+        if args.manifest:
+            rows = list(read_manifest(args.manifest))
+            ids, crcs = make_index([row[0] for row in rows], [row[2] for row in rows])
+        else:
+            ids, crcs = index_from_results(args.results)
+        write_index(args.output, ids, crcs)
+        print(f"Indexed {ids.size} ids in '{args.output}'", file=sys.stderr)
+
+    elif args.command == "delta":
+        if args.previous_index:
+            previous_ids, previous_crcs = load_index(args.previous_index)
+        else:
+            previous_ids, previous_crcs = index_from_results(args.previous_results)
+        rows = list(read_manifest(args.manifest))
+        zip_of = {row[0]: row[1] for row in rows}
+        ids, crcs = make_index([row[0] for row in rows], [row[2] for row in rows])
+        status, removed = compute_delta(previous_ids, previous_crcs, ids, crcs)
+
+        with open(args.mapping, "w") as mapping, open(args.delta, "w") as delta:
+            delta.write("id\tstatus\n")
+            for pdb_id, pdb_status in zip(ids[status != ""].tolist(), status[status != ""].tolist()):
+                pdb_id = pdb_id.decode()
+                mapping.write(f"{pdb_id}\t{zip_of[pdb_id]}\n")
+                delta.write(f"{pdb_id}\t{pdb_status}\n")
+            for pdb_id in removed.tolist():
+                delta.write(f"{pdb_id.decode()}\t{REMOVED}\n")
+        write_index(args.index_out, ids, crcs)
+        print(
+            f"{(status == NEW).sum()} new, {(status == CHANGED).sum()} changed, {removed.size} removed, "
+            f"{(status == '').sum()} unchanged",
+            file=sys.stderr,
+        )
+
+    else:
+        excluded = []
+        with open(args.delta) as f:
+            f.readline()
+            for line in f:
+                pdb_id, pdb_status = line.rstrip("\n").split("\t")
+                if pdb_status in (CHANGED, REMOVED):
+                    excluded.append(pdb_id)
+        excluded_ids = np.array(sorted(excluded), dtype=bytes) if excluded else np.array([], dtype="S1")
+        kept, added = merge_results(
+            args.previous, args.delta_results, excluded_ids, args.output, args.max_memory_mb, args.tmp_dir)
+        print(f"Merged {kept} previous rows and {added} delta rows into '{args.output}'", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Memory-bounded sorting of text lines.
+
+Lines are buffered until the buffer reaches the memory limit, then sorted and spilled to
+a run file on disk. The runs are combined with a k-way merge (at most max_open_files at
+a time, merging in rounds when there are more runs). The sort is stable, so lines with
+equal keys keep their input order, and the result is the same as sorted() in memory.
+
+Used by chunk_by_zip.py and chunk_consensus_by_zip.py (--max_memory_mb), and on its own to
+sort and de-duplicate the id <TAB> zip_name input mapping:
+
+    external_sort.py --input input_mapping.tsv --output all_ids_mapping.txt --id_mapping --unique --max_memory_mb 1024
+"""
+
+import argparse
+import heapq
+import itertools
+import os
+import shutil
+import tempfile
+
+ROW_OVERHEAD = 100  # approximate bytes of Python object overhead per buffered line
+MAX_OPEN_FILES = 256
+
+
+def _write_run(lines, tmp_dir):
+    fd, path = tempfile.mkstemp(prefix="run_", suffix=".txt", dir=tmp_dir)
+    with os.fdopen(fd, "w") as out:
+        for line in lines:
+            out.write(line + "\n")
+    return path
+
+
+def _read_run(path):
+    with open(path) as f:
+        for line in f:
+            yield line[:-1]
+
+
+def _merge_runs(paths, key, tmp_dir, max_open_files):
+    """Merges run files in rounds until at most max_open_files remain, then yields the final merge."""
+    while len(paths) > max_open_files:
+        merged = []
+        for start in range(0, len(paths), max_open_files):
+            group = paths[start:start + max_open_files]
+            merged.append(_write_run(heapq.merge(*[_read_run(p) for p in group], key=key), tmp_dir))
+            for path in group:
+                os.remove(path)
+        paths = merged
+    yield from heapq.merge(*[_read_run(p) for p in paths], key=key)
+
+
+def external_sort(lines, key=None, max_memory_mb=1024, tmp_dir=None, max_open_files=MAX_OPEN_FILES):
+    """
+    Yields lines (without newlines) in stable sorted order using at most about max_memory_mb of buffer.
+
+    Args:
+        lines: Iterable of strings without trailing newlines.
+        key: Sort key function (default: the line itself).
+        max_memory_mb: Buffer size before a run is spilled to disk.
+        tmp_dir: Directory for the run files (default: the system temp directory).
+        max_open_files: Maximum number of runs merged at once.
+    """
+    limit = max_memory_mb * 1024 * 1024
+    work_dir = tempfile.mkdtemp(prefix="external_sort_", dir=tmp_dir)
+    try:
+        runs = []
+        buffer = []
+        size = 0
+        for line in lines:
+            buffer.append(line)
+            size += len(line) + ROW_OVERHEAD
+            if size >= limit:
+                buffer.sort(key=key)
+                runs.append(_write_run(buffer, work_dir))
+                buffer = []
+                size = 0
+
+        buffer.sort(key=key)
+        if not runs:
+            yield from buffer
+            return
+        if buffer:
+            runs.append(_write_run(buffer, work_dir))
+        del buffer
+        yield from _merge_runs(runs, key, work_dir, max_open_files)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def unique_sorted(lines):
+    """Drops adjacent duplicate lines from a sorted stream."""
+    for line, _ in itertools.groupby(lines):
+        yield line
+
+
+def id_mapping_lines(input_file):
+    """Yields trimmed 'id <TAB> zip_name' lines from a mapping file, skipping rows with a blank id or zip name."""
+    with open(input_file) as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 2:
+                continue
+            pdb_id, zip_name = fields[0].strip(), fields[1].strip()
+            if pdb_id and zip_name:
+                yield f"{pdb_id}\t{zip_name}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sort text lines with bounded memory.")
+    parser.add_argument("--input", required=True, help="Input text file")
+    parser.add_argument("--output", required=True, help="Output text file")
+    parser.add_argument("--max_memory_mb", type=int, default=1024, help="Sort buffer size in MB (default: 1024)")
+    parser.add_argument("--tmp_dir", default=None, help="Directory for run files (default: system temp)")
+    parser.add_argument("--unique", action="store_true", help="Drop duplicate lines")
+    parser.add_argument("--id_mapping", action="store_true",
+                        help="Read the first two columns (id, zip_name) trimmed, skipping blank rows")
+    parser.add_argument("--head", type=int, default=None, help="Only write the first N lines")
+    args = parser.parse_args()
+
+    if args.id_mapping:
+        lines = id_mapping_lines(args.input)
+    else:
+        lines = (line.rstrip("\n") for line in open(args.input))
+
+    sorted_lines = external_sort(lines, max_memory_mb=args.max_memory_mb, tmp_dir=args.tmp_dir)
+    if args.unique:
+        sorted_lines = unique_sorted(sorted_lines)
+    if args.head is not None:
+        sorted_lines = itertools.islice(sorted_lines, args.head)
+
+    with open(args.output, "w") as out:
+        for line in sorted_lines:
+            out.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main()
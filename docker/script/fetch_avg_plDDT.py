@@ -1,51 +1,86 @@
 #!/usr/bin/env python
 
+"""
+Writes the average CA pLDDT (B-factor column) of every domain PDB file.
+
+The input can be a directory of PDB files or an archive of them (.tar.gz, .tgz, .tar,
+.tar.zst or .zip, see chopped_archive.py). Archive members are read straight from the
+archive without extracting to disk, and the B-factors are parsed with vectorised
+fixed-column slicing of the raw bytes. The output (file name <TAB> mean pLDDT) is written sorted by file name.
+
+The whole B-factor field (columns 61-66) is read. The previous per-line parser read columns 62-66,
+so a pLDDT of 100.00 was read as 0.00; averages of domains with such residues differ from its output.
+
+Usage:
+    fetch_avg_plDDT.py <pdb_directory | chopped_pdbs.tar.gz | chopped_pdbs.zip> -o domain_avg_plddt.tsv
+"""
+
 import os
 import argparse
-import shutil
-import tarfile
-
-def count_plddt_scores(file_path):
-    plddts = []
-    with open(file_path, 'r') as refpdbfile:
-        for line in refpdbfile:
-            if line[:4] == 'ATOM' and line[12:16] == ' CA ':
-                plddts.append(float(line[61:66]))
-
-    if plddts:
-        plddts.sort()
-        idx20 = len(plddts) // 5
-        mean_80_plddt = sum(plddts[idx20:]) / (len(plddts) - idx20)
-        mean_plddt = sum(plddts) / len(plddts)
-        return mean_plddt, mean_80_plddt
-    return None, None
+
+from chopped_archive import SUFFIXES, archive_format, iter_members
+from pdb_records import atom_name_mask, field_fixed, record_matrix
+
+
+def ca_plddt_scores(data):
+    """Returns the CA atom B-factors (columns 61-66) of a PDB file as a float64 array."""
+    records = record_matrix(data)
+    return field_fixed(records[atom_name_mask(records, b" CA ")], 60, 66, 2)
+
+
+def mean_plddt(data):
+    """Returns the mean CA pLDDT of a PDB file, or None if it has no CA atoms."""
+    plddts = ca_plddt_scores(data)
+    if plddts.size == 0:
+        return None
+    return float(plddts.mean())
+
+
+def iter_pdb_files(source, suffix=".pdb"):
+    """
+    Yields (file name, contents) for every PDB file in a directory or archive.
+
+    Args:
+        source: Directory, tar (optionally gzip or zstd compressed) or zip file.
+        suffix: Suffix used to select PDB files.
+    """
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for file in files:
+                if file.endswith(suffix):
+                    with open(os.path.join(root, file), "rb") as f:
+                        yield file, f.read()
+    elif archive_format(source):
+        yield from iter_members(source, suffix)
+    else:
+        raise ValueError(f"Unsupported input (expected a directory, {', '.join(SUFFIXES)}): {source}")
+
+
+def write_avg_plddt(source, outfile):
+    """Writes file name <TAB> mean CA pLDDT for every PDB file of source, sorted by file name; returns the row count."""
+    rows = []
+    for file, data in iter_pdb_files(source):
+        plddt = mean_plddt(data)
+        if plddt is not None:
+            rows.append((file, plddt))
+    rows.sort()
+
+    with open(outfile, 'w') as fn:
+        for file, plddt in rows:
+            fn.write(f"{file}\t{plddt:.4f}\n")
+    return len(rows)
+
 
 def main():
 
     parser = argparse.ArgumentParser()
     # Add arguments
-    parser.add_argument('pdb_directory', type=str, help='Directory containing PDB files to process')
+    parser.add_argument('pdb_directory', type=str, help='Directory or archive (.tar.gz, .tgz, .tar, .tar.zst, .zip) of PDB files to process')
     parser.add_argument('-o', '--outfile', type=str, required=True, help="Output file")
-    parser.add_argument('--plddt_threshold', type=float, default=0.9, required=False, help="If the pLDDT80 is greater than this number, process the domain.")
- #   parser.add_argument('--outdir', type=str, required=True, help="Directory to move pLDDT80 > --plddt_threshold domain PDBs to.")
     # Parse the argument
     args = parser.parse_args()
 
-#    if not os.path.exists(args.outdir):
-#        os.mkdir(args.outdir)
-
-    with open(args.outfile, 'w+') as fn:
-        for root, _, files in os.walk(args.pdb_directory):
-            for file in files:
-                if file.endswith('.pdb'):
-                    file_path = os.path.join(root, file)
-                    mean_plddt, mean_80_plddt = count_plddt_scores(file_path)
-                    if mean_plddt is not None:
-                        #fn.write(f"{os.path.basename(file)}\t{mean_plddt:.4f}\t{mean_80_plddt:.4f}\n")
-                        fn.write(f"{os.path.basename(file)}\t{mean_plddt:.4f}\n")
-#                        if mean_80_plddt >= args.plddt_threshold:
-#                            shutil.move(file_path, args.outdir)
-
+    write_avg_plddt(args.pdb_directory, args.outfile)
 
 if __name__=="__main__":
-    main()
\ No newline at end of file
+    main()
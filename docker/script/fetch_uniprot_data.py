@@ -5,13 +5,10 @@ import io
 import time
 import json
 import math
-import requests
-import pandas as pd
-from requests.adapters import HTTPAdapter, Retry
 
 TOOL_NAME = "domain-annotation-pipeline"
 TOOL_EMAIL = "i.sillitoe@ucl.ac.uk"
-MISSING_VALUE = pd.NA
+MISSING_VALUE = ""
 
 API_URL = "https://rest.uniprot.org"
 POLLING_INTERVAL = 3  # seconds
@@ -19,14 +16,28 @@ POLLING_INTERVAL = 3  # seconds
 # UniProt accession-ish regex (classic + extended)
 UNIPROT_ACC_RE = re.compile(r'^[A-Z0-9]{6,10}$')
 
-# Session with retries on transient errors
-session = requests.Session()
-retries = Retry(
-    total=5,
-    backoff_factor=0.5,
-    status_forcelist=[500, 502, 503, 504],
-)
-session.mount("https://", HTTPAdapter(max_retries=retries))
+_session = None
+
+
+def get_session():
+    """
+    Returns the session with retries on transient errors, created on first use: requests is
+    only imported when a batch actually queries UniProt, not on every start.
+    """
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter, Retry
+
+        _session = requests.Session()
+        retries = Retry(
+            total=5,
+            backoff_factor=0.5,
+            status_forcelist=[500, 502, 503, 504],
+        )
+        _session.mount("https://", HTTPAdapter(max_retries=retries))
+    return _session
+
 
 def normalise_afdb_id(s: str) -> str:
     s = s.strip()
@@ -56,13 +67,15 @@ def clean_accessions(accessions):
 
 def submit_id_mapping(ids):
     """Submit an ID mapping job: UniProtKB_AC-ID -> UniProtKB."""
+    import requests
+
     data = {
         "from": "UniProtKB_AC-ID",
         "to": "UniProtKB",
         "ids": ",".join(ids),
     }
     print(f"[INFO]   Submitting ID mapping job for {len(ids)} IDs...")
-    resp = session.post(f"{API_URL}/idmapping/run", data=data)
+    resp = get_session().post(f"{API_URL}/idmapping/run", data=data)
     try:
         resp.raise_for_status()
     except requests.HTTPError:
@@ -83,6 +96,8 @@ def submit_id_mapping(ids):
 
 def wait_for_job(job_id, poll_interval=POLLING_INTERVAL, max_wait=600):
     """Poll job status until finished or error."""
+    import requests
+
     start = time.time()
     attempt = 0
     retries = 0
@@ -91,7 +106,7 @@ def wait_for_job(job_id, poll_interval=POLLING_INTERVAL, max_wait=600):
         while True:
             attempt += 1
             try:
-                resp = session.get(f"{API_URL}/idmapping/status/{job_id}")
+                resp = get_session().get(f"{API_URL}/idmapping/status/{job_id}")
                 resp.raise_for_status()
             except requests.RequestException as e:
                 print(f"[ERROR]   Exception during status check for job {job_id}: {e}")
@@ -132,6 +147,8 @@ def download_mapping_results(job_id):
       organism_name  -> Organism
       lineage        -> Taxonomic lineage (all)
     """
+    import requests
+
     params = {
         "format": "tsv",
         "fields": "accession,organism_id,organism_name,lineage",
@@ -150,7 +167,7 @@ def download_mapping_results(job_id):
         else:
             params.pop("cursor", None)
         print(f"[INFO]   Fetching batch {batch} with params: {params}...")
-        resp = session.get(endpoint, params=params)
+        resp = get_session().get(endpoint, params=params)
         try:
             resp.raise_for_status()
         except requests.HTTPError:
@@ -318,6 +335,8 @@ def fetch_uniprot_batch(accessions):
 
 def fetch_uniprot_info(accession):
     """Fetch UniProt taxonomy and proteome metadata for a given accession."""
+    import requests
+
     url = f"https://rest.uniprot.org/uniprotkb/search?query=accession:{accession}&fields=xref_proteomes,organism_name&format=json"
     response = requests.get(url)
     data = response.json()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Chain filter for a chunk of ids in an input zip.
+
+Keeps the chains whose PDB file has exactly one model, exactly one chain and more than
+--min_residues residues, counted as pdb_wc does (see pdb_records.structure_counts). Every
+member is read through one zip handle (ZipIndex, optionally with its sidecar index), and
+with --cpus > 1 the ids are split over a pool of workers, each with its own handle.
+
+Optional pLDDT pre-screen: chains that pass the filter but whose mean CA pLDDT is below
+--min_mean_plddt, or whose fraction of CA atoms with pLDDT >= --plddt_cutoff is below
+--min_fraction_above, are mostly disordered and rarely give high or medium domains. They skip
+segmentation (reason low_plddt) and are written to --no_domains as consensus rows without
+domains, so they are still accounted for in domain_assignments.consensus.tsv.
+
+Outputs:
+    filtered_ids.txt     kept ids, in input order
+    residue_counts.tsv   kept id <TAB> residues (<TAB> coordinate hash, with --coordinate_hash)
+    filter_reasons.tsv   id, status (kept/skipped), reason, models, chains, residues,
+                         mean_plddt, fraction_above, for every id
+    no_domains.tsv       (--no_domains) consensus rows of the pre-screened chains:
+                         id, md5, nres, 0, 0, 0, na, na, na
+
+Usage:
+    filter_chains.py --pdb_zip pdbs.zip --id_file ids.txt --min_residues 25 \
+        --filtered_ids filtered_ids.txt --residue_counts residue_counts.tsv --reasons filter_reasons.tsv \
+        [--min_mean_plddt 50 --plddt_cutoff 70 --min_fraction_above 0.2 --no_domains no_domains.tsv]
+"""
+
+import argparse
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from pdb_records import atom_name_mask, coordinate_hash, field_fixed, record_matrix, structure_counts
+from pdb_to_md5 import md5_of_sequence, sequence_from_pdb_bytes
+from zip_index import PDB_SUFFIX, ZipIndex
+
+REASONS_HEADER = "id\tstatus\treason\tmodels\tchains\tresidues\tmean_plddt\tfraction_above\n"
+
+KEPT = "kept"
+MISSING = "missing"
+MULTIPLE_MODELS = "multiple_models"
+MULTIPLE_CHAINS = "multiple_chains"
+TOO_FEW_RESIDUES = "too_few_residues"
+LOW_PLDDT = "low_plddt"
+
+_index = None
+
+
+def plddt_summary(data, cutoff):
+    """
+    Returns (mean pLDDT, fraction of residues with pLDDT >= cutoff) over the CA atoms of a PDB file.
+
+    Args:
+        data: Raw PDB file contents.
+        cutoff: pLDDT cutoff for the fraction.
+
+    Returns:
+        Tuple of floats, (0.0, 0.0) for a file without CA atoms.
+    """
+    records = record_matrix(data)
+    plddt = field_fixed(records[atom_name_mask(records, b" CA ")], 60, 66, 2)
+    if plddt.size == 0:
+        return 0.0, 0.0
+    return float(plddt.mean()), float((plddt >= cutoff).mean())
+
+
+def check_chain(data, min_residues, prescreen=None):
+    """
+    Applies the filter, and the optional pLDDT pre-screen, to one PDB file.
+
+    Args:
+        data: Raw PDB file contents.
+        min_residues: Chains need more residues than this.
+        prescreen: (min_mean_plddt, plddt_cutoff, min_fraction_above), or None to skip the pre-screen.
+
+    Returns:
+        Tuple of (reason, models, chains, residues, mean_plddt, fraction_above); reason is KEPT for
+        a kept chain and the pLDDT values are empty strings when the pre-screen was not applied.
+    """
+    models, chains, residues = structure_counts(data)
+    mean_plddt = fraction_above = ""
+    if models != 1:
+        reason = MULTIPLE_MODELS
+    elif chains != 1:
+        reason = MULTIPLE_CHAINS
+    elif residues <= min_residues:
+        reason = TOO_FEW_RESIDUES
+    elif prescreen:
+        min_mean_plddt, plddt_cutoff, min_fraction_above = prescreen
+        mean_plddt, fraction_above = plddt_summary(data, plddt_cutoff)
+        if mean_plddt < min_mean_plddt or fraction_above < min_fraction_above:
+            reason = LOW_PLDDT
+        else:
+            reason = KEPT
+        mean_plddt, fraction_above = f"{mean_plddt:.2f}", f"{fraction_above:.4f}"
+    else:
+        reason = KEPT
+    return reason, models, chains, residues, mean_plddt, fraction_above
+
+
+def no_domains_row(chain_id, data, residues):
+    """Returns the consensus row of a chain that skips segmentation: sequence md5, nres and no domains."""
+    sequence = sequence_from_pdb_bytes(data, chain_id=None)
+    md5 = md5_of_sequence(sequence) if sequence else "NA"
+    return f"{chain_id}\t{md5}\t{residues}\t0\t0\t0\tna\tna\tna\n"
+
+
+def _open_index(pdb_zip, zip_index):
+    global _index
+    _index = ZipIndex(pdb_zip, zip_index, PDB_SUFFIX)
+
+
+def _check_ids(args):
+    chain_ids, min_residues, prescreen, hashes = args
+    results = []
+    for chain_id in chain_ids:
+        if chain_id not in _index:
+            results.append((chain_id, MISSING, "", "", "", "", "", None, ""))
+            continue
+        data = _index.read(chain_id)
+        result = check_chain(data, min_residues, prescreen)
+        row = no_domains_row(chain_id, data, result[3]) if result[0] == LOW_PLDDT else None
+        digest = coordinate_hash(data) if hashes and result[0] == KEPT else ""
+        results.append((chain_id,) + result + (row, digest))
+    return results
+
+
+def filter_chains(pdb_zip, ids, min_residues, zip_index=None, cpus=1, prescreen=None, hashes=False, index=None):
+    """
+    Yields (id, reason, models, chains, residues, mean_plddt, fraction_above, no_domains_row,
+    coordinate_hash) for every id, in input order. no_domains_row is the consensus row of a
+    pre-screened chain, else None; coordinate_hash is set for kept chains when hashes is true.
+
+    Args:
+        pdb_zip: Zip file containing <id>.pdb members.
+        ids: Chain ids to check.
+        min_residues: Chains need more residues than this.
+        zip_index: Sidecar index of pdb_zip (see zip_index.py), optional.
+        cpus: Worker processes.
+        prescreen: (min_mean_plddt, plddt_cutoff, min_fraction_above), or None to skip the pre-screen.
+        hashes: Also hash the normalised coordinates of kept chains (see pdb_records.coordinate_hash).
+        index: An open ZipIndex of pdb_zip to read from (single process only), e.g. kept open across chunks.
+    """
+    global _index
+    if cpus <= 1 or len(ids) < 2:
+        if index is not None:
+            _index = index
+        else:
+            _open_index(pdb_zip, zip_index)
+        yield from _check_ids((ids, min_residues, prescreen, hashes))
+        return
+
+    batch_size = max(1, len(ids) // (cpus * 4))
+    batches = [
+        (ids[start:start + batch_size], min_residues, prescreen, hashes) for start in range(0, len(ids), batch_size)
+    ]
+    with ProcessPoolExecutor(max_workers=cpus, initializer=_open_index, initargs=(pdb_zip, zip_index)) as pool:
+        for results in pool.map(_check_ids, batches):
+            yield from results
+
+
+def read_ids(id_file):
+    """Reads one id per line, skipping blank lines."""
+    with open(id_file) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def write_outputs(results, filtered_ids, residue_counts, reasons, no_domains=None):
+    """Writes the results of filter_chains to the output files and returns a Counter of the reasons."""
+    tally = Counter()
+    with open(filtered_ids, "w") as kept_out, \
+            open(residue_counts, "w") as counts_out, \
+            open(reasons, "w") as reasons_out, \
+            open(no_domains or os.devnull, "w") as no_domains_out:
+        reasons_out.write(REASONS_HEADER)
+        for chain_id, reason, models, chains, residues, mean_plddt, fraction_above, row, digest in results:
+            tally[reason] += 1
+            status = "kept" if reason == KEPT else "skipped"
+            reasons_out.write(
+                f"{chain_id}\t{status}\t{reason}\t{models}\t{chains}\t{residues}\t{mean_plddt}\t{fraction_above}\n"
+            )
+            if reason == KEPT:
+                kept_out.write(f"{chain_id}\n")
+                counts_out.write(f"{chain_id}\t{residues}\t{digest}\n" if digest else f"{chain_id}\t{residues}\n")
+            elif row:
+                no_domains_out.write(row)
+    return tally
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Filter the chains of a chunk by model, chain and residue counts.")
+    parser.add_argument("--pdb_zip", required=True, help="Zip file containing <id>.pdb members")
+    parser.add_argument("--id_file", required=True, help="Chain ids to check, one per line")
+    parser.add_argument("--zip_index", default=None, help="Sidecar index of --pdb_zip (see zip_index.py)")
+    parser.add_argument("--min_residues", type=int, required=True, help="Keep chains with more residues than this")
+    parser.add_argument("--filtered_ids", required=True, help="Output file of kept ids")
+    parser.add_argument("--residue_counts", required=True, help="Output TSV of kept id and residue count")
+    parser.add_argument("--reasons", required=True, help="Output TSV with the outcome for every id")
+    parser.add_argument("--cpus", type=int, default=1, help="Worker processes (default: 1)")
+    parser.add_argument("--min_mean_plddt", type=float, default=0,
+                        help="Pre-screen: skip chains with a lower mean CA pLDDT (default: 0, off)")
+    parser.add_argument("--plddt_cutoff", type=float, default=70,
+                        help="Pre-screen: pLDDT cutoff for --min_fraction_above (default: 70)")
+    parser.add_argument("--min_fraction_above", type=float, default=0,
+                        help="Pre-screen: skip chains with a lower fraction of residues at or above "
+                             "--plddt_cutoff (default: 0, off)")
+    parser.add_argument("--no_domains", default=None,
+                        help="Output TSV of consensus rows without domains for the pre-screened chains")
+    parser.add_argument("--coordinate_hash", action="store_true",
+                        help="Add the normalised coordinate hash of kept chains to --residue_counts, for deduplication")
+    args = parser.parse_args()
+
+    prescreen = None
+    if args.min_mean_plddt > 0 or args.min_fraction_above > 0:
+        prescreen = (args.min_mean_plddt, args.plddt_cutoff, args.min_fraction_above)
+
+    results = filter_chains(args.pdb_zip, read_ids(args.id_file), args.min_residues, args.zip_index, args.cpus,
+                            prescreen, args.coordinate_hash)
+    tally = write_outputs(results, args.filtered_ids, args.residue_counts, args.reasons, args.no_domains)
+
+    print(", ".join(f"{reason}: {count}" for reason, count in sorted(tally.items())) or "No ids", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
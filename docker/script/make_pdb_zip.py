@@ -15,6 +15,8 @@ try:
 except ImportError:
     gemmi = None
 
+from zip_index import ZipIndex
+
 
 _INVALID_ARCNAME = re.compile(r"[^A-Za-z0-9._-]+")
 _MOLSTAR_PREPROCESS_CANDIDATES = [
@@ -187,8 +189,9 @@ def main() -> int:
 
     requested = _load_list_file(list_file_path)
 
-    with zipfile.ZipFile(bcif_zip_path, "r") as zf:
-        members = [n for n in zf.namelist() if not n.endswith("/") and n.lower().endswith(".bcif")]
+    with ZipIndex(str(bcif_zip_path)) as zf:
+        # members are read by exact name with a direct seek instead of through ZipInfo objects
+        members = [n for n in zf.names() if n.lower().endswith(".bcif")]
         to_process = _select_members(members, requested)
 
         if not to_process:
@@ -227,13 +230,8 @@ def main() -> int:
                     bcif_path = tmp / _safe_arcname(stem, ".bcif")
                     working_cif_path = tmp / _safe_arcname(f"{stem}_molstar", ".cif")
 
-                    # Stream member to disk (avoid path traversal issues)
-                    with zf.open(member, "r") as src, bcif_path.open("wb") as dst:
-                        while True:
-                            chunk = src.read(1024 * 1024)
-                            if not chunk:
-                                break
-                            dst.write(chunk)
+                    # Write member to disk under a safe name (avoid path traversal issues)
+                    bcif_path.write_bytes(zf.read_name(member))
 
                     cif_path = (tmp / cif_name) if cif_name is not None else None
                     pdb_path = (tmp / pdb_name) if pdb_name is not None else None
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Streaming k-way merge of sorted text files with bounded memory and open files.
+
+annotate.nf collects every per-chunk output with toSortedList { it[0] } and collectFile, which
+holds every chunk tuple until the last chunk is done and then concatenates the files in chunk
+order. The per-chunk files are already sorted, so with params.collect_mode = 'merge' they are
+merged instead (see modules/merge_sorted_chunks.nf): in batches as their chunks complete, and
+the partial outputs are merged again into the collected file.
+
+    - one line per open file is held in memory
+    - at most --max_open_files files are read at once; with more, groups of files are merged
+      into temporary files first, in rounds (a hierarchical merge)
+    - with --header every file starts with a header line, which is written once (as
+      keepHeader with skip: 1); the headers must agree
+    - lines are compared as `sort` compares them in the C locale, or by one field with
+      --key_field (as `sort -t<sep> -k<N>,<N>`, ties by the whole line), and every file is
+      checked to be in that order, so a file sorted another way fails the merge
+    - lines are written as they are read, line endings included
+
+Merging the same files in any order, or in batches whose outputs are merged again, gives the
+same output.
+
+Usage:
+    merge_sorted.py --output all_md5.tsv --header chunk_*/output_*.tsv
+    merge_sorted.py --output all_domain_quality.csv --header --field_sep , --key_field 1 chunk_*/domain_quality.csv
+    merge_sorted.py --output merged.tsv --file_list files.txt [--max_open_files 256] [--tmp_dir tmp]
+"""
+
+import argparse
+import heapq
+import os
+import shutil
+import sys
+import tempfile
+
+MAX_OPEN_FILES = 256
+
+
+def line_key(line):
+    """Compares lines without their newline, as `sort` does."""
+    return line[:-1] if line.endswith("\n") else line
+
+
+def field_key(sep, field):
+    """Compares lines by one field (1-based), ties by the whole line."""
+
+    def key(line):
+        line = line_key(line)
+        fields = line.split(sep)
+        return (fields[field - 1] if field <= len(fields) else "", line)
+
+    return key
+
+
+def _open(path, mode="r"):
+    # newline="" keeps CRLF line endings as they are; surrogateescape passes any bytes through
+    return open(path, mode, newline="", errors="surrogateescape")
+
+
+def read_header(path):
+    """Returns the first line of a file, or None if it is empty."""
+    with _open(path) as f:
+        return f.readline() or None
+
+
+def read_sorted(path, key, skip_header=False):
+    """Yields the lines of a sorted file (newline-terminated), failing if they are out of order."""
+    with _open(path) as f:
+        if skip_header:
+            f.readline()
+        previous = None
+        for number, line in enumerate(f, start=2 if skip_header else 1):
+            if not line.endswith("\n"):
+                line += "\n"
+            current = key(line)
+            if previous is not None and current < previous:
+                raise ValueError(f"{path} is not sorted at line {number}")
+            previous = current
+            yield line
+
+
+def _write_run(lines, tmp_dir):
+    fd, path = tempfile.mkstemp(prefix="merge_", suffix=".txt", dir=tmp_dir)
+    with _open(fd, "w") as out:
+        out.writelines(lines)
+    return path
+
+
+def merge_sorted(paths, output, header=False, key=line_key, max_open_files=MAX_OPEN_FILES, tmp_dir=None):
+    """
+    Merges sorted files into output and returns the number of lines written (header included).
+
+    Args:
+        paths: Sorted input files.
+        output: Output file.
+        header: Every input file starts with a header line, written once.
+        key: Sort key of a line (default: the line without its newline).
+        max_open_files: Maximum number of files read at once (at least 2).
+        tmp_dir: Directory for the intermediate merges (default: the system temp directory).
+    """
+    if max_open_files < 2:
+        raise ValueError(f"max_open_files must be at least 2 (got {max_open_files})")
+    first_header = None
+    # (path, skip header) of the inputs with lines to merge
+    runs = []
+    for path in paths:
+        if header:
+            line = read_header(path)
+            if line is None:
+                continue
+            if first_header is None:
+                first_header = line
+            elif line_key(line) != line_key(first_header):
+                raise ValueError(f"Header of {path} differs from the first header: {line_key(line)!r}")
+        runs.append((path, header))
+
+    work_dir = tempfile.mkdtemp(prefix="merge_sorted_", dir=tmp_dir)
+    try:
+        while len(runs) > max_open_files:
+            merged = []
+            for start in range(0, len(runs), max_open_files):
+                group = runs[start:start + max_open_files]
+                merged.append((_write_run(heapq.merge(*[read_sorted(p, key, skip) for p, skip in group], key=key),
+                                          work_dir), False))
+                for path, _ in group:
+                    if os.path.dirname(path) == work_dir:
+                        os.remove(path)
+            runs = merged
+
+        count = 0
+        with _open(output, "w") as out:
+            if first_header is not None:
+                out.write(first_header if first_header.endswith("\n") else first_header + "\n")
+                count += 1
+            for line in heapq.merge(*[read_sorted(p, key, skip) for p, skip in runs], key=key):
+                out.write(line)
+                count += 1
+        return count
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge sorted text files into one sorted file.")
+    parser.add_argument("files", nargs="*", help="Sorted input files")
+    parser.add_argument("--file_list", default=None, help="File listing more input files, one per line")
+    parser.add_argument("--output", required=True, help="Output file")
+    parser.add_argument("--header", action="store_true", help="Every input starts with a header line, written once")
+    parser.add_argument("--field_sep", default="\t", help="Field separator for --key_field (default: tab)")
+    parser.add_argument("--key_field", type=int, default=0,
+                        help="Sort by this field (1-based), ties by the whole line (default: 0, the whole line)")
+    parser.add_argument("--max_open_files", type=int, default=MAX_OPEN_FILES,
+                        help=f"Files read at once, more are merged in rounds (default: {MAX_OPEN_FILES})")
+    parser.add_argument("--tmp_dir", default=None, help="Directory for intermediate merges (default: system temp)")
+    args = parser.parse_args()
+
+    paths = list(args.files)
+    if args.file_list:
+        with open(args.file_list) as f:
+            paths += [line.strip() for line in f if line.strip()]
+    key = field_key(args.field_sep, args.key_field) if args.key_field > 0 else line_key
+
+    try:
+        count = merge_sorted(paths, args.output, args.header, key, args.max_open_files, args.tmp_dir)
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Merged {len(paths)} files into {count} lines in '{args.output}'", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Fixed-column parsing of PDB coordinate records with NumPy.
+
+PDB ATOM/HETATM records use fixed columns, so rather than splitting every line in a
+Python loop the selected records are gathered into a 2D byte matrix (one row per
+record, RECORD_WIDTH columns) and each field is sliced out of that matrix and
+converted in a single vectorised call.
+
+parse_atoms builds on the same matrix to return every atom as one row of a NumPy structured
+array (ATOM_DTYPE), with helpers for residue indexing, selection by residue ranges and CA-only
+views; select_residues does the residue range selection of pdb_selres on the raw file.
+
+Usage:
+    records = record_matrix(pdb_bytes)
+    atom_names = field_str(records, 12, 16)
+    coords = coordinates(records)
+
+    atoms = parse_atoms(pdb_bytes)
+    domain = atoms[residue_range_mask(atoms, [(1, 50), (60, 100)])]
+    ca_coords = ca_atoms(domain)["coord"]
+"""
+
+import hashlib
+
+import numpy as np
+
+RECORD_WIDTH = 80
+ATOM_RECORDS = (b"ATOM  ",)
+COORDINATE_RECORDS = (b"ATOM  ", b"HETATM")
+# records carrying a residue number in columns 23-26, matched by prefix as in pdb_selres
+RESIDUE_RECORDS = (b"ATOM", b"HETATM", b"ANISOU", b"TER")
+
+# One atom per row. Text fields are the raw column bytes (e.g. atom_name b" CA "),
+# so they compare against constants without stripping; blank numeric fields are 0.
+ATOM_DTYPE = np.dtype([
+    ("record", "S6"),
+    ("serial", np.int64),
+    ("atom_name", "S4"),
+    ("alt_loc", "S1"),
+    ("res_name", "S3"),
+    ("chain_id", "S1"),
+    ("res_seq", np.int64),
+    ("i_code", "S1"),
+    ("coord", np.float64, (3,)),
+    ("occupancy", np.float64),
+    ("b_factor", np.float64),
+    ("element", "S2"),
+])
+
+_NEWLINE = ord("\n")
+_CARRIAGE_RETURN = ord("\r")
+_SPACE = ord(" ")
+# low n bytes of a little-endian uint64, for n = 0..8
+_BYTE_MASKS = np.array([(1 << (8 * n)) - 1 for n in range(9)], dtype=np.uint64)
+_BLANK_WORD = np.uint64(int.from_bytes(b" " * 8, "little"))
+
+
+def line_bounds(buf: np.ndarray):
+    """
+    Returns the (start, length) of every line in a uint8 buffer.
+
+    Args:
+        buf: File contents as a uint8 array.
+
+    Returns:
+        Tuple of (starts, lengths) int64 arrays.
+    """
+    newlines = np.flatnonzero(buf == _NEWLINE)
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [buf.size]))
+    lengths = ends - starts
+    # drop the empty "line" after a trailing newline
+    if lengths.size and lengths[-1] == 0:
+        starts, lengths = starts[:-1], lengths[:-1]
+    return starts, lengths
+
+
+def line_windows(padded: np.ndarray, starts: np.ndarray, width: int) -> np.ndarray:
+    """
+    Returns a (n_lines, width) copy of the width bytes from every line start.
+
+    Rows are copied from a sliding window view of the buffer, which avoids building an
+    (n_lines, width) index array. padded must extend at least width bytes past the last start.
+    """
+    return np.lib.stride_tricks.sliding_window_view(padded, width)[starts]
+
+
+def record_mask(padded: np.ndarray, starts: np.ndarray, lengths: np.ndarray, records) -> np.ndarray:
+    """
+    Returns a boolean mask of the lines that start with any of records (at most 8 bytes each,
+    e.g. b"ATOM  " for the full 6-column record name or b"TER" for a prefix).
+
+    The first 8 bytes of every line are read as one little-endian integer, so each record
+    is matched with one masked integer comparison per line. padded must extend at least 8
+    bytes past the last start.
+    """
+    words = np.ndarray((padded.size - 7,), dtype="<u8", buffer=padded, strides=(1,))[starts]
+    # bytes past the end of a short line belong to the next line and count as spaces
+    if lengths.size and lengths.min() < 8:
+        kept = _BYTE_MASKS[np.minimum(lengths, 8)]
+        words = (words & kept) | (_BLANK_WORD & ~kept)
+    mask = np.zeros(starts.size, dtype=bool)
+    for record in records:
+        prefix = np.uint64((1 << (8 * len(record))) - 1)
+        mask |= (words & prefix) == np.uint64(int.from_bytes(record, "little"))
+    return mask
+
+
+def record_matrix(data: bytes, records=ATOM_RECORDS, width: int = RECORD_WIDTH) -> np.ndarray:
+    """
+    Gathers the selected PDB records into a (n_records, width) uint8 matrix.
+
+    Short lines are padded with spaces and carriage returns are blanked, so every
+    field can be sliced by its PDB column numbers (0-based, end exclusive).
+
+    Args:
+        data: Raw PDB file contents.
+        records: Record names (6 bytes, space padded) to keep.
+        width: Number of columns to keep per record.
+
+    Returns:
+        uint8 array of shape (n_records, width).
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if buf.size == 0:
+        return np.empty((0, width), dtype=np.uint8)
+
+    starts, lengths = line_bounds(buf)
+    padded = np.concatenate((buf, np.full(max(width, 8), _SPACE, dtype=np.uint8)))
+
+    keep = record_mask(padded, starts, lengths, records)
+    starts, lengths = starts[keep], lengths[keep]
+    matrix = line_windows(padded, starts, width)
+    if lengths.size and lengths.min() < width:
+        matrix[np.arange(width) >= lengths[:, None]] = _SPACE
+    if b"\r" in data:
+        matrix[matrix == _CARRIAGE_RETURN] = _SPACE
+    return matrix
+
+
+def field_bytes(records: np.ndarray, start: int, end: int) -> np.ndarray:
+    """Returns columns [start, end) of every record as a fixed-width bytes array."""
+    return np.ascontiguousarray(records[:, start:end]).view(f"S{end - start}").ravel()
+
+
+def field_str(records: np.ndarray, start: int, end: int) -> np.ndarray:
+    """Returns columns [start, end) of every record as stripped str values."""
+    return np.char.strip(field_bytes(records, start, end).astype(str))
+
+
+def field_float(records: np.ndarray, start: int, end: int) -> np.ndarray:
+    """Returns columns [start, end) of every record parsed as float64."""
+    return field_bytes(records, start, end).astype(np.float64)
+
+
+def field_int(records: np.ndarray, start: int, end: int) -> np.ndarray:
+    """Returns columns [start, end) of every record parsed as int64."""
+    return field_bytes(records, start, end).astype(np.int64)
+
+
+_DIGIT_ZERO = ord("0")
+_MINUS = ord("-")
+_POINT = ord(".")
+
+
+def _parse_fixed(columns: np.ndarray, decimals: int):
+    """
+    Parses right-aligned fixed-point numbers, one per row of a (n, width) uint8 array.
+
+    The digits of every row are combined with a matrix product and divided by 10**decimals
+    once, which gives the same (correctly rounded) values as float(). Row-wise reductions
+    (any/all along axis 1) are slow on such short rows, so they are matrix products too.
+
+    Returns:
+        float64 array of n values, or None if any field is not in the layout (digits, spaces,
+        a minus sign and, with decimals, a point at its fixed column).
+    """
+    width = columns.shape[1]
+    digits = columns - np.uint8(_DIGIT_ZERO)
+    is_digit = digits <= 9
+    is_minus = columns == _MINUS
+    layout = is_digit | is_minus | (columns == _SPACE)
+    point = width - decimals - 1 if decimals else width
+    if decimals:
+        layout[:, point] = columns[:, point] == _POINT
+    if not layout.all():
+        return None
+    # place value of each column in the number read without its decimal point
+    powers = 10.0 ** (width - 1 - np.arange(width))
+    if decimals:
+        powers[:point] /= 10
+        powers[point] = 0
+    values = (digits * is_digit).astype(np.float64) @ powers
+    values[is_minus.astype(np.float64) @ np.ones(width) > 0] *= -1
+    return values / 10 ** decimals if decimals else values
+
+
+def field_fixed(records: np.ndarray, start: int, end: int, decimals: int) -> np.ndarray:
+    """
+    Returns columns [start, end) of every record parsed as float64, for fixed-point fields
+    such as the coordinates (%8.3f) and B-factors (%6.2f). Several times faster than
+    field_float; fields that are not in the fixed-point layout fall back to it.
+    """
+    values = _parse_fixed(records[:, start:end], decimals)
+    return values if values is not None else field_float(records, start, end)
+
+
+def field_int_fast(records: np.ndarray, start: int, end: int) -> np.ndarray:
+    """Returns columns [start, end) of every record parsed as int64, blank fields as 0."""
+    values = _parse_fixed(records[:, start:end], 0)
+    if values is None:
+        values = field_bytes(records, start, end).copy()
+        values[(records[:, start:end] == _SPACE).all(axis=1)] = b"0"
+    return values.astype(np.int64)
+
+
+def coordinates(records: np.ndarray) -> np.ndarray:
+    """Returns the x, y, z columns of every record as a (n_records, 3) float64 array."""
+    values = _parse_fixed(records[:, 30:54].reshape(-1, 8), 3)
+    if values is not None:
+        return values.reshape(-1, 3)
+    return np.stack(
+        (field_float(records, 30, 38), field_float(records, 38, 46), field_float(records, 46, 54)),
+        axis=1,
+    )
+
+
+def atom_name_mask(records: np.ndarray, name: bytes) -> np.ndarray:
+    """Returns a boolean mask of records whose atom name (columns 13-16) equals name, e.g. b' CA '."""
+    return (records[:, 12:16] == np.frombuffer(name, dtype=np.uint8)).all(axis=1)
+
+
+def residue_starts(records: np.ndarray) -> np.ndarray:
+    """
+    Returns a boolean mask marking the first record of every residue.
+
+    A new residue starts whenever the chain id, residue number or insertion code
+    (columns 22-27) differs from the previous record.
+    """
+    if records.shape[0] == 0:
+        return np.zeros(0, dtype=bool)
+    key = records[:, 21:27]
+    starts = np.ones(records.shape[0], dtype=bool)
+    starts[1:] = (key[1:] != key[:-1]).any(axis=1)
+    return starts
+
+
+def structure_counts(data: bytes):
+    """
+    Counts models, chains and residues the way pdb_wc does.
+
+    Chains are distinct chain ids (column 22) of ATOM and HETATM records and residues are
+    distinct residue name, chain, number and insertion code (columns 18-26) of ATOM records,
+    both within each MODEL. A file without MODEL records has one model.
+
+    Args:
+        data: Raw PDB file contents.
+
+    Returns:
+        Tuple of (models, chains, residues).
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if buf.size == 0:
+        return 1, 0, 0
+
+    width = 27
+    starts, lengths = line_bounds(buf)
+    padded = np.concatenate((buf, np.full(width, _SPACE, dtype=np.uint8)))
+    lines = line_windows(padded, starts, width)
+    lines[np.arange(width) >= lengths[:, None]] = _SPACE
+    lines[lines == _CARRIAGE_RETURN] = _SPACE
+
+    is_model = record_mask(padded, starts, lengths, (b"MODEL",))
+    is_atom = record_mask(padded, starts, lengths, (b"ATOM",))
+    is_hetatm = record_mask(padded, starts, lengths, (b"HETATM",))
+
+    # every record belongs to the last MODEL record before it ("X   " before the first one)
+    model_line = np.maximum.accumulate(np.where(is_model, np.arange(lines.shape[0]), -1))
+    model_ids = np.where((model_line >= 0)[:, None], lines[np.maximum(model_line, 0), 10:14],
+                         np.frombuffer(b"X   ", dtype=np.uint8))
+
+    n_models = len({model_id.strip() for model_id in field_bytes(lines[is_model], 10, 14).tolist()}) or 1
+    chain_keys = np.concatenate((model_ids, lines[:, 21:22]), axis=1)[is_atom | is_hetatm]
+    residue_keys = np.concatenate((model_ids, lines[:, 17:26]), axis=1)[is_atom]
+    # a set of short bytes keys is much faster than np.unique(axis=0), which sorts void rows
+    n_chains = len(set(field_bytes(chain_keys, 0, chain_keys.shape[1]).tolist()))
+    n_residues = len(set(field_bytes(residue_keys, 0, residue_keys.shape[1]).tolist()))
+    return n_models, n_chains, n_residues
+
+
+def coordinate_hash(data: bytes) -> str:
+    """
+    Hashes the normalised atoms of a PDB file, so coordinate-identical structures hash the same.
+
+    Every ATOM/HETATM record contributes its atom name, alternate location, residue name,
+    residue number and insertion code as written, and its coordinates and B-factor (pLDDT)
+    parsed and rounded to the precision of the PDB format, so serial numbers, chain ids,
+    number formatting and the other records (headers, remarks) do not change the hash.
+
+    Args:
+        data: Raw PDB file contents.
+
+    Returns:
+        32-character hex digest.
+    """
+    records = record_matrix(data, COORDINATE_RECORDS)
+    names = np.ascontiguousarray(np.concatenate((records[:, 12:20], records[:, 22:27]), axis=1))
+    values = np.rint(np.column_stack((coordinates(records) * 1000, field_float(records, 60, 66) * 100)))
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(names.tobytes())
+    digest.update(values.astype(np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def parse_atoms(data: bytes, records=COORDINATE_RECORDS) -> np.ndarray:
+    """
+    Parses the coordinate records of a PDB file into a structured array.
+
+    Every field is sliced out of the record matrix and converted for all atoms at once.
+    Serial numbers that are not decimal (hybrid-36 in very large files) are read as -1.
+
+    Args:
+        data: Raw PDB file contents.
+        records: Record names (6 bytes, space padded) to parse.
+
+    Returns:
+        Structured array of dtype ATOM_DTYPE, one row per record, in file order.
+    """
+    matrix = record_matrix(data, records)
+    atoms = np.empty(matrix.shape[0], dtype=ATOM_DTYPE)
+    if atoms.size == 0:
+        return atoms
+    for name, start, end in (("record", 0, 6), ("atom_name", 12, 16), ("alt_loc", 16, 17), ("res_name", 17, 20),
+                             ("chain_id", 21, 22), ("i_code", 26, 27), ("element", 76, 78)):
+        atoms[name] = field_bytes(matrix, start, end)
+    try:
+        atoms["serial"] = field_int_fast(matrix, 6, 11)
+    except ValueError:
+        atoms["serial"] = -1
+    atoms["res_seq"] = field_int_fast(matrix, 22, 26)
+    atoms["coord"] = coordinates(matrix)
+    atoms["occupancy"] = field_fixed(matrix, 54, 60, 2)
+    atoms["b_factor"] = field_fixed(matrix, 60, 66, 2)
+    return atoms
+
+
+def residue_index(atoms: np.ndarray) -> np.ndarray:
+    """
+    Returns the 0-based residue index of every atom.
+
+    A new residue starts whenever the chain id, residue number or insertion code differs
+    from the previous atom (as residue_starts does for a record matrix).
+    """
+    if atoms.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    starts = np.ones(atoms.size, dtype=bool)
+    starts[1:] = (
+        (atoms["chain_id"][1:] != atoms["chain_id"][:-1])
+        | (atoms["res_seq"][1:] != atoms["res_seq"][:-1])
+        | (atoms["i_code"][1:] != atoms["i_code"][:-1])
+    )
+    return np.cumsum(starts) - 1
+
+
+def residue_range_mask(atoms: np.ndarray, ranges) -> np.ndarray:
+    """
+    Returns a boolean mask of the atoms whose residue number is in any of the ranges.
+
+    Args:
+        atoms: Structured array from parse_atoms.
+        ranges: (start, end) residue number pairs, both inclusive, e.g. domain segments.
+    """
+    mask = np.zeros(atoms.size, dtype=bool)
+    for start, end in ranges:
+        mask |= (atoms["res_seq"] >= start) & (atoms["res_seq"] <= end)
+    return mask
+
+
+def ca_atoms(atoms: np.ndarray) -> np.ndarray:
+    """Returns the CA atoms of a structured array from parse_atoms (one per residue for a protein chain)."""
+    return atoms[(atoms["record"] == b"ATOM  ") & (atoms["atom_name"] == b" CA ")]
+
+
+def select_residues(data: bytes, ranges) -> bytes:
+    """
+    Keeps the ATOM, HETATM, ANISOU and TER records of a PDB file whose residue number is in any of
+    the ranges, and every other record, as pdb_selres does. Lines are returned unchanged.
+
+    Args:
+        data: Raw PDB file contents.
+        ranges: (start, end) residue number pairs, both inclusive.
+
+    Returns:
+        Selected PDB file contents.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if buf.size == 0:
+        return b""
+    width = 26
+    starts, lengths = line_bounds(buf)
+    padded = np.concatenate((buf, np.full(width, _SPACE, dtype=np.uint8)))
+    lines = line_windows(padded, starts, width)
+    lines[np.arange(width) >= lengths[:, None]] = _SPACE
+    lines[lines == _CARRIAGE_RETURN] = _SPACE
+
+    has_residue = record_mask(padded, starts, lengths, RESIDUE_RECORDS)
+    # records without a residue number (e.g. a bare TER) are kept
+    has_residue &= ~(lines[:, 22:26] == _SPACE).all(axis=1)
+
+    keep = np.ones(starts.size, dtype=bool)
+    rows = np.flatnonzero(has_residue)
+    res_seq = field_int(lines[rows], 22, 26)
+    in_range = np.zeros(rows.size, dtype=bool)
+    for start, end in ranges:
+        in_range |= (res_seq >= start) & (res_seq <= end)
+    keep[rows[~in_range]] = False
+
+    # lines keep their newline, so the selection is a concatenation of line slices
+    ends = np.minimum(starts + lengths + 1, buf.size)
+    return b"".join(data[start:end] for start, end in zip(starts[keep].tolist(), ends[keep].tolist()))
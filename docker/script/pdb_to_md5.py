@@ -1,12 +1,34 @@
 #!/usr/bin/env python3
 # modified to output header line which can be referred to by transform_consensus.py
+# Batch mode (--input) reads a directory, tar or zip of PDB files, extracts each chain sequence
+# with a byte-level fixed-column scan (same peptide rules as Biopython PPBuilder) and hashes the
+# sequences across a process pool. Biopython is only needed for the single-file mode.
 import sys
 import os
+import argparse
 import hashlib
-from Bio.PDB import PDBParser, PPBuilder
+from concurrent.futures import ProcessPoolExecutor
 from io import StringIO
 
+import numpy as np
+
+from fetch_avg_plDDT import iter_pdb_files
+from pdb_records import COORDINATE_RECORDS, atom_name_mask, coordinates, field_bytes, field_int, record_matrix
+
+# Standard amino acids accepted by PPBuilder (aa_only=1)
+THREE_TO_ONE = {
+    b"ALA": "A", b"CYS": "C", b"ASP": "D", b"GLU": "E", b"PHE": "F",
+    b"GLY": "G", b"HIS": "H", b"ILE": "I", b"LYS": "K", b"LEU": "L",
+    b"MET": "M", b"ASN": "N", b"PRO": "P", b"GLN": "Q", b"ARG": "R",
+    b"SER": "S", b"THR": "T", b"VAL": "V", b"TRP": "W", b"TYR": "Y",
+}
+PEPTIDE_BOND_RADIUS = 1.8  # PPBuilder default C--N distance
+HEADER = "pdb_file\tchain\tmd5\tsequence\n"
+
+
 def get_sequence_from_pdb(pdb_file, chain_id=None):
+    from Bio.PDB import PDBParser, PPBuilder
+
     parser = PDBParser(QUIET=True)
 
     with open(pdb_file, "r") as f:
@@ -36,13 +58,168 @@ def get_sequence_from_pdb(pdb_file, chain_id=None):
             return full_sequence
     return ""
 
+
+def _first_atom_per_residue(residue_index, mask, n_residues, records):
+    """Returns (has_atom, xyz) for the first record of each residue selected by mask."""
+    has_atom = np.zeros(n_residues, dtype=bool)
+    xyz = np.zeros((n_residues, 3))
+    residues, first = np.unique(residue_index[mask], return_index=True)
+    has_atom[residues] = True
+    xyz[residues] = coordinates(records[mask][first])
+    return has_atom, xyz
+
+
+def chain_residues(data, chain_id="A"):
+    """
+    Scans the residues of one chain from raw PDB bytes.
+
+    Residues are runs of ATOM/HETATM records with the same name, chain, number and
+    insertion code; only the first model is read.
+
+    Args:
+        data: Raw PDB file contents.
+        chain_id: Chain to read (None for the first chain in the file).
+
+    Returns:
+        Tuple of (residue numbers int array, one-letter codes list with '' for
+        non-standard residues, linked bool array where linked[i] is True if residues
+        i and i+1 are both standard and joined by a C--N bond < 1.8 A, chain id).
+    """
+    end_model = data.find(b"\nENDMDL")
+    if end_model >= 0:
+        data = data[:end_model + 1]
+
+    records = record_matrix(data, COORDINATE_RECORDS)
+    if records.shape[0] == 0:
+        return np.zeros(0, dtype=np.int64), [], np.zeros(0, dtype=bool), chain_id or ""
+
+    chains = records[:, 21]
+    chain = ord(chain_id) if chain_id else chains[0]
+    records = records[chains == chain]
+    if records.shape[0] == 0:
+        return np.zeros(0, dtype=np.int64), [], np.zeros(0, dtype=bool), chr(chain)
+
+    key = records[:, 17:27]
+    first = np.ones(records.shape[0], dtype=bool)
+    first[1:] = (key[1:] != key[:-1]).any(axis=1)
+    residue_index = np.cumsum(first) - 1
+    n_residues = int(residue_index[-1]) + 1
+
+    resnum = field_int(records[first], 22, 26)
+    resnames = field_bytes(records[first], 17, 20)
+    one_letter = [THREE_TO_ONE.get(name.strip().upper(), "") for name in resnames]
+    accepted = np.array([letter != "" for letter in one_letter], dtype=bool)
+
+    has_c, c_xyz = _first_atom_per_residue(residue_index, atom_name_mask(records, b" C  "), n_residues, records)
+    has_n, n_xyz = _first_atom_per_residue(residue_index, atom_name_mask(records, b" N  "), n_residues, records)
+
+    linked = np.zeros(n_residues, dtype=bool)
+    linked[:-1] = (
+        accepted[:-1] & accepted[1:] & has_c[:-1] & has_n[1:]
+        & (np.linalg.norm(n_xyz[1:] - c_xyz[:-1], axis=1) < PEPTIDE_BOND_RADIUS)
+    )
+    return resnum, one_letter, linked, chr(chain)
+
+
+def peptide_sequence(one_letter, selected, linked):
+    """
+    Joins the residues of a selection into a PPBuilder-style sequence.
+
+    Args:
+        one_letter: One-letter code per residue of the parent chain.
+        selected: Sorted indices of the selected residues.
+        linked: linked[i] is True if parent residues i and i+1 form a peptide bond.
+
+    Returns:
+        str: Residues that are part of a peptide of at least two selected residues.
+    """
+    selected = np.asarray(selected)
+    if selected.size < 2:
+        return ""
+    bonded = (selected[1:] == selected[:-1] + 1) & linked[selected[:-1]]
+    in_peptide = np.zeros(selected.size, dtype=bool)
+    in_peptide[:-1] |= bonded
+    in_peptide[1:] |= bonded
+    return "".join(one_letter[i] for i in selected[in_peptide])
+
+
+def sequence_from_pdb_bytes(data, chain_id="A"):
+    """
+    Extracts the peptide sequence of one chain from raw PDB bytes.
+
+    Follows Biopython PPBuilder: residues are standard amino acids, consecutive
+    residues are joined when C(i)--N(i+1) < 1.8 A, and residues that are not part of
+    a peptide of at least two residues are dropped. Only the first model is read.
+
+    Args:
+        data: Raw PDB file contents.
+        chain_id: Chain to read (None for the first chain in the file).
+
+    Returns:
+        str: The concatenated sequence of all peptides in the chain.
+    """
+    resnum, one_letter, linked, _ = chain_residues(data, chain_id)
+    return peptide_sequence(one_letter, np.arange(len(one_letter)), linked)
+
+
 def md5_of_sequence(sequence: str) -> str:
     cleaned_seq = sequence.strip().upper()
     return hashlib.md5(cleaned_seq.encode('utf-8')).hexdigest()
 
+
+def md5_row(item, chain="A"):
+    """Returns the output row for one (file name, contents) pair."""
+    name, data = item
+    seq = sequence_from_pdb_bytes(data, chain_id=chain)
+    if seq:
+        return f"{name}\t{chain}\t{md5_of_sequence(seq)}\t{seq}\n"
+    return f"{name}\t{chain}\tNA\tNo sequence found\n"
+
+
+def batch_md5(source, output_file, chain="A", cpus=None):
+    """
+    Writes sequence md5 rows for every PDB file in a directory or archive, sorted by file name.
+
+    Args:
+        source: Directory, tar (optionally gzip or zstd compressed) or zip of PDB files.
+        output_file: Output TSV (pdb_file, chain, md5, sequence).
+        chain: Chain id to read from each file.
+        cpus: Number of worker processes (defaults to all available CPUs).
+
+    Returns:
+        int: Number of rows written.
+    """
+    cpus = cpus or len(os.sched_getaffinity(0))
+    items = sorted(iter_pdb_files(source))
+    chains = [chain] * len(items)
+
+    if cpus == 1 or len(items) < 2:
+        rows = list(map(md5_row, items, chains))
+    else:
+        with ProcessPoolExecutor(max_workers=cpus) as executor:
+            rows = list(executor.map(md5_row, items, chains, chunksize=max(1, len(items) // (cpus * 4))))
+
+    with open(output_file, "w") as out:
+        out.write(HEADER)
+        out.writelines(rows)
+    return len(rows)
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1].startswith("-"):
+        parser = argparse.ArgumentParser(description="Sequence md5 for every PDB file in a directory or archive.")
+        parser.add_argument("-i", "--input", required=True, help="Directory, .tar.gz/.tgz/.tar/.tar.zst or .zip of PDB files")
+        parser.add_argument("-o", "--output", required=True, help="Output TSV (pdb_file, chain, md5, sequence)")
+        parser.add_argument("--chain", default="A", help="Chain id to read (default: A)")
+        parser.add_argument("--cpus", type=int, default=None, help="Worker processes (default: all available CPUs)")
+        args = parser.parse_args()
+        count = batch_md5(args.input, args.output, chain=args.chain, cpus=args.cpus)
+        print(f"Wrote {count} sequence md5s to '{args.output}'")
+        sys.exit(0)
+
     if len(sys.argv) < 3:
         print("Usage: pdb_to_md5.py <input_pdb_file> <output_tsv_file> [chain_id]")
+        print("       pdb_to_md5.py -i <pdb_dir|archive> -o <output_tsv_file> [--chain A] [--cpus N]")
         sys.exit(1)
 
     pdb_file = sys.argv[1]
@@ -52,7 +229,7 @@ if __name__ == "__main__":
     seq = get_sequence_from_pdb(pdb_file, chain_id=chain)
 
     with open(output_file, "w") as out:
-        out.write("pdb_file\tchain\tmd5\tsequence\n")
+        out.write(HEADER)
         if seq:
             md5 = md5_of_sequence(seq)
             out.write(f"{os.path.basename(pdb_file)}\t{chain}\t{md5}\t{seq}\n")
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Per-residue pLDDT store for parent chains.
+
+A domain's average pLDDT is the mean CA pLDDT of the parent chain residues inside
+its boundaries, so the chopped domain PDB files are not needed to compute it. The
+`build` command reads every chain once from the input zip and stores its CA pLDDT
+values and residue numbers in a compact indexed store:
+
+    <store>/plddt.npy    uint16, pLDDT x 100 (exact for the two decimals in PDB files)
+    <store>/resnum.npy   int16, residue numbers (sorted within each chain)
+    <store>/index.tsv    chain id <TAB> offset <TAB> length, sorted by chain id
+
+The `domains` command then answers any consensus chopping with a slice-and-mean and
+writes the same rows as fetch_avg_plDDT.py on the chopped files (<chain>_<NN>.pdb
+<TAB> mean pLDDT), sorted by file name.
+
+Usage:
+    plddt_store.py build --pdb_zip pdbs.zip --id_file ids.txt --store plddt_store
+    plddt_store.py domains --store plddt_store --consensus consensus_chunk.tsv -o domain_avg_plddt.tsv
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from chop_pdbs import parse_domain_boundaries
+from pdb_records import atom_name_mask, field_float, field_int, record_matrix
+from zip_index import PDB_SUFFIX, ZipIndex
+
+PLDDT_SCALE = 100
+PLDDT_FILE = "plddt.npy"
+RESNUM_FILE = "resnum.npy"
+INDEX_FILE = "index.tsv"
+
+
+def chain_plddt(data):
+    """
+    Returns (residue numbers, pLDDT x 100) for the CA atoms of a PDB file.
+
+    Args:
+        data: Raw PDB file contents.
+
+    Returns:
+        Tuple of (int16 residue numbers, uint16 scaled pLDDT values).
+    """
+    records = record_matrix(data)
+    ca = records[atom_name_mask(records, b" CA ")]
+    resnum = field_int(ca, 22, 26).astype(np.int16)
+    plddt = np.rint(field_float(ca, 60, 66) * PLDDT_SCALE).astype(np.uint16)
+    return resnum, plddt
+
+
+def read_ids(id_file):
+    """Reads one id per line, skipping blank lines."""
+    with open(id_file) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def build_store(pdb_zip, ids, store_dir, zip_index=None):
+    """
+    Builds a pLDDT store for the given chain ids from a zip of PDB files.
+
+    Args:
+        pdb_zip: Zip file containing <id>.pdb members.
+        ids: Chain ids to include.
+        store_dir: Output directory.
+        zip_index: Sidecar index of pdb_zip (see zip_index.py), optional.
+
+    Returns:
+        Tuple of (stored count, missing count).
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    resnums, plddts, index = [], [], []
+    offset = 0
+    missing = 0
+
+    with ZipIndex(pdb_zip, zip_index, PDB_SUFFIX) as zf:
+        for chain_id in sorted(set(ids)):
+            if chain_id not in zf:
+                print(f"WARNING: {chain_id}.pdb not found in {pdb_zip}", file=sys.stderr)
+                missing += 1
+                continue
+            resnum, plddt = chain_plddt(zf.read(chain_id))
+            resnums.append(resnum)
+            plddts.append(plddt)
+            index.append((chain_id, offset, plddt.size))
+            offset += plddt.size
+
+    np.save(os.path.join(store_dir, PLDDT_FILE), np.concatenate(plddts) if plddts else np.zeros(0, np.uint16))
+    np.save(os.path.join(store_dir, RESNUM_FILE), np.concatenate(resnums) if resnums else np.zeros(0, np.int16))
+    with open(os.path.join(store_dir, INDEX_FILE), "w") as out:
+        for chain_id, start, length in index:
+            out.write(f"{chain_id}\t{start}\t{length}\n")
+
+    return len(index), missing
+
+
+class PlddtStore:
+    """Read-only access to a pLDDT store; the arrays are memory mapped."""
+
+    def __init__(self, store_dir):
+        self.plddt = np.load(os.path.join(store_dir, PLDDT_FILE), mmap_mode="r")
+        self.resnum = np.load(os.path.join(store_dir, RESNUM_FILE), mmap_mode="r")
+        self.index = {}
+        with open(os.path.join(store_dir, INDEX_FILE)) as f:
+            for line in f:
+                chain_id, start, length = line.rstrip("\n").split("\t")
+                self.index[chain_id] = (int(start), int(length))
+
+    def __contains__(self, chain_id):
+        return chain_id in self.index
+
+    def chain(self, chain_id):
+        """Returns (residue numbers, pLDDT values) for one chain."""
+        start, length = self.index[chain_id]
+        resnum = np.asarray(self.resnum[start:start + length])
+        plddt = np.asarray(self.plddt[start:start + length], dtype=np.float64) / PLDDT_SCALE
+        return resnum, plddt
+
+    def mean_plddt(self, chain_id, ranges):
+        """
+        Returns the mean pLDDT of a chain over residue ranges, or None if empty.
+
+        Args:
+            chain_id: Parent chain id.
+            ranges: List of inclusive (start, end) residue number ranges.
+        """
+        resnum, plddt = self.chain(chain_id)
+        starts = np.searchsorted(resnum, [start for start, _ in ranges], side="left")
+        ends = np.searchsorted(resnum, [end for _, end in ranges], side="right")
+        selected = [plddt[s:e] for s, e in zip(starts, ends)]
+        values = np.concatenate(selected) if selected else plddt[:0]
+        if values.size == 0:
+            return None
+        return float(values.mean())
+
+
+def domain_plddt_rows(store, consensus_file):
+    """
+    Computes (domain file name, mean pLDDT) for every domain in a consensus file.
+
+    Domains are numbered as in chop_pdbs.py: high and medium domains sorted by the
+    start of their first segment.
+    """
+    rows = []
+    missing = 0
+    with open(consensus_file) as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 8:
+                continue
+            chain_id = fields[0]
+            all_domains = parse_domain_boundaries(fields[6], "high") + parse_domain_boundaries(fields[7], "med")
+            if not all_domains:
+                continue
+            if chain_id not in store:
+                print(f"WARNING: {chain_id} not found in pLDDT store", file=sys.stderr)
+                missing += 1
+                continue
+            all_domains.sort(key=lambda x: x[1][0][0])
+            for i, (level, ranges) in enumerate(all_domains, start=1):
+                plddt = store.mean_plddt(chain_id, ranges)
+                if plddt is not None:
+                    rows.append((f"{chain_id}_{i:02d}.pdb", plddt))
+    rows.sort()
+    return rows, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-residue pLDDT store for parent chains.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Extract CA pLDDT vectors from a zip of PDB files.")
+    build.add_argument("--pdb_zip", required=True, help="Zip file containing <id>.pdb members")
+    build.add_argument("--id_file", required=True, help="Chain ids to include, one per line")
+    build.add_argument("--store", required=True, help="Output store directory")
+    build.add_argument("--zip_index", default=None, help="Sidecar index of --pdb_zip (see zip_index.py)")
+
+    domains = subparsers.add_parser("domains", help="Average pLDDT of consensus domains.")
+    domains.add_argument("--store", required=True, help="Store directory written by 'build'")
+    domains.add_argument("--consensus", required=True, help="Consensus TSV (chopping in columns 7 and 8)")
+    domains.add_argument("-o", "--outfile", required=True, help="Output file")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        stored, missing = build_store(args.pdb_zip, read_ids(args.id_file), args.store, args.zip_index)
+        print(f"Stored pLDDT for {stored} chains in '{args.store}' ({missing} missing)")
+    else:
+        rows, missing = domain_plddt_rows(PlddtStore(args.store), args.consensus)
+        with open(args.outfile, "w") as out:
+            for name, plddt in rows:
+                out.write(f"{name}\t{plddt:.4f}\n")
+        print(f"Wrote pLDDT for {len(rows)} domains to '{args.outfile}' ({missing} chains missing)")
+
+
+if __name__ == "__main__":
+    main()
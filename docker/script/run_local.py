@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Run the whole annotation pipeline on a zip of structures in one process, without Nextflow.
+
+For an interactive run of a few structures up to a proteome, the scheduler, the container
+starts and the file staging and collecting of the Nextflow pipeline take far longer than the
+work itself. run_local.py runs the same stages on the chains of one zip in a single Python
+process with one worker pool, and keeps every intermediate table in memory:
+
+    1. filter        filter_chains.filter_chains (--min_residues, optional pLDDT pre-screen)
+    2. segmentation  run_segmentation.sh on the kept chains, as run_ted_segmentation
+                     (or the outputs of an earlier run with --segmentation_dir)
+    3. consensus     segmentation consensus and the no-domain rows of pre-screened chains
+    4. domains       per chain, in the worker pool: the domains are cut out of the chain with
+                     pdb_records.select_residues (as pdb_selres in chop_pdbs.py), then the
+                     sequence md5 (pdb_to_md5), mean CA pLDDT (fetch_avg_plDDT) and, with
+                     --stride_engine numpy, the secondary structure summary are computed
+    5. analyses      the domains are written once to a scratch directory, and the external
+                     tools run on it concurrently: STRIDE (--stride_engine stride), globularity,
+                     domain quality and Foldseek (createdb, search, convertalis, format_fs_output.py);
+                     taxonomy is fetched from UniProt (or read from --taxonomy_file)
+    6. final         transform_consensus and combine_results_final on the in-memory tables
+
+Every table is built as its Nextflow process and collectFile build it (same rows, headers and
+sorting), so final_results.tsv has the rows of a pipeline run on the same chains, in id order.
+An external analysis that is not configured (no --globularity_script, --domain_quality_script
+or --target_db, or --no_taxonomy) contributes only its header, so final_results.tsv has the
+same columns with those values left empty.
+
+Usage:
+    run_local.py --pdb_zip proteome.zip --output_dir results --segmentation_script "bash run_segmentation.sh" \\
+        --globularity_script "cath-af-cli measure-globularity" --target_db foldseekdb --lookup_file CathDomainList \\
+        [--cpus N] [--stride_engine numpy] [--keep_intermediate]
+"""
+
+import argparse
+import csv
+import io
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import chop_pdbs
+import filter_chains
+from combine_results_final import QUALITY_COLNAMES, run as combine_final_results
+from create_stride_summary import DEFAULT_STRIDE_EXEC, ENGINES, SUMMARY_FIELDS, default_cpus, run_stride
+from fetch_avg_plDDT import mean_plddt
+from fetch_uniprot_data import run as fetch_taxonomy
+from pdb_records import select_residues
+from pdb_to_md5 import HEADER as MD5_HEADER, md5_row
+from secondary_structure import summarise_pdb
+from transform_consensus import OUTPUT_COLUMNS, transform_rows
+from tsv_io import write_rows
+from zip_index import PDB_SUFFIX, ZipIndex
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PARSER_SCRIPT = os.path.join(SCRIPT_DIR, "..", "..", "foldseek", "bin", "format_fs_output.py")
+
+# Outputs of run_segmentation.sh, and the result files they are collected into
+SEGMENTATION_OUTPUTS = {
+    "chopping_chainsaw.txt": "domain_assignments.chainsaw.tsv",
+    "chopping_merizo.txt": "domain_assignments.merizo.tsv",
+    "chopping_unidoc.txt": "domain_assignments.unidoc.tsv",
+    "consensus.tsv": "domain_assignments.consensus.tsv",
+}
+
+# Headers of the external analyses, used when one is not run
+GLOBULARITY_HEADER = "model_id\tchopping\tmd5\tpacking_density\tnormed_radius_gyration\n"
+QUALITY_HEADER = ",".join(QUALITY_COLNAMES) + "\n"
+FOLDSEEK_HEADER = "query_id\ttarget_id\tevalue\ttmscore\tcode\ttype\tqcov\ttcov\n"
+TAXONOMY_HEADER = "accession\tproteome_id\ttax_common_name\ttax_scientific_name\ttax_lineage\n"
+
+# foldseek search and convertalis options of foldseek_run_foldseek and foldseek_run_convertalis
+T_EVALUE_THRESHOLD = 0.476641
+H_COVERAGE_THRESHOLD = 0.459063
+FOLDSEEK_FORMAT = "query,target,fident,evalue,qlen,tlen,qtmscore,ttmscore,qcov,tcov"
+
+_index = None
+
+
+def sort_lines(lines, key=None):
+    """Returns non-blank lines without line endings, sorted as by `sort` in the C locale."""
+    return sorted((line.rstrip("\r\n") for line in lines if line.strip()), key=key)
+
+
+def join_lines(lines):
+    return "".join(f"{line}\n" for line in lines)
+
+
+def with_sorted_body(text, key=None):
+    """Returns the header line of a table followed by its other lines sorted, with CRLF line endings removed."""
+    lines = text.replace("\r\n", "\n").split("\n")
+    return join_lines(lines[:1] + sort_lines(lines[1:], key))
+
+
+def run_shell(command, cwd):
+    """Runs a shell command (which may start with setup lines) in cwd, failing on a non-zero exit status."""
+    subprocess.run(["bash", "-c", f"set -e\n{command}"], cwd=cwd, check=True, stdout=sys.stderr)
+
+
+def read_input_ids(index, id_file=None):
+    """Returns the chain ids to annotate: those of id_file, or every .pdb member of the zip, sorted."""
+    if id_file:
+        return filter_chains.read_ids(id_file)
+    return sorted({stem for stem, name in zip(index.stems(), index.names()) if name.endswith(".pdb")})
+
+
+def run_filter(args, ids):
+    """Returns (kept ids, no-domain consensus rows, filter_reasons.tsv text) for the input ids."""
+    prescreen = None
+    if args.min_mean_plddt > 0 or args.min_fraction_above > 0:
+        prescreen = (args.min_mean_plddt, args.plddt_cutoff, args.min_fraction_above)
+    kept, no_domains, reasons = [], [], [filter_chains.REASONS_HEADER]
+    for chain_id, reason, models, chains, residues, chain_mean_plddt, fraction_above, row, _ in filter_chains.filter_chains(
+        args.pdb_zip, ids, args.min_residues, None, args.cpus, prescreen
+    ):
+        status = "kept" if reason == filter_chains.KEPT else "skipped"
+        reasons.append(f"{chain_id}\t{status}\t{reason}\t{models}\t{chains}\t{residues}\t{chain_mean_plddt}\t{fraction_above}\n")
+        if reason == filter_chains.KEPT:
+            kept.append(chain_id)
+        elif row:
+            no_domains.append(row)
+    return kept, no_domains, "".join(reasons)
+
+
+def run_segmentation(args, index, kept_ids, scratch):
+    """
+    Returns {output file name: sorted lines} of the segmentation of the kept chains, run with
+    --segmentation_script, or read from the outputs of an earlier run in --segmentation_dir.
+    """
+    if args.segmentation_dir:
+        kept = set(kept_ids)
+        outputs = {}
+        for name in SEGMENTATION_OUTPUTS:
+            path = os.path.join(args.segmentation_dir, name)
+            with open(path) as f:
+                outputs[name] = sort_lines(line for line in f if line.split("\t", 1)[0].strip() in kept)
+        return outputs
+
+    workdir = os.path.join(scratch, "segmentation")
+    extracted, missing = index.extract(kept_ids, os.path.join(workdir, "filtered_pdbs"))
+    if missing:
+        raise RuntimeError(f"{len(missing)} PDB files not found in zip: {', '.join(missing[:5])}")
+    os.makedirs(os.path.join(workdir, "output"))
+    run_shell(f"{args.segmentation_setup}\n{args.segmentation_script} -i ./filtered_pdbs -o ./output", workdir)
+    outputs = {}
+    for name in SEGMENTATION_OUTPUTS:
+        with open(os.path.join(workdir, "output", name)) as f:
+            outputs[name] = sort_lines(f)
+    shutil.rmtree(workdir)
+    return outputs
+
+
+def _open_zip(pdb_zip):
+    global _index
+    _index = ZipIndex(pdb_zip, suffix=PDB_SUFFIX)
+
+
+def _analyse_chain(job):
+    """
+    Cuts the domains of one consensus row out of its chain and analyses each one.
+
+    Returns:
+        List of (file name, contents, md5 row, mean pLDDT or None, STRIDE summary or None, error or None).
+    """
+    pdb_id, high_dom, med_dom, numpy_stride = job
+    # combined and sorted as in chop_pdbs.process_from_zip
+    all_domains = chop_pdbs.parse_domain_boundaries(high_dom, "high") + chop_pdbs.parse_domain_boundaries(med_dom, "med")
+    all_domains.sort(key=lambda x: x[1][0][0])
+    data = _index.read(pdb_id)
+
+    domains = []
+    for i, (level, domain_ranges) in enumerate(all_domains, start=1):
+        name = f"{pdb_id}_{i:02d}.pdb"
+        domain = select_residues(data, domain_ranges)
+        summary, error = None, None
+        if numpy_stride:
+            try:
+                summary = summarise_pdb(domain, name)
+            except ValueError as e:
+                error = f"{name}: {e}"
+        domains.append((name, domain, md5_row((name, domain)), mean_plddt(domain), summary, error))
+    return domains
+
+
+def analyse_domains(pool, cpus, consensus, numpy_stride):
+    """Returns the analysed domains (see _analyse_chain) of every consensus row with domains, sorted by file name."""
+    jobs = []
+    for line in consensus:
+        fields = line.split("\t")
+        # rows that chop_pdbs.py skips: too few fields, or no high or medium domains
+        if len(fields) < 8 or (fields[6].lower() == "na" and fields[7].lower() == "na"):
+            continue
+        jobs.append((fields[0], fields[6], fields[7], numpy_stride))
+    if pool is None:
+        results = map(_analyse_chain, jobs)
+    else:
+        results = pool.map(_analyse_chain, jobs, chunksize=max(1, len(jobs) // (cpus * 4)))
+    return sorted((domain for domains in results for domain in domains), key=lambda domain: domain[0])
+
+
+def run_globularity(args, domain_dir, scratch):
+    if not args.globularity_script:
+        return GLOBULARITY_HEADER
+    output = os.path.join(scratch, "domain_globularity_tmp.tsv")
+    run_shell(f"{args.globularity_script} --pdb_dir {shlex.quote(domain_dir)} --domain_globularity {shlex.quote(output)}",
+              scratch)
+    with open(output) as f:
+        return with_sorted_body(f.read())
+
+
+def run_domain_quality(args, domain_dir, scratch):
+    if not args.domain_quality_script:
+        return QUALITY_HEADER
+    output = os.path.join(scratch, "domain_quality.unsorted.csv")
+    run_shell(f"{args.domain_quality_setup}\n{args.domain_quality_script} -d {shlex.quote(domain_dir)}/ "
+              f"-o {shlex.quote(output)}", scratch)
+    with open(output) as f:
+        # sort -t, -k1,1: by the first field, ties by the whole line
+        return with_sorted_body(f.read(), key=lambda line: (line.split(",", 1)[0], line))
+
+
+def run_foldseek(args, domain_dir, scratch):
+    if not args.target_db:
+        return FOLDSEEK_HEADER
+    workdir = os.path.join(scratch, "foldseek")
+    os.makedirs(os.path.join(workdir, "tmp_foldseek"))
+    target = shlex.quote(os.path.join(os.path.abspath(args.target_db), args.foldseek_db_name))
+    run_shell(f"""
+    {args.foldseek_exec} createdb {shlex.quote(domain_dir)} query_db
+    {args.foldseek_exec} search query_db {target} foldseek_output_db tmp_foldseek \\
+        --cov-mode 5 --alignment-type 2 -e {T_EVALUE_THRESHOLD} -s 10 -c {H_COVERAGE_THRESHOLD} -a
+    {args.foldseek_exec} convertalis query_db {target} foldseek_output_db foldseek_output.m8 \\
+        --format-output "{FOLDSEEK_FORMAT}"
+    {shlex.quote(sys.executable)} {shlex.quote(os.path.abspath(args.parser_script))} -i foldseek_output.m8 \\
+        -c {shlex.quote(os.path.abspath(args.lookup_file))} -o foldseek_parsed_results.unsorted.tsv
+    """, workdir)
+    with open(os.path.join(workdir, "foldseek_parsed_results.unsorted.tsv")) as f:
+        return with_sorted_body(f.read())
+
+
+def run_taxonomy(args, ids, scratch):
+    if args.taxonomy_file:
+        with open(args.taxonomy_file) as f:
+            return f.read()
+    if args.no_taxonomy:
+        return TAXONOMY_HEADER
+    output = os.path.join(scratch, "uniprot_data.tsv")
+    fetch_taxonomy(ids, output)
+    with open(output) as f:
+        return f.read()
+
+
+def stride_summaries(args, pool, domains, domain_dir):
+    """Returns (summaries, errors) of the domains, from the numpy engine or by running STRIDE in the pool."""
+    if args.stride_engine == "numpy":
+        results = [(summary, error) for _, _, _, _, summary, error in domains]
+    else:
+        paths = [os.path.join(domain_dir, domain[0]) for domain in domains]
+        execs = [args.stride_exec] * len(paths)
+        results = map(run_stride, paths, execs) if pool is None else pool.map(run_stride, paths, execs)
+    summaries, errors = [], []
+    for summary, error in results:
+        if error:
+            errors.append(error)
+        else:
+            summaries.append(summary)
+    return summaries, errors
+
+
+def write_table(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def annotate(args, scratch):
+    """Runs every stage; returns the tables of the run by result file name, final_results.tsv last."""
+    timings = []
+
+    def done(stage, summary, start):
+        elapsed = time.perf_counter() - start
+        timings.append((stage, elapsed))
+        print(f"{stage}: {summary} ({elapsed:.1f}s)", file=sys.stderr)
+
+    tables = {}
+    with ZipIndex(args.pdb_zip, suffix=PDB_SUFFIX) as index:
+        start = time.perf_counter()
+        ids = read_input_ids(index, args.id_file)
+        kept_ids, no_domains, tables["filter_reasons.tsv"] = run_filter(args, ids)
+        done("filter", f"{len(kept_ids)} of {len(ids)} chains kept, {len(no_domains)} pre-screened", start)
+
+        start = time.perf_counter()
+        segmentation = run_segmentation(args, index, kept_ids, scratch) if kept_ids else {
+            name: [] for name in SEGMENTATION_OUTPUTS
+        }
+        consensus = sort_lines(segmentation["consensus.tsv"] + no_domains)
+        for name, result_name in SEGMENTATION_OUTPUTS.items():
+            tables[result_name] = join_lines(consensus if name == "consensus.tsv" else segmentation[name])
+        done("segmentation", f"{len(consensus)} consensus rows", start)
+
+    pool = ProcessPoolExecutor(max_workers=args.cpus, initializer=_open_zip, initargs=(args.pdb_zip,)) \
+        if args.cpus > 1 else None
+    if pool is None:
+        _open_zip(args.pdb_zip)
+    try:
+        start = time.perf_counter()
+        domains = analyse_domains(pool, args.cpus, consensus, args.stride_engine == "numpy")
+        done("domains", f"{len(domains)} domains chopped, md5 and pLDDT", start)
+
+        # the external tools read the domains from disk, from one copy
+        domain_dir = os.path.join(scratch, "domains")
+        os.makedirs(domain_dir)
+        if args.stride_engine == "stride" or args.globularity_script or args.domain_quality_script or args.target_db:
+            for name, data, *_ in domains:
+                with open(os.path.join(domain_dir, name), "wb") as f:
+                    f.write(data)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=4) as threads:
+            globularity = threads.submit(run_globularity, args, domain_dir, scratch)
+            quality = threads.submit(run_domain_quality, args, domain_dir, scratch)
+            foldseek = threads.submit(run_foldseek, args, domain_dir, scratch)
+            taxonomy = threads.submit(run_taxonomy, args, ids, scratch)
+            summaries, errors = stride_summaries(args, pool, domains, domain_dir)
+            tables["all_domain_globularity.tsv"] = globularity.result()
+            tables["all_domain_quality.csv"] = quality.result()
+            tables["foldseek_parsed_results.tsv"] = foldseek.result()
+            tables["all_taxonomy.tsv"] = taxonomy.result()
+        for error in errors:
+            print(f"{args.stride_engine} failed on {error}", file=sys.stderr)
+        done("analyses", f"{len(summaries)} STRIDE summaries, globularity, quality, foldseek and taxonomy", start)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    start = time.perf_counter()
+    tables["all_md5.tsv"] = MD5_HEADER + "".join(row for _, _, row, _, _, _ in domains)
+    md5_lookup = {}
+    for name, _, row, _, _, _ in domains:
+        md5 = row.split("\t")[2]
+        md5_lookup[name] = None if md5 == "NA" else md5
+    tables["all_plddt.tsv"] = "".join(f"{name}\t{plddt:.4f}\n" for name, _, _, plddt, _, _ in domains if plddt is not None)
+    # join_plddt_md5: id, pLDDT and the md5 of the domain
+    tables["plddt_with_md5.tsv"] = "".join(
+        f"{name}\t{plddt:.4f}\t{row.split(chr(9))[2]}\n" for name, _, row, plddt, _, _ in domains if plddt is not None
+    )
+    # as create_stride_summary.write_summary_to_tsv writes it
+    stride = io.StringIO()
+    writer = csv.DictWriter(stride, fieldnames=SUMMARY_FIELDS, delimiter="\t")
+    writer.writeheader()
+    writer.writerows(summaries)
+    tables["all_stride_summaries.tsv"] = stride.getvalue()
+
+    stride_data_by_id = {summary["id"]: {key: str(value) for key, value in summary.items()} for summary in summaries}
+    transformed = io.StringIO()
+    write_rows(transformed, transform_rows(io.StringIO(tables["domain_assignments.consensus.tsv"]), md5_lookup,
+                                           stride_data_by_id), header=OUTPUT_COLUMNS)
+    tables["transformed_consensus.tsv"] = transformed.getvalue()
+
+    final = io.StringIO()
+    combine_final_results(
+        io.StringIO(tables["transformed_consensus.tsv"]),
+        io.StringIO(tables["all_domain_globularity.tsv"]),
+        io.StringIO(tables["plddt_with_md5.tsv"]),
+        io.StringIO(tables["all_domain_quality.csv"]),
+        io.StringIO(tables["foldseek_parsed_results.tsv"]),
+        io.StringIO(tables["all_taxonomy.tsv"]),
+        final,
+    )
+    tables["final_results.tsv"] = final.getvalue()
+    done("final", f"{tables['final_results.tsv'].count(chr(10)) - 1} domains", start)
+    return tables, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the annotation pipeline on a zip of structures in one process.")
+    parser.add_argument("--pdb_zip", required=True, help="Zip file containing <id>.pdb members")
+    parser.add_argument("--output_dir", required=True, help="Directory for final_results.tsv")
+    parser.add_argument("--id_file", default=None, help="Chain ids to annotate, one per line (default: every member)")
+    parser.add_argument("--cpus", type=int, default=None, help="Worker processes (default: all available CPUs)")
+    parser.add_argument("--tmp_dir", default=None,
+                        help="Directory for the scratch copy of the domains, e.g. /dev/shm (default: system temp)")
+    parser.add_argument("--keep_intermediate", action="store_true",
+                        help="Also write the intermediate tables, named as in the results directory of the pipeline")
+
+    group = parser.add_argument_group("filter")
+    group.add_argument("--min_residues", type=int, default=25,
+                       help="Keep chains with more residues than this (default: 25)")
+    group.add_argument("--min_mean_plddt", type=float, default=0,
+                       help="Pre-screen: skip chains with a lower mean CA pLDDT (default: 0, off)")
+    group.add_argument("--plddt_cutoff", type=float, default=70,
+                       help="Pre-screen: pLDDT cutoff for --min_fraction_above (default: 70)")
+    group.add_argument("--min_fraction_above", type=float, default=0,
+                       help="Pre-screen: skip chains with a lower fraction of residues at or above --plddt_cutoff "
+                            "(default: 0, off)")
+
+    group = parser.add_argument_group("segmentation")
+    segmentation = group.add_mutually_exclusive_group(required=True)
+    segmentation.add_argument("--segmentation_script",
+                              help="Segmentation command, run as '<command> -i ./filtered_pdbs -o ./output'")
+    segmentation.add_argument("--segmentation_dir",
+                              help="Directory with the outputs of an earlier segmentation (chopping_*.txt, consensus.tsv)")
+    group.add_argument("--segmentation_setup", default="",
+                       help="Shell lines run before --segmentation_script in its working directory")
+
+    group = parser.add_argument_group("analyses")
+    group.add_argument("--stride_engine", choices=ENGINES, default="stride",
+                       help="'stride' to run STRIDE, 'numpy' for the built-in engine (default: stride)")
+    group.add_argument("--stride_exec", default=DEFAULT_STRIDE_EXEC, help="STRIDE executable (default: stride)")
+    group.add_argument("--globularity_script", default=None,
+                       help="Globularity command, e.g. 'cath-af-cli measure-globularity' (default: not run)")
+    group.add_argument("--domain_quality_script", default=None,
+                       help="Domain quality command, e.g. 'python3 run_domain_quality_checks.py' (default: not run)")
+    group.add_argument("--domain_quality_setup", default="",
+                       help="Shell lines run before --domain_quality_script")
+    group.add_argument("--foldseek_exec", default="foldseek", help="Foldseek executable (default: foldseek)")
+    group.add_argument("--target_db", default=None, help="Directory of the Foldseek target database (default: not run)")
+    group.add_argument("--foldseek_db_name", default="cath_v4_4_0_s95_db",
+                       help="Name of the target database in --target_db (default: cath_v4_4_0_s95_db)")
+    group.add_argument("--lookup_file", default=None, help="CATH domain list for the Foldseek parser")
+    group.add_argument("--parser_script", default=DEFAULT_PARSER_SCRIPT,
+                       help="Foldseek parser (default: foldseek/bin/format_fs_output.py)")
+    taxonomy = group.add_mutually_exclusive_group()
+    taxonomy.add_argument("--taxonomy_file", default=None, help="Taxonomy TSV to use instead of fetching it from UniProt")
+    taxonomy.add_argument("--no_taxonomy", action="store_true", help="Do not fetch taxonomy from UniProt")
+    args = parser.parse_args()
+
+    if args.target_db and not args.lookup_file:
+        parser.error("--target_db needs --lookup_file")
+    args.cpus = args.cpus or default_cpus()
+    skipped = [name for name, configured in (
+        ("globularity", args.globularity_script), ("domain quality", args.domain_quality_script),
+        ("foldseek", args.target_db), ("taxonomy", args.taxonomy_file or not args.no_taxonomy),
+    ) if not configured]
+    if skipped:
+        print(f"Not run, their columns are left empty: {', '.join(skipped)}", file=sys.stderr)
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="run_local.", dir=args.tmp_dir) as scratch:
+        tables, timings = annotate(args, scratch)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name, text in tables.items():
+        if args.keep_intermediate or name == "final_results.tsv":
+            write_table(os.path.join(args.output_dir, name), text)
+    print(f"Final results written to {os.path.join(args.output_dir, 'final_results.tsv')} "
+          f"in {time.perf_counter() - start:.1f}s ("
+          + ", ".join(f"{stage} {elapsed:.1f}s" for stage, elapsed in timings) + ")", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
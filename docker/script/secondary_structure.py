@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+STRIDE-free secondary structure counts for domain PDB files.
+
+Assigns secondary structure from backbone coordinates with a DSSP-style electrostatic
+H-bond energy (Kabsch & Sander, 1983), computed with NumPy over all residue pairs
+whose CA atoms are within 9 A, and reports the same columns as create_stride_summary.py:
+
+    num_helix   runs of alpha (4-turn), 3-10 (3-turn) and pi (5-turn) helix
+    num_strand  runs of residues in ladders of two or more consecutive bridges
+    num_turn    STRIDE-style turns: CA(i)-CA(i+3) < 7 A with i+1, i+2 not helix/strand
+
+This is an approximation of STRIDE (which also uses phi/psi propensities), so counts
+can differ slightly; use the --stride_summary option to write an agreement report
+against a STRIDE summary of the same files.
+
+Usage:
+    secondary_structure.py --pdb_dir <pdb_dir> -o <summary.tsv>
+    secondary_structure.py --pdb_dir <pdb_dir> -o <summary.tsv> \\
+        --stride_summary <stride_summary.tsv> --agreement <agreement.tsv>
+"""
+
+import argparse
+import csv
+import os
+import sys
+
+import numpy as np
+
+from pdb_records import atom_name_mask, coordinates, field_bytes, record_matrix, residue_starts
+
+BACKBONE_ATOMS = (b" N  ", b" CA ", b" C  ", b" O  ")
+HBOND_ENERGY_CUTOFF = -0.5  # kcal/mol
+HBOND_COUPLING = 0.084 * 332  # q1 * q2 * f
+CA_CONTACT_DISTANCE = 9.0
+PEPTIDE_BOND_MAX = 2.5
+TURN_CA_DISTANCE = 7.0
+MIN_BRIDGE_SEPARATION = 3
+
+HELIX_CODES = ("H", "G", "I")
+STRAND_CODES = ("E",)
+
+COUNT_FIELDS = [
+    "num_helix_strand_turn",
+    "num_helix",
+    "num_strand",
+    "num_helix_strand",
+    "num_turn",
+]
+
+
+def read_backbone(data: bytes):
+    """
+    Extracts backbone coordinates for residues with a complete N, CA, C, O set.
+
+    Args:
+        data: Raw PDB file contents.
+
+    Returns:
+        Tuple of (backbone (n, 4, 3) float64 array, is_proline bool array, chain id str).
+    """
+    records = record_matrix(data)
+    if records.shape[0] == 0:
+        return np.empty((0, 4, 3)), np.zeros(0, dtype=bool), ""
+
+    first = residue_starts(records)
+    residue_index = np.cumsum(first) - 1
+    n_residues = int(residue_index[-1]) + 1
+
+    backbone = np.full((n_residues, 4, 3), np.nan)
+    for k, name in enumerate(BACKBONE_ATOMS):
+        mask = atom_name_mask(records, name)
+        backbone[residue_index[mask], k] = coordinates(records[mask])
+
+    is_proline = field_bytes(records[first], 17, 20) == b"PRO"
+    chain_id = field_bytes(records[:1], 21, 22)[0].decode().strip()
+
+    complete = ~np.isnan(backbone).any(axis=(1, 2))
+    return backbone[complete], is_proline[complete], chain_id
+
+
+def chain_segments(backbone: np.ndarray) -> np.ndarray:
+    """Returns a segment number per residue, incremented at every C(i)-N(i+1) break."""
+    if backbone.shape[0] == 0:
+        return np.zeros(0, dtype=np.int64)
+    peptide = np.linalg.norm(backbone[1:, 0] - backbone[:-1, 2], axis=1)
+    return np.concatenate(([0], np.cumsum(peptide > PEPTIDE_BOND_MAX)))
+
+
+def hbond_matrix(backbone: np.ndarray, is_proline: np.ndarray, segments: np.ndarray) -> np.ndarray:
+    """
+    Computes DSSP H-bonds between backbone C=O (acceptor, row) and N-H (donor, column).
+
+    The amide H is placed 1 A from N along the preceding C=O direction; residues
+    without a preceding peptide bond and prolines are not donors.
+
+    Returns:
+        (n, n) bool array: hbond[i, j] is True if CO(i) -> NH(j) has E < -0.5 kcal/mol.
+    """
+    n = backbone.shape[0]
+    hbond = np.zeros((n, n), dtype=bool)
+    if n < 2:
+        return hbond
+
+    N, CA, C, O = (backbone[:, k] for k in range(4))
+    co = C[:-1] - O[:-1]
+    H = N.copy()
+    H[1:] = N[1:] + co / np.linalg.norm(co, axis=1)[:, None]
+
+    donor = ~is_proline
+    donor[0] = False
+    donor[1:] &= segments[1:] == segments[:-1]
+
+    ca_d2 = ((CA[:, None, :] - CA[None, :, :]) ** 2).sum(axis=-1)
+    acc, don = np.nonzero(ca_d2 < CA_CONTACT_DISTANCE**2)
+    keep = (acc != don) & (don != acc + 1) & donor[don]
+    acc, don = acc[keep], don[keep]
+
+    def dist(a, b):
+        return np.linalg.norm(a - b, axis=1)
+
+    energy = HBOND_COUPLING * (
+        1.0 / dist(O[acc], N[don])
+        + 1.0 / dist(C[acc], H[don])
+        - 1.0 / dist(O[acc], H[don])
+        - 1.0 / dist(C[acc], N[don])
+    )
+    hbond[acc, don] = energy < HBOND_ENERGY_CUTOFF
+    return hbond
+
+
+def _turns(hbond: np.ndarray, segments: np.ndarray, n: int) -> np.ndarray:
+    """Returns a bool array marking residues i with an n-turn, i.e. hbond CO(i) -> NH(i+n)."""
+    size = hbond.shape[0]
+    turn = np.zeros(size, dtype=bool)
+    if size > n:
+        i = np.arange(size - n)
+        turn[i] = hbond[i, i + n] & (segments[i] == segments[i + n])
+    return turn
+
+
+def _helix_residues(turn: np.ndarray, n: int) -> np.ndarray:
+    """Marks residues i..i+n-1 for every pair of consecutive n-turns at i-1 and i."""
+    size = turn.size
+    helix = np.zeros(size, dtype=bool)
+    starts = np.flatnonzero(turn[1:] & turn[:-1]) + 1
+    for k in range(n):
+        idx = starts + k
+        helix[idx[idx < size]] = True
+    return helix
+
+
+def _strand_residues(hbond: np.ndarray, segments: np.ndarray) -> np.ndarray:
+    """Marks residues taking part in ladders of at least two consecutive bridges."""
+    size = hbond.shape[0]
+    strand = np.zeros(size, dtype=bool)
+    if size < 5:
+        return strand
+
+    def shifted(m, di, dj):
+        # X[i, j] = m[i + di, j + dj] for interior residues i, j in 1..size-2
+        return m[1 + di:size - 1 + di, 1 + dj:size - 1 + dj]
+
+    hb, hbT = hbond, hbond.T
+    parallel = (shifted(hb, -1, 0) & shifted(hbT, 1, 0)) | (shifted(hbT, 0, -1) & shifted(hb, 0, 1))
+    antiparallel = (shifted(hb, 0, 0) & shifted(hbT, 0, 0)) | (shifted(hb, -1, 1) & shifted(hbT, 1, -1))
+
+    interior = np.arange(1, size - 1)
+    unbroken = segments[interior - 1] == segments[interior + 1]
+    allowed = (
+        (np.abs(interior[:, None] - interior[None, :]) >= MIN_BRIDGE_SEPARATION)
+        & unbroken[:, None]
+        & unbroken[None, :]
+    )
+    parallel &= allowed
+    antiparallel &= allowed
+
+    # consecutive bridges: parallel (i, j), (i+1, j+1); antiparallel (i, j+1), (i+1, j)
+    ladder = np.zeros(interior.size, dtype=bool)
+    par = (parallel[:-1, :-1] & parallel[1:, 1:]).any(axis=1)
+    anti = (antiparallel[:-1, 1:] & antiparallel[1:, :-1]).any(axis=1)
+    pairs = par | anti
+    ladder[:-1] |= pairs
+    ladder[1:] |= pairs
+    strand[interior] = ladder
+    return strand
+
+
+def assign_secondary_structure(backbone: np.ndarray, is_proline: np.ndarray):
+    """
+    Assigns a one-letter secondary structure code (H, G, I, E or -) per residue.
+
+    Returns:
+        Tuple of (codes as a '<U1' array, segment number per residue).
+    """
+    segments = chain_segments(backbone)
+    ss = np.full(backbone.shape[0], "-", dtype="<U1")
+    if backbone.shape[0] == 0:
+        return ss, segments
+
+    hbond = hbond_matrix(backbone, is_proline, segments)
+    alpha = _helix_residues(_turns(hbond, segments, 4), 4)
+    strand = _strand_residues(hbond, segments)
+    three_ten = _helix_residues(_turns(hbond, segments, 3), 3)
+    pi = _helix_residues(_turns(hbond, segments, 5), 5)
+
+    # lowest priority first so higher priority codes overwrite: H > E > G > I
+    ss[pi] = "I"
+    ss[three_ten] = "G"
+    ss[strand] = "E"
+    ss[alpha] = "H"
+    return ss, segments
+
+
+def count_runs(ss: np.ndarray, segments: np.ndarray, codes) -> int:
+    """Counts maximal runs of residues whose code is in codes, split at chain breaks."""
+    if ss.size == 0:
+        return 0
+    starts = np.ones(ss.size, dtype=bool)
+    starts[1:] = (ss[1:] != ss[:-1]) | (segments[1:] != segments[:-1])
+    return int(np.isin(ss[starts], codes).sum())
+
+
+def count_turns(backbone: np.ndarray, ss: np.ndarray, segments: np.ndarray) -> int:
+    """Counts residues i with CA(i)-CA(i+3) < 7 A whose i+1 and i+2 are not helix or strand."""
+    size = backbone.shape[0]
+    if size < 4:
+        return 0
+    i = np.arange(size - 3)
+    ca = backbone[:, 1]
+    close = np.linalg.norm(ca[i] - ca[i + 3], axis=1) < TURN_CA_DISTANCE
+    regular = np.isin(ss, HELIX_CODES + STRAND_CODES)
+    free = ~regular[i + 1] & ~regular[i + 2]
+    return int((close & free & (segments[i] == segments[i + 3])).sum())
+
+
+def summarise_pdb(data: bytes, name: str) -> dict:
+    """
+    Summarises secondary structure of one PDB file in the create_stride_summary schema.
+
+    Args:
+        data: Raw PDB file contents.
+        name: Value for the id column (the PDB file name).
+
+    Returns:
+        dict with id, chain_id and the STRIDE summary count columns.
+    """
+    backbone, is_proline, chain_id = read_backbone(data)
+    ss, segments = assign_secondary_structure(backbone, is_proline)
+
+    num_helix = count_runs(ss, segments, HELIX_CODES)
+    num_strand = count_runs(ss, segments, STRAND_CODES)
+    num_turn = count_turns(backbone, ss, segments)
+
+    return {
+        "id": name,
+        "chain_id": chain_id,
+        "num_helix_strand_turn": num_helix + num_strand + num_turn,
+        "num_helix": num_helix,
+        "num_strand": num_strand,
+        "num_helix_strand": num_helix + num_strand,
+        "num_turn": num_turn,
+    }
+
+
+def summarise_pdb_file(pdb_path):
+    """
+    Summarises one PDB file; mirrors create_stride_summary.run_stride.
+
+    Returns:
+        tuple: (summary dict or None, error message or None)
+    """
+    try:
+        with open(pdb_path, "rb") as f:
+            return summarise_pdb(f.read(), os.path.basename(pdb_path)), None
+    except (OSError, ValueError) as e:
+        return None, f"{os.path.basename(pdb_path)}: {e}"
+
+
+def read_summary(file_path):
+    """Reads a summary TSV into a dict of rows keyed by id."""
+    with open(file_path, newline="") as f:
+        return {row["id"]: row for row in csv.DictReader(f, delimiter="\t")}
+
+
+def write_agreement_report(summaries, stride_summary_file, output_file):
+    """
+    Compares engine counts with a STRIDE summary of the same files.
+
+    Writes one row per count column with the number of shared ids, the fraction of
+    ids with identical counts, the mean absolute difference and the Pearson
+    correlation, followed by the per-id counts from both engines.
+
+    Returns:
+        list of per-column agreement dicts.
+    """
+    stride = read_summary(stride_summary_file)
+    ours = {summary["id"]: summary for summary in summaries}
+    shared = sorted(set(stride) & set(ours))
+
+    agreement = []
+    for field in COUNT_FIELDS:
+        a = np.array([int(ours[i][field]) for i in shared], dtype=float)
+        b = np.array([int(stride[i][field]) for i in shared], dtype=float)
+        if len(shared) > 1 and a.std() > 0 and b.std() > 0:
+            pearson = float(np.corrcoef(a, b)[0, 1])
+        else:
+            pearson = float("nan")
+        agreement.append({
+            "field": field,
+            "n": len(shared),
+            "exact_fraction": float((a == b).mean()) if shared else float("nan"),
+            "mean_abs_diff": float(np.abs(a - b).mean()) if shared else float("nan"),
+            "pearson_r": pearson,
+        })
+
+    with open(output_file, "w") as out:
+        out.write("field\tn\texact_fraction\tmean_abs_diff\tpearson_r\n")
+        for row in agreement:
+            out.write(
+                f"{row['field']}\t{row['n']}\t{row['exact_fraction']:.4f}\t"
+                f"{row['mean_abs_diff']:.4f}\t{row['pearson_r']:.4f}\n"
+            )
+        out.write("\n")
+        out.write("id\t" + "\t".join(f"{f}_numpy\t{f}_stride" for f in COUNT_FIELDS) + "\n")
+        for i in shared:
+            values = "\t".join(f"{ours[i][f]}\t{stride[i][f]}" for f in COUNT_FIELDS)
+            out.write(f"{i}\t{values}\n")
+
+    missing = len(set(stride) ^ set(ours))
+    if missing:
+        print(f"{missing} ids present in only one of the two summaries", file=sys.stderr)
+    return agreement
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Count helices, strands and turns in PDB files without running STRIDE."
+    )
+    parser.add_argument("--pdb_dir", required=True, help="Directory of PDB files.")
+    parser.add_argument("-o", "--output", required=True, help="Output summary TSV.")
+    parser.add_argument("--stride_summary", help="STRIDE summary TSV of the same files to compare against.")
+    parser.add_argument("--agreement", help="Output agreement report TSV (requires --stride_summary).")
+    args = parser.parse_args()
+
+    if bool(args.stride_summary) != bool(args.agreement):
+        parser.error("--stride_summary and --agreement must be given together")
+
+    from create_stride_summary import summarise_pdb_dir, write_summary_to_tsv
+
+    summaries, errors = summarise_pdb_dir(args.pdb_dir, engine="numpy", cpus=1)
+    for error in errors:
+        print(f"Failed on {error}", file=sys.stderr)
+    write_summary_to_tsv(summaries, args.output)
+    print(f"Wrote {len(summaries)} summaries to '{args.output}'")
+
+    if args.agreement:
+        for row in write_agreement_report(summaries, args.stride_summary, args.agreement):
+            print(
+                f"{row['field']}: exact {row['exact_fraction']:.3f}, "
+                f"mean |diff| {row['mean_abs_diff']:.3f}, r {row['pearson_r']:.3f} (n={row['n']})"
+            )
+
+
+if __name__ == "__main__":
+    main()
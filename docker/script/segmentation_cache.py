@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Persistent segmentation cache keyed by a content hash of each chain's coordinates.
+
+Most structures are unchanged between releases (e.g. AFDB model_v4 to v6), so their Chainsaw,
+Merizo, UniDoc and consensus rows can be reused. Entries are keyed by the normalised coordinate
+hash of the chain (pdb_records.coordinate_hash) and a tag naming the segmentation tools (by
+default the container tag), and hold each output row without its leading chain id.
+
+The cache is a directory of SQLite shards. A shard is written once, at the end of a run, and never
+changed afterwards, so lookups open every shard read-only and immutable (no locking on shared
+filesystems) and a resumed run sees the same cache as the run it resumes.
+
+`lookup` hashes the chains of a segmentation chunk from the input zip and splits them into misses
+(to segment) and hits, whose cached rows are written with the chain id filled back in.
+
+`merge` merges the hit rows into the segmentation outputs of the misses, in sorted order, and
+writes the new entries of the misses.
+
+`update` writes the new entries of a run to a new shard. With --compact it also copies every entry of
+the given shards into it, so that one shard replaces them all, and lists their names in --compacted_list;
+the workflow then stops staging those shards into lookups (see annotate.nf), which otherwise open every
+shard ever written.
+
+Usage:
+    segmentation_cache.py lookup --pdb_zip pdbs.zip --id_file chunk_ids.txt --tag TAG \
+        --misses misses.txt --keys keys.tsv --hits_dir hits [--shards cache/*.sqlite]
+    segmentation_cache.py merge --hits_dir hits --segmented_dir segmented --keys keys.tsv \
+        --outdir output --new_entries new_entries.tsv
+    segmentation_cache.py update --tag TAG --output cache/<session>.sqlite new_entries.tsv ... \
+        [--compact cache/*.sqlite --compacted_list cache/<session>.compacted.txt]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+from collections import defaultdict
+
+from pdb_records import coordinate_hash
+from zip_index import PDB_SUFFIX, ZipIndex
+
+# Segmentation outputs of run_ted_segmentation, in cache column order
+OUTPUT_FILES = {
+    "chainsaw": "chopping_chainsaw_sorted.txt",
+    "merizo": "chopping_merizo_sorted.txt",
+    "unidoc": "chopping_unidoc_sorted.txt",
+    "consensus": "consensus_sorted.tsv",
+}
+METHODS = tuple(OUTPUT_FILES)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS segmentation ("
+    "hash TEXT NOT NULL, tag TEXT NOT NULL, "
+    + ", ".join(f"{method} TEXT" for method in METHODS)
+    + ", PRIMARY KEY (hash, tag)) WITHOUT ROWID"
+)
+
+
+def read_ids(id_file):
+    """Reads one id per line, skipping blank lines."""
+    with open(id_file) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def open_shard(path):
+    """Opens a cache shard read-only; shards are never modified once written."""
+    return sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro&immutable=1", uri=True)
+
+
+def lookup_shards(shards, tag, hashes):
+    """
+    Returns {hash: {method: row without id}} for the hashes found in any shard.
+
+    Only complete entries (with a consensus row) count as hits; later shards win.
+    """
+    found = {}
+    wanted = sorted(set(hashes))
+    for shard in shards:
+        if os.path.getsize(shard) == 0:
+            continue
+        with open_shard(shard) as db:
+            # query in batches below SQLite's bound parameter limit
+            for start in range(0, len(wanted), 500):
+                batch = wanted[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                cursor = db.execute(
+                    f"SELECT hash, {', '.join(METHODS)} FROM segmentation "
+                    f"WHERE tag = ? AND consensus IS NOT NULL AND hash IN ({placeholders})",
+                    [tag] + batch,
+                )
+                for digest, *rows in cursor:
+                    found[digest] = dict(zip(METHODS, rows))
+    return found
+
+
+def lookup(pdb_zip, ids, shards, tag, zip_index=None):
+    """
+    Splits the ids of a chunk into cache misses and hits.
+
+    Args:
+        pdb_zip: Zip file containing <id>.pdb members.
+        ids: Chain ids of the chunk, sorted.
+        shards: Cache shard files.
+        tag: Segmentation tools tag of the entries to use.
+        zip_index: Sidecar index of pdb_zip (see zip_index.py), optional.
+
+    Returns:
+        Tuple of (misses as [(id, hash)], hits as {method: [output rows]}).
+    """
+    with ZipIndex(pdb_zip, zip_index, PDB_SUFFIX) as zf:
+        hashes = [(chain_id, coordinate_hash(zf.read(chain_id)) if chain_id in zf else "") for chain_id in ids]
+
+    found = lookup_shards(shards, tag, [digest for _, digest in hashes if digest])
+    misses, hits = [], defaultdict(list)
+    for chain_id, digest in hashes:
+        entry = found.get(digest)
+        if entry is None:
+            misses.append((chain_id, digest))
+            continue
+        for method, row in entry.items():
+            if row is not None:
+                hits[method].append(f"{chain_id}\t{row}")
+    return misses, hits
+
+
+def read_rows(path):
+    """Returns the non-blank lines of a file, or [] if it does not exist."""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def merge(hits_dir, segmented_dir, keys_file, outdir, new_entries_file):
+    """
+    Merges cached and newly segmented rows per output file, and writes the new cache entries.
+
+    Returns:
+        Tuple of (rows from the cache, new entries).
+    """
+    os.makedirs(outdir, exist_ok=True)
+    hash_of = dict(line.split("\t") for line in read_rows(keys_file))
+    cached = 0
+    new_rows = defaultdict(dict)
+    for method, name in OUTPUT_FILES.items():
+        hit_rows = read_rows(os.path.join(hits_dir, name))
+        segmented_rows = read_rows(os.path.join(segmented_dir, name)) if segmented_dir else []
+        cached += len(hit_rows)
+        with open(os.path.join(outdir, name), "w") as out:
+            out.writelines(row + "\n" for row in sorted(hit_rows + segmented_rows))
+        for row in segmented_rows:
+            chain_id, _, rest = row.partition("\t")
+            if hash_of.get(chain_id):
+                new_rows[hash_of[chain_id]][method] = rest
+
+    # only chains with a consensus row are complete entries
+    entries = 0
+    with open(new_entries_file, "w") as out:
+        for digest in sorted(new_rows):
+            if "consensus" not in new_rows[digest]:
+                continue
+            entries += 1
+            for method in METHODS:
+                if method in new_rows[digest]:
+                    out.write(f"{digest}\t{method}\t{new_rows[digest][method]}\n")
+    return cached, entries
+
+
+def update(entry_files, output, tag, compact_shards=()):
+    """
+    Writes the entries of a run to a new shard (replacing an earlier shard of the same run).
+
+    Args:
+        entry_files: New entry files written by merge.
+        output: Output shard.
+        tag: Segmentation tools tag of the new entries.
+        compact_shards: Existing shards whose entries (of every tag) are copied into the output first,
+            later shards winning; the new entries win over all of them.
+
+    Returns:
+        Tuple of (new entries, entries copied from compact_shards).
+    """
+    entries = defaultdict(dict)
+    for entry_file in entry_files:
+        for line in read_rows(entry_file):
+            digest, method, row = line.split("\t", 2)
+            entries[digest][method] = row
+
+    tmp_output = f"{output}.tmp.{os.getpid()}"
+    copied = 0
+    with sqlite3.connect(tmp_output, uri=True) as db:
+        db.execute(SCHEMA)
+        for shard in compact_shards:
+            if os.path.getsize(shard) == 0:
+                continue
+            db.execute("ATTACH DATABASE ? AS shard", (f"file:{os.path.abspath(shard)}?mode=ro&immutable=1",))
+            copied += db.execute("INSERT OR REPLACE INTO segmentation SELECT * FROM shard.segmentation").rowcount
+            db.commit()
+            db.execute("DETACH DATABASE shard")
+        db.executemany(
+            f"INSERT OR REPLACE INTO segmentation VALUES (?, ?, {', '.join('?' * len(METHODS))})",
+            ((digest, tag, *(rows.get(method) for method in METHODS)) for digest, rows in sorted(entries.items())),
+        )
+    os.replace(tmp_output, output)
+    return len(entries), copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent segmentation cache keyed by coordinate hash.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    lookup_parser = subparsers.add_parser("lookup", help="Split the chains of a chunk into cache misses and hits")
+    lookup_parser.add_argument("--pdb_zip", required=True, help="Zip file containing <id>.pdb members")
+    lookup_parser.add_argument("--zip_index", default=None, help="Sidecar index of --pdb_zip (see zip_index.py)")
+    lookup_parser.add_argument("--id_file", required=True, help="Chain ids of the chunk, one per line")
+    lookup_parser.add_argument("--shards", nargs="*", default=[], help="Cache shard files")
+    lookup_parser.add_argument("--tag", required=True, help="Segmentation tools tag of the entries to use")
+    lookup_parser.add_argument("--misses", required=True, help="Output ids to segment")
+    lookup_parser.add_argument("--keys", required=True, help="Output TSV of miss id and coordinate hash")
+    lookup_parser.add_argument("--hits_dir", required=True, help="Output directory of cached segmentation rows")
+
+    merge_parser = subparsers.add_parser("merge", help="Merge cached rows into the segmentation outputs")
+    merge_parser.add_argument("--hits_dir", required=True, help="Cached rows written by lookup")
+    merge_parser.add_argument("--segmented_dir", default=None, help="Segmentation outputs of the misses, if any")
+    merge_parser.add_argument("--keys", required=True, help="Miss ids and coordinate hashes written by lookup")
+    merge_parser.add_argument("--outdir", required=True, help="Output directory (same file names)")
+    merge_parser.add_argument("--new_entries", required=True, help="Output TSV of new cache entries")
+
+    update_parser = subparsers.add_parser("update", help="Write new entries to a cache shard")
+    update_parser.add_argument("--tag", required=True, help="Segmentation tools tag of the entries")
+    update_parser.add_argument("--output", required=True, help="Output shard")
+    update_parser.add_argument("entries", nargs="*", help="New entry files written by merge")
+    update_parser.add_argument("--compact", nargs="*", default=[],
+                               help="Existing shards to merge into the output shard, which then replaces them")
+    update_parser.add_argument("--compacted_list", default=None,
+                               help="Output list of the names of the --compact shards, one per line")
+
+    args = parser.parse_args()
+
+    if args.command == "lookup":
+        misses, hits = lookup(args.pdb_zip, read_ids(args.id_file), args.shards, args.tag, args.zip_index)
+        with open(args.misses, "w") as ids_out, open(args.keys, "w") as keys_out:
+            for chain_id, digest in misses:
+                ids_out.write(f"{chain_id}\n")
+                keys_out.write(f"{chain_id}\t{digest}\n")
+        os.makedirs(args.hits_dir, exist_ok=True)
+        for method, name in OUTPUT_FILES.items():
+            with open(os.path.join(args.hits_dir, name), "w") as out:
+                out.writelines(row + "\n" for row in sorted(hits[method]))
+        print(f"{len(hits['consensus'])} cache hits, {len(misses)} to segment", file=sys.stderr)
+    elif args.command == "merge":
+        cached, entries = merge(args.hits_dir, args.segmented_dir, args.keys, args.outdir, args.new_entries)
+        print(f"Merged {cached} cached rows, {entries} new cache entries", file=sys.stderr)
+    else:
+        count, copied = update(args.entries, args.output, args.tag, args.compact)
+        if args.compacted_list:
+            with open(args.compacted_list, "w") as out:
+                out.writelines(f"{os.path.basename(shard)}\n" for shard in args.compact)
+        compacted = f" and {copied} entries of {len(args.compact)} compacted shards" if args.compact else ""
+        print(f"Wrote {count} entries{compacted} to '{args.output}'", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Per-residue sequence store for parent chains.
+
+A domain's sequence is the parent chain sequence restricted to its boundaries, so the
+chopped domain PDB files are not needed to compute its md5. The `build` command reads
+every chain once from the input zip and stores, per residue, its number, one-letter
+code and whether it is peptide-bonded to the next residue:
+
+    <store>/resnum.npy    int16, residue numbers
+    <store>/residue.npy   uint8, ASCII one-letter code (0 for non-standard residues)
+    <store>/linked.npy    bool, linked[i] is True if residues i and i+1 form a peptide bond
+    <store>/index.tsv     chain id <TAB> pdb chain <TAB> offset <TAB> length, sorted by chain id
+
+The `domains` command then slices every consensus domain out of its parent chain and
+writes the same rows as pdb_to_md5.py on the chopped files (<chain>_<NN>.pdb <TAB>
+chain <TAB> md5 <TAB> sequence), with a header and sorted by file name. Peptides are
+rebuilt with the PPBuilder rules, so a domain segment boundary or a chain break splits
+a peptide and residues left without a bonded neighbour are dropped.
+
+Usage:
+    sequence_store.py build --pdb_zip pdbs.zip --id_file ids.txt --store sequence_store
+    sequence_store.py domains --store sequence_store --consensus consensus_chunk.tsv -o output.tsv [--cpus N]
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from chop_pdbs import parse_domain_boundaries
+from pdb_to_md5 import HEADER, chain_residues, md5_of_sequence, peptide_sequence
+from plddt_store import read_ids
+from zip_index import PDB_SUFFIX, ZipIndex
+
+RESNUM_FILE = "resnum.npy"
+RESIDUE_FILE = "residue.npy"
+LINKED_FILE = "linked.npy"
+INDEX_FILE = "index.tsv"
+
+
+def build_store(pdb_zip, ids, store_dir, zip_index=None):
+    """
+    Builds a sequence store for the given chain ids from a zip of PDB files.
+
+    Args:
+        pdb_zip: Zip file containing <id>.pdb members.
+        ids: Chain ids to include.
+        store_dir: Output directory.
+        zip_index: Sidecar index of pdb_zip (see zip_index.py), optional.
+
+    Returns:
+        Tuple of (stored count, missing count).
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    resnums, residues, links, index = [], [], [], []
+    offset = 0
+    missing = 0
+
+    with ZipIndex(pdb_zip, zip_index, PDB_SUFFIX) as zf:
+        for chain_id in sorted(set(ids)):
+            if chain_id not in zf:
+                print(f"WARNING: {chain_id}.pdb not found in {pdb_zip}", file=sys.stderr)
+                missing += 1
+                continue
+            resnum, one_letter, linked, pdb_chain = chain_residues(zf.read(chain_id), chain_id=None)
+            resnums.append(resnum.astype(np.int16))
+            residues.append(np.frombuffer("".join(c or "\0" for c in one_letter).encode("ascii"), dtype=np.uint8))
+            links.append(linked)
+            index.append((chain_id, pdb_chain, offset, resnum.size))
+            offset += resnum.size
+
+    np.save(os.path.join(store_dir, RESNUM_FILE), np.concatenate(resnums) if resnums else np.zeros(0, np.int16))
+    np.save(os.path.join(store_dir, RESIDUE_FILE), np.concatenate(residues) if residues else np.zeros(0, np.uint8))
+    np.save(os.path.join(store_dir, LINKED_FILE), np.concatenate(links) if links else np.zeros(0, bool))
+    with open(os.path.join(store_dir, INDEX_FILE), "w") as out:
+        for chain_id, pdb_chain, start, length in index:
+            out.write(f"{chain_id}\t{pdb_chain}\t{start}\t{length}\n")
+
+    return len(index), missing
+
+
+class SequenceStore:
+    """Read-only access to a sequence store; the arrays are memory mapped."""
+
+    def __init__(self, store_dir):
+        self.resnum = np.load(os.path.join(store_dir, RESNUM_FILE), mmap_mode="r")
+        self.residue = np.load(os.path.join(store_dir, RESIDUE_FILE), mmap_mode="r")
+        self.linked = np.load(os.path.join(store_dir, LINKED_FILE), mmap_mode="r")
+        self.index = {}
+        with open(os.path.join(store_dir, INDEX_FILE)) as f:
+            for line in f:
+                chain_id, pdb_chain, start, length = line.rstrip("\n").split("\t")
+                self.index[chain_id] = (pdb_chain, int(start), int(length))
+
+    def __contains__(self, chain_id):
+        return chain_id in self.index
+
+    def chain(self, chain_id):
+        """Returns (pdb chain, residue numbers, one-letter codes, linked flags) for one chain."""
+        pdb_chain, start, length = self.index[chain_id]
+        resnum = np.asarray(self.resnum[start:start + length])
+        one_letter = [chr(c) if c else "" for c in self.residue[start:start + length].tobytes()]
+        linked = np.asarray(self.linked[start:start + length])
+        return pdb_chain, resnum, one_letter, linked
+
+    def domain_sequences(self, chain_id, domains):
+        """
+        Returns (pdb chain, [sequence per domain]) for a chain.
+
+        Args:
+            chain_id: Parent chain id.
+            domains: List of domains, each a list of inclusive (start, end) residue ranges.
+        """
+        pdb_chain, resnum, one_letter, linked = self.chain(chain_id)
+        sequences = []
+        for ranges in domains:
+            # same selection as pdb_selres: every residue inside any range, kept in chain order
+            mask = np.zeros(resnum.size, dtype=bool)
+            for start, end in ranges:
+                mask |= (resnum >= start) & (resnum <= end)
+            sequences.append(peptide_sequence(one_letter, np.flatnonzero(mask), linked))
+        return pdb_chain, sequences
+
+
+def read_consensus_domains(consensus_file):
+    """
+    Yields (chain id, [domain ranges]) for every chain with domains in a consensus file.
+
+    Domains are numbered as in chop_pdbs.py: high and medium domains sorted by the
+    start of their first segment.
+    """
+    with open(consensus_file) as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 8:
+                continue
+            all_domains = parse_domain_boundaries(fields[6], "high") + parse_domain_boundaries(fields[7], "med")
+            if not all_domains:
+                continue
+            all_domains.sort(key=lambda x: x[1][0][0])
+            yield fields[0], [ranges for _, ranges in all_domains]
+
+
+_store = None
+
+
+def _open_store(store_dir):
+    global _store
+    _store = SequenceStore(store_dir)
+
+
+def chain_md5_rows(item):
+    """Returns the md5 rows for one (chain id, domain ranges) pair, or None if the chain is not stored."""
+    chain_id, domains = item
+    if chain_id not in _store:
+        return None
+    pdb_chain, sequences = _store.domain_sequences(chain_id, domains)
+    rows = []
+    for i, seq in enumerate(sequences, start=1):
+        name = f"{chain_id}_{i:02d}.pdb"
+        if seq:
+            rows.append(f"{name}\t{pdb_chain}\t{md5_of_sequence(seq)}\t{seq}\n")
+        else:
+            rows.append(f"{name}\t{pdb_chain}\tNA\tNo sequence found\n")
+    return rows
+
+
+def domain_md5_rows(store_dir, consensus_file, cpus=None):
+    """
+    Computes md5 rows for every domain in a consensus file, sorted by file name.
+
+    Args:
+        store_dir: Store directory written by build_store.
+        consensus_file: Consensus TSV (chopping in columns 7 and 8).
+        cpus: Number of worker processes (defaults to all available CPUs).
+
+    Returns:
+        Tuple of (rows, missing chain count).
+    """
+    cpus = cpus or len(os.sched_getaffinity(0))
+    items = list(read_consensus_domains(consensus_file))
+
+    if cpus == 1 or len(items) < 2:
+        _open_store(store_dir)
+        results = list(map(chain_md5_rows, items))
+    else:
+        with ProcessPoolExecutor(max_workers=cpus, initializer=_open_store, initargs=(store_dir,)) as executor:
+            results = list(executor.map(chain_md5_rows, items, chunksize=max(1, len(items) // (cpus * 4))))
+
+    rows = []
+    missing = 0
+    for (chain_id, _), chain_rows in zip(items, results):
+        if chain_rows is None:
+            print(f"WARNING: {chain_id} not found in sequence store", file=sys.stderr)
+            missing += 1
+            continue
+        rows.extend(chain_rows)
+    rows.sort()
+    return rows, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-residue sequence store for parent chains.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Extract residue sequences from a zip of PDB files.")
+    build.add_argument("--pdb_zip", required=True, help="Zip file containing <id>.pdb members")
+    build.add_argument("--id_file", required=True, help="Chain ids to include, one per line")
+    build.add_argument("--store", required=True, help="Output store directory")
+    build.add_argument("--zip_index", default=None, help="Sidecar index of --pdb_zip (see zip_index.py)")
+
+    domains = subparsers.add_parser("domains", help="Sequence md5 of consensus domains.")
+    domains.add_argument("--store", required=True, help="Store directory written by 'build'")
+    domains.add_argument("--consensus", required=True, help="Consensus TSV (chopping in columns 7 and 8)")
+    domains.add_argument("-o", "--outfile", required=True, help="Output TSV (pdb_file, chain, md5, sequence)")
+    domains.add_argument("--cpus", type=int, default=None, help="Worker processes (default: all available CPUs)")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        stored, missing = build_store(args.pdb_zip, read_ids(args.id_file), args.store, args.zip_index)
+        print(f"Stored sequences for {stored} chains in '{args.store}' ({missing} missing)")
+    else:
+        rows, missing = domain_md5_rows(args.store, args.consensus, cpus=args.cpus)
+        with open(args.outfile, "w") as out:
+            out.write(HEADER)
+            out.writelines(rows)
+        print(f"Wrote md5s for {len(rows)} domains to '{args.outfile}' ({missing} chains missing)")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,9 +8,11 @@
 # 19-Jun-25 - amended to omit "_dom" from domain names and "high" or "med" from filenames.
 
 import argparse
-import pandas as pd
+import csv
 import os
 
+from tsv_io import is_missing, read_rows, write_rows
+
 DEFAULT_STRIDE_SUMMARY_SUFFIX = ".stride.summary"
 
 parser = argparse.ArgumentParser(
@@ -55,8 +57,9 @@ parser.add_argument(
 
 
 def read_md5_file(md5_file):
-    df = pd.read_csv(md5_file, sep="\t")
-    md5_lookup = dict(zip(df["pdb_file"], df["md5"]))
+    with open(md5_file, newline="") as f:
+        reader = csv.DictReader(f, delimiter="\t")
+        md5_lookup = {row["pdb_file"]: None if is_missing(row["md5"]) else row["md5"] for row in reader}
     return md5_lookup
 
 
@@ -109,13 +112,33 @@ def read_stride_summary(file_path):
     return stride_data_by_id
 
 
-def transform_consensus(
-    input_file,
-    output_file,
-    md5_file,
-    stride_dir,
-    stride_summary_suffix=DEFAULT_STRIDE_SUMMARY_SUFFIX,
-):
+STRIDE_KEYS = [
+    "num_helix_strand_turn",
+    "num_helix",
+    "num_strand",
+    "num_helix_strand",
+    "num_turn",
+]
+
+OUTPUT_COLUMNS = [
+    "uniprot_id",
+    "md5_domain",
+    "consensus_level",
+    "chopping",
+    "nres_domain",
+    "num_segments",
+] + STRIDE_KEYS
+
+
+def transform_rows(input_file, md5_lookup, all_stride_data_by_id):
+    """
+    Yields the domain-level output rows (OUTPUT_COLUMNS) of a consensus file.
+
+    Args:
+        input_file: Path or open text file of consensus rows.
+        md5_lookup: Domain md5 by domain PDB file name (see read_md5_file).
+        all_stride_data_by_id: STRIDE summary by domain PDB file name (see read_stride_summary).
+    """
     headers = [
         "target_id",
         "MD5",
@@ -127,31 +150,9 @@ def transform_consensus(
         "med_dom",
         "low_dom",
     ]
-    df = pd.read_csv(input_file, sep="\t", names=headers)
 
-    md5_lookup = read_md5_file(md5_file)
-
-    # Read all stride summary files and combine their data
-    all_stride_data_by_id = {}
-    stride_files = [
-        os.path.join(stride_dir, f)
-        for f in os.listdir(stride_dir)
-        if f.endswith(stride_summary_suffix)
-    ]
-    for stride_file in stride_files:
-        _stride_data = read_stride_summary(stride_file)
-        all_stride_data_by_id.update(_stride_data)
-
-    output_rows = []
-    stride_keys = [
-        "num_helix_strand_turn",
-        "num_helix",
-        "num_strand",
-        "num_helix_strand",
-        "num_turn",
-    ]
-
-    for idx, row in df.iterrows():
+    for values in read_rows(input_file, len(headers)):
+        row = dict(zip(headers, values))
         uniprot_id = row["target_id"]
         domain_count = 1
 
@@ -159,7 +160,7 @@ def transform_consensus(
 
         for level in ["high", "med"]:
             dom_str = row[f"{level}_dom"]
-            if isinstance(dom_str, str) and dom_str.lower() != "na":
+            if not is_missing(dom_str) and dom_str.lower() != "na":
                 domains = dom_str.split(",")
                 for domain in domains:
                     all_domains.append((domain, level))  # Store as tuple: (domain, level)
@@ -186,23 +187,35 @@ def transform_consensus(
             md5 = md5_lookup[pdb_filename]
 
             row_data = [domain_id, md5, level, domain, nres, num_segments]
-            for key in stride_keys:
+            for key in STRIDE_KEYS:
                 row_data.append(stride_data.get(key, "NA"))
 
-            output_rows.append(row_data)
+            yield row_data
             domain_count += 1
 
-    column_names = [
-        "uniprot_id",
-        "md5_domain",
-        "consensus_level",
-        "chopping",
-        "nres_domain",
-        "num_segments",
-    ] + stride_keys
-
-    output_df = pd.DataFrame(output_rows, columns=column_names)
-    output_df.to_csv(output_file, sep="\t", index=False)
+
+def transform_consensus(
+    input_file,
+    output_file,
+    md5_file,
+    stride_dir,
+    stride_summary_suffix=DEFAULT_STRIDE_SUMMARY_SUFFIX,
+):
+    md5_lookup = read_md5_file(md5_file)
+
+    # Read all stride summary files and combine their data
+    all_stride_data_by_id = {}
+    stride_files = [
+        os.path.join(stride_dir, f)
+        for f in os.listdir(stride_dir)
+        if f.endswith(stride_summary_suffix)
+    ]
+    for stride_file in stride_files:
+        _stride_data = read_stride_summary(stride_file)
+        all_stride_data_by_id.update(_stride_data)
+
+    output_rows = list(transform_rows(input_file, md5_lookup, all_stride_data_by_id))
+    write_rows(output_file, output_rows, header=OUTPUT_COLUMNS)
 
 
 # CLI use
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+TSV reading and writing with the csv module, for the small per-chunk scripts.
+
+Importing pandas takes about half a second, which every per-chunk task used to pay on a cold
+start just to read and write a few tab-separated files. These helpers read and write them the
+way those scripts used pandas.read_csv and DataFrame.to_csv to:
+
+    - blank lines are skipped and fields are unquoted as by read_csv
+    - the strings read_csv reads as missing (NaN) are recognised with is_missing
+    - missing values (None) are written as empty fields, and fields are quoted only when
+      they contain a tab, quote or newline, as by to_csv
+"""
+
+import csv
+
+# The strings pandas.read_csv reads as NaN by default
+MISSING_VALUES = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+])
+
+
+def is_missing(value):
+    """Returns True if value is None or a string pandas.read_csv reads as NaN."""
+    return value is None or value in MISSING_VALUES
+
+
+def read_rows(f, ncols=None):
+    """
+    Yields the rows of a tab-separated file as lists of strings, skipping blank lines.
+
+    Args:
+        f: Path or open text file.
+        ncols: If given, rows are truncated or padded with None to this many columns.
+    """
+    if isinstance(f, str):
+        with open(f, newline="") as handle:
+            yield from read_rows(handle, ncols)
+        return
+    for row in csv.reader(f, delimiter="\t"):
+        if not row or row == [""]:
+            continue
+        if ncols is not None:
+            row = row[:ncols] + [None] * (ncols - len(row))
+        yield row
+
+
+def write_rows(path, rows, header=None):
+    """Writes rows (sequences of values, None for missing) to a tab-separated file (path or open text file)."""
+    if isinstance(path, str):
+        with open(path, "w", newline="") as f:
+            write_rows(f, rows, header)
+        return
+    writer = csv.writer(path, delimiter="\t", lineterminator="\n")
+    if header is not None:
+        writer.writerow(header)
+    writer.writerows(["" if value is None else value for value in row] for row in rows)
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+Sidecar member index for large zip archives.
+
+zipfile.ZipFile parses the whole central directory and builds a ZipInfo object for every
+member each time an archive is opened, which for input zips with millions of structures
+costs seconds and hundreds of MB per chunk task that only needs a few hundred members.
+The `build` command reads the central directory once and stores it as NumPy arrays,
+sorted by member stem (the file name without directory and extension):
+
+    <index>/stems.npy          S, sorted member stems
+    <index>/names.npy          S, full member names (utf-8)
+    <index>/header_offset.npy  uint64, offset of the local file header
+    <index>/compress_size.npy  uint64
+    <index>/file_size.npy      uint64
+    <index>/method.npy         uint16, compression method (0 stored, 8 deflated)
+    <index>/crc.npy            uint32
+    <index>/archive.tsv        zip name <TAB> zip size <TAB> tail CRC-32 <TAB> member count
+
+The tail CRC-32 covers the end of the archive (the end of central directory record and the
+last central directory entries), so an index is only used for the archive it was built from:
+load_index fails if a zip of the same name has been replaced, even with one of the same size.
+
+ZipIndex memory-maps the arrays, finds a member with a binary search and reads it with a
+direct pread of its local header and data, so opening a member does not depend on the
+size of the archive. Without an index directory the central directory is parsed in
+memory (still without ZipInfo objects). Every member is indexed. Members that share a stem
+(e.g. pdbs/1abc.pdb and cifs/1abc.cif) are kept in central directory order: a lookup by stem
+returns the last one, as in a {stem: name} dict built from namelist(), and can be restricted
+to names with a given suffix (suffix=".pdb" for the PDB consumers). read_name reads a member
+by its exact name.
+
+Usage:
+    zip_index.py build --zip pdbs.zip --index pdbs.zidx
+    zip_index.py extract --zip pdbs.zip [--index pdbs.zidx] --id_file ids.txt --outdir pdbs [--suffix .pdb]
+"""
+
+import argparse
+import os
+import struct
+import sys
+import zipfile
+import zlib
+
+import numpy as np
+
+ARRAYS = ("stems", "names", "header_offset", "compress_size", "file_size", "method", "crc")
+ARCHIVE_FILE = "archive.tsv"
+PDB_SUFFIX = ".pdb"
+
+# Record layouts as in zipfile (structEndArchive, structEndArchive64Locator, structEndArchive64,
+# structCentralDir, structFileHeader)
+END_ARCHIVE = struct.Struct("<4s4H2LH")
+END_ARCHIVE64_LOCATOR = struct.Struct("<4sLQL")
+END_ARCHIVE64 = struct.Struct("<4sQ2H2L4Q")
+CENTRAL_DIR = struct.Struct("<4s4B4HL2L5H2L")
+FILE_HEADER = struct.Struct("<4s2B4HL2L2H")
+
+END_ARCHIVE_SIG = b"PK\005\006"
+END_ARCHIVE64_LOCATOR_SIG = b"PK\006\007"
+END_ARCHIVE64_SIG = b"PK\006\006"
+CENTRAL_DIR_SIG = b"PK\001\002"
+FILE_HEADER_SIG = b"PK\003\004"
+
+ZIP64_EXTRA = 0x0001
+ZIP64_LIMIT = 0xFFFFFFFF
+UTF8_FLAG = 0x800
+ENCRYPTED_FLAG = 0x1
+MAX_COMMENT = 0xFFFF
+
+
+def member_stem(name):
+    """Member name without directory and extension, e.g. 'pdbs/AF-P1-F1-model_v4.pdb' -> 'AF-P1-F1-model_v4'."""
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def _read_tail(f, archive_size):
+    """Returns the last bytes of an archive, which hold its end of central directory record."""
+    tail_size = min(archive_size, END_ARCHIVE.size + MAX_COMMENT)
+    f.seek(archive_size - tail_size)
+    return f.read(tail_size)
+
+
+def archive_fingerprint(zip_path):
+    """Returns (size, CRC-32 of the archive tail) of a zip archive, recorded in and checked against an index."""
+    archive_size = os.path.getsize(zip_path)
+    with open(zip_path, "rb") as f:
+        return archive_size, zlib.crc32(_read_tail(f, archive_size))
+
+
+def _end_of_central_directory(f, archive_size):
+    """Returns (entry count, central directory size, central directory offset, concat offset)."""
+    tail_size = min(archive_size, END_ARCHIVE.size + MAX_COMMENT)
+    tail = _read_tail(f, archive_size)
+    pos = tail.rfind(END_ARCHIVE_SIG)
+    if pos < 0 or pos + END_ARCHIVE.size > len(tail):
+        raise zipfile.BadZipFile("File is not a zip file")
+    end_pos = archive_size - tail_size + pos
+    _, _, _, _, count, cd_size, cd_offset, _ = END_ARCHIVE.unpack_from(tail, pos)
+
+    cd_end = end_pos
+    locator_pos = end_pos - END_ARCHIVE64_LOCATOR.size
+    if locator_pos >= 0:
+        f.seek(locator_pos)
+        locator = f.read(END_ARCHIVE64_LOCATOR.size)
+        if locator[:4] == END_ARCHIVE64_LOCATOR_SIG:
+            f.seek(locator_pos - END_ARCHIVE64.size)
+            record = END_ARCHIVE64.unpack(f.read(END_ARCHIVE64.size))
+            if record[0] != END_ARCHIVE64_SIG:
+                raise zipfile.BadZipFile("Corrupt zip64 end of central directory record")
+            count, cd_size, cd_offset = record[7], record[8], record[9]
+            cd_end = locator_pos - END_ARCHIVE64.size
+
+    # bytes prepended to the archive (e.g. a self-extractor) shift every offset
+    concat = cd_end - cd_size - cd_offset
+    return count, cd_size, cd_offset, concat
+
+
+def _zip64_values(extra, file_size, compress_size, header_offset):
+    """Replaces 0xFFFFFFFF sizes and offset with the values from a zip64 extra field."""
+    pos = 0
+    while pos + 4 <= len(extra):
+        tag, size = struct.unpack_from("<2H", extra, pos)
+        if tag == ZIP64_EXTRA:
+            values = list(struct.unpack_from(f"<{size // 8}Q", extra, pos + 4))
+            if file_size == ZIP64_LIMIT:
+                file_size = values.pop(0)
+            if compress_size == ZIP64_LIMIT:
+                compress_size = values.pop(0)
+            if header_offset == ZIP64_LIMIT:
+                header_offset = values.pop(0)
+            break
+        pos += 4 + size
+    return file_size, compress_size, header_offset
+
+
+def iter_central_directory(zip_path):
+    """
+    Yields (name, header_offset, compress_size, file_size, method, crc) for every file member
+    of a zip archive in central directory order, skipping directory entries.
+
+    Args:
+        zip_path: Path to the zip archive.
+    """
+    archive_size = os.path.getsize(zip_path)
+    with open(zip_path, "rb") as f:
+        count, cd_size, cd_offset, concat = _end_of_central_directory(f, archive_size)
+        f.seek(cd_offset + concat)
+        directory = f.read(cd_size)
+
+    pos = 0
+    for _ in range(count):
+        record = CENTRAL_DIR.unpack_from(directory, pos)
+        if record[0] != CENTRAL_DIR_SIG:
+            raise zipfile.BadZipFile("Bad magic number for central directory")
+        flags, method, crc, compress_size, file_size = record[5], record[6], record[9], record[10], record[11]
+        name_len, extra_len, comment_len, header_offset = record[12], record[13], record[14], record[18]
+        start = pos + CENTRAL_DIR.size
+        raw_name = directory[start:start + name_len]
+        extra = directory[start + name_len:start + name_len + extra_len]
+        pos = start + name_len + extra_len + comment_len
+
+        name = raw_name.decode("utf-8" if flags & UTF8_FLAG else "cp437")
+        if name.endswith("/"):
+            continue
+        if ZIP64_LIMIT in (file_size, compress_size, header_offset):
+            file_size, compress_size, header_offset = _zip64_values(extra, file_size, compress_size, header_offset)
+        yield name, header_offset + concat, compress_size, file_size, method, crc
+
+
+def read_central_directory(zip_path):
+    """
+    Reads the central directory of a zip archive into index arrays, sorted by stem (members with
+    the same stem in central directory order).
+
+    Args:
+        zip_path: Path to the zip archive.
+
+    Returns:
+        Dict of NumPy arrays keyed by the names in ARRAYS.
+    """
+    stems, names = [], []
+    header_offsets, compress_sizes, file_sizes, methods, crcs = [], [], [], [], []
+    for name, header_offset, compress_size, file_size, method, crc in iter_central_directory(zip_path):
+        stems.append(member_stem(name).encode())
+        names.append(name.encode())
+        header_offsets.append(header_offset)
+        compress_sizes.append(compress_size)
+        file_sizes.append(file_size)
+        methods.append(method)
+        crcs.append(crc)
+
+    stems = np.array(stems, dtype=bytes) if stems else np.zeros(0, dtype="S1")
+    order = np.argsort(stems, kind="stable")
+
+    return {
+        "stems": stems[order],
+        "names": (np.array(names, dtype=bytes) if names else np.zeros(0, dtype="S1"))[order],
+        "header_offset": np.array(header_offsets, dtype=np.uint64)[order],
+        "compress_size": np.array(compress_sizes, dtype=np.uint64)[order],
+        "file_size": np.array(file_sizes, dtype=np.uint64)[order],
+        "method": np.array(methods, dtype=np.uint16)[order],
+        "crc": np.array(crcs, dtype=np.uint32)[order],
+    }
+
+
+def build_index(zip_path, index_dir):
+    """
+    Writes the sidecar index of a zip archive.
+
+    Args:
+        zip_path: Path to the zip archive.
+        index_dir: Output directory.
+
+    Returns:
+        Number of indexed members.
+    """
+    archive_size, tail_crc = archive_fingerprint(zip_path)
+    arrays = read_central_directory(zip_path)
+    os.makedirs(index_dir, exist_ok=True)
+    for name in ARRAYS:
+        np.save(os.path.join(index_dir, f"{name}.npy"), arrays[name])
+    with open(os.path.join(index_dir, ARCHIVE_FILE), "w") as out:
+        out.write(f"{os.path.basename(zip_path)}\t{archive_size}\t{tail_crc}\t{len(arrays['stems'])}\n")
+    return len(arrays["stems"])
+
+
+def load_index(index_dir, zip_path):
+    """
+    Memory-maps a sidecar index, checking that it was built for this archive (same size and tail CRC-32).
+
+    Raises:
+        ValueError: If the index was built for another archive, or by an older version without a tail CRC.
+    """
+    with open(os.path.join(index_dir, ARCHIVE_FILE)) as f:
+        fields = f.readline().rstrip("\n").split("\t")
+    if len(fields) != 4:
+        raise ValueError(f"Index {index_dir} has no archive fingerprint, rebuild it for {zip_path}")
+    if (int(fields[1]), int(fields[2])) != archive_fingerprint(zip_path):
+        raise ValueError(f"Index {index_dir} does not match {zip_path} (archive size or tail CRC-32 differs), "
+                         "rebuild it")
+    return {name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+
+
+class ZipReader:
+    """
+    Reads zip members from their central directory entries with a direct pread.
+
+    Args:
+        zip_path: Path to the zip archive.
+    """
+
+    def __init__(self, zip_path):
+        self.zip_path = zip_path
+        self._fd = os.open(zip_path, os.O_RDONLY)
+        self._zipfile = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._zipfile is not None:
+            self._zipfile.close()
+            self._zipfile = None
+
+    def read_entry(self, name, header_offset, compress_size, method, crc):
+        """Returns the uncompressed contents of a member, given the fields of its central directory entry."""
+        header = os.pread(self._fd, FILE_HEADER.size, header_offset)
+        if len(header) != FILE_HEADER.size or header[:4] != FILE_HEADER_SIG:
+            raise zipfile.BadZipFile(f"Bad magic number for file header of {name}")
+        flags = header[6] | header[7] << 8
+        if flags & ENCRYPTED_FLAG or method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            return self._read_with_zipfile(name)
+
+        name_len, extra_len = struct.unpack_from("<2H", header, 26)
+        data = os.pread(self._fd, compress_size, header_offset + FILE_HEADER.size + name_len + extra_len)
+        if len(data) != compress_size:
+            raise zipfile.BadZipFile(f"Truncated member {name}")
+        if method == zipfile.ZIP_DEFLATED:
+            data = zlib.decompress(data, -15)
+        if zlib.crc32(data) != crc:
+            raise zipfile.BadZipFile(f"Bad CRC-32 for file {name!r}")
+        return data
+
+    def _read_with_zipfile(self, name):
+        """Falls back to zipfile for compression methods other than stored and deflated."""
+        if self._zipfile is None:
+            self._zipfile = zipfile.ZipFile(self.zip_path)
+        return self._zipfile.read(name)
+
+
+class ZipIndex(ZipReader):
+    """
+    Random access to the members of a zip archive by stem.
+
+    Args:
+        zip_path: Path to the zip archive.
+        index_dir: Sidecar index written by build_index (default: parse the central directory).
+        suffix: Only look up members whose names end with this suffix by stem (e.g. PDB_SUFFIX),
+            so that 1abc.cif is never read for 1abc (default: any member).
+    """
+
+    def __init__(self, zip_path, index_dir=None, suffix=None):
+        arrays = load_index(index_dir, zip_path) if index_dir else read_central_directory(zip_path)
+        for name in ARRAYS:
+            setattr(self, f"_{name}", arrays[name])
+        self._suffix = suffix.encode() if suffix else None
+        super().__init__(zip_path)
+
+    def __len__(self):
+        return len(self._stems)
+
+    def __contains__(self, stem):
+        return self.find(stem) >= 0
+
+    def _stem_range(self, stem):
+        key = stem.encode()
+        return int(np.searchsorted(self._stems, key, "left")), int(np.searchsorted(self._stems, key, "right"))
+
+    def find(self, stem):
+        """Returns the position of the last member with this stem (and the suffix, if set), or -1."""
+        start, end = self._stem_range(stem)
+        for i in range(end - 1, start - 1, -1):
+            if self._suffix is None or self._names[i].endswith(self._suffix):
+                return i
+        return -1
+
+    def find_name(self, name):
+        """Returns the position of the member with this exact name, or -1."""
+        key = name.encode()
+        start, end = self._stem_range(member_stem(name))
+        for i in range(end - 1, start - 1, -1):
+            if self._names[i] == key:
+                return i
+        return -1
+
+    def stems(self):
+        return [stem.decode() for stem in self._stems]
+
+    def names(self):
+        return [name.decode() for name in self._names]
+
+    def name(self, stem):
+        i = self.find(stem)
+        if i < 0:
+            raise KeyError(f"There is no item with stem {stem!r} in the archive")
+        return self._names[i].decode()
+
+    def read(self, stem):
+        """Returns the uncompressed contents of the member with this stem."""
+        i = self.find(stem)
+        if i < 0:
+            raise KeyError(f"There is no item with stem {stem!r} in the archive")
+        return self.read_at(i)
+
+    def read_name(self, name):
+        """Returns the uncompressed contents of the member with this exact name."""
+        i = self.find_name(name)
+        if i < 0:
+            raise KeyError(f"There is no item named {name!r} in the archive")
+        return self.read_at(i)
+
+    def read_at(self, i):
+        """Returns the uncompressed contents of the member at position i."""
+        return self.read_entry(self._names[i].decode(), int(self._header_offset[i]), int(self._compress_size[i]),
+                               int(self._method[i]), int(self._crc[i]))
+
+    def extract(self, stems, outdir):
+        """
+        Writes the members with the given stems to outdir under their base names.
+
+        Returns:
+            Tuple of (extracted count, list of missing stems).
+        """
+        os.makedirs(outdir, exist_ok=True)
+        extracted, missing = 0, []
+        for stem in stems:
+            i = self.find(stem)
+            if i < 0:
+                missing.append(stem)
+                continue
+            with open(os.path.join(outdir, os.path.basename(self._names[i].decode())), "wb") as out:
+                out.write(self.read_at(i))
+            extracted += 1
+        return extracted, missing
+
+
+def read_ids(id_file):
+    """Reads one id per line, skipping blank lines."""
+    with open(id_file) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and use sidecar member indexes for zip archives.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Index the central directory of a zip archive")
+    build.add_argument("--zip", required=True, help="Zip archive")
+    build.add_argument("--index", required=True, help="Output index directory")
+
+    extract = subparsers.add_parser("extract", help="Extract members by stem")
+    extract.add_argument("--zip", required=True, help="Zip archive")
+    extract.add_argument("--index", default=None, help="Index directory (default: read the central directory)")
+    extract.add_argument("--id_file", required=True, help="File with one member stem per line")
+    extract.add_argument("--outdir", required=True, help="Output directory")
+    extract.add_argument("--suffix", default=None, help="Only extract members with this suffix, e.g. .pdb")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_index(args.zip, args.index)
+        print(f"Indexed {count} members of {args.zip}")
+    else:
+        with ZipIndex(args.zip, args.index, args.suffix) as index:
+            extracted, missing = index.extract(read_ids(args.id_file), args.outdir)
+        for stem in missing:
+            print(f"WARNING: {stem} not found in {args.zip}", file=sys.stderr)
+        print(f"Extracted {extracted} members of {args.zip}")
+
+
+if __name__ == "__main__":
+    main()
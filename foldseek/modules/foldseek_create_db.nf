@@ -1,5 +1,6 @@
 process foldseek_create_db {
     label 'sge_low'
+    tag "$id"
     container "ghcr.io/uclorengogroup/domain-annotation-pipeline-foldseek:${params.container_tag_name}" 
 
     input:
@@ -8,10 +9,12 @@ process foldseek_create_db {
     output:
     tuple val(id), path("database_dir"), emit: query_db_dir
 
+    // chopped archives are tar (.tar.gz/.tar/.tar.zst, GNU tar detects the compression) or zip
     script:
+    def extract = chopped_pdb_tar_file.name.endsWith('.zip') ? "unzip -q ${chopped_pdb_tar_file} -d pdb" : "tar -xf ${chopped_pdb_tar_file} -C pdb"
     """
     mkdir -p pdb database_dir
-    tar -xzf ${chopped_pdb_tar_file} -C pdb
+    ${extract}
     ${params.foldseek_exec} createdb pdb database_dir/query_db
     rm -rf pdb
     """
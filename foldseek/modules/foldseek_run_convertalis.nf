@@ -1,5 +1,6 @@
 process foldseek_run_convertalis {
     label 'sge_low'
+    tag "$id"
     container "ghcr.io/uclorengogroup/domain-annotation-pipeline-foldseek:${params.container_tag_name}" 
     publishDir "results/convertalis", mode: 'copy', enabled: params.debug
     
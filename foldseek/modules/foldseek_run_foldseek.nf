@@ -1,5 +1,6 @@
 process foldseek_run_foldseek {
     label 'sge_low'
+    tag "$id"
     container "ghcr.io/uclorengogroup/domain-annotation-pipeline-foldseek:${params.container_tag_name}" 
     
     input:
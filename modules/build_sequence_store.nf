@@ -0,0 +1,20 @@
+// Extract per-residue sequence, residue numbers and peptide links for every chain in a segmentation chunk once, straight from the input zip.
+process build_sequence_store {
+    label 'sge_low'
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+
+    input:
+    tuple val(chunk_id), path(id_file), path(pdb_zip), val(id_slice), path(zip_index)
+
+    output:
+    tuple val(chunk_id), path("sequence_store_${chunk_id}")
+
+    script:
+    // id_slice = [byte_offset, length] of this chunk in a single-file chunk plan, or [] for a whole chunk file
+    def read_ids = id_slice ? "tail -c +${id_slice[0] + 1} ${id_file} | head -c ${id_slice[1]}" : "cat ${id_file}"
+    def index_arg = zip_index ? "--zip_index ${zip_index}" : ''
+    """
+    ${read_ids} > chunk_ids.txt
+    ${params.sequence_store_script} build --pdb_zip ${pdb_zip} --id_file chunk_ids.txt --store sequence_store_${chunk_id} ${index_arg}
+    """
+}
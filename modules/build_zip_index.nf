@@ -0,0 +1,20 @@
+// The index is stored under the zip's name, size and modification time (zip_version), so a zip replaced under
+// the same name gets a new index instead of reusing the stale one. zip_index.py also records the archive size
+// and the CRC-32 of its tail, and every task checks them before using the index.
+process build_zip_index {
+    label 'sge_low'
+    tag "${pdb_zip.name}"
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+    storeDir "${params.results_dir}/intermediate/zip_index"
+
+    input:
+    tuple path(pdb_zip), val(zip_version)
+
+    output:
+    tuple val(pdb_zip.name), path("${pdb_zip.baseName}.${zip_version}.zidx")
+
+    script:
+    """
+    ${params.zip_index_script} build --zip ${pdb_zip} --index ${pdb_zip.baseName}.${zip_version}.zidx
+    """
+}
@@ -1,20 +1,24 @@
 process chop_pdb_from_zip {
     label 'sge_low'
+    tag "$id"
     container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}" 
     memory 8.GB
     publishDir "${params.results_dir}/chopped_pdbs" , mode: 'copy'
 
     input:
-    tuple val(id), path(consensus_chunk), path(pdb_zip)
+    tuple val(id), path(consensus_chunk), path(pdb_zip), path(zip_index)
 
     output:
-    tuple val(id), path("${id}_chopped_pdbs.tar.gz")
+    tuple val(id), path("${id}_chopped_pdbs.${params.chopped_format}")
     
+    // params.chopped_format picks the archive read by the domain analyses: tar.gz, tar, tar.zst or zip (see chopped_archive.py)
     script:
+    def index_arg = zip_index ? "--zip-index ${zip_index}" : ''
+    def level_arg = params.chopped_level != null ? "--level ${params.chopped_level}" : ''
     """
     mkdir -p chopped_pdbs
-    ${params.chop_pdb_script} --consensus ${consensus_chunk} --pdb-zip ${pdb_zip} --output chopped_pdbs
-    tar --sort=name --mtime='UTC 1970-01-01' --owner=0 --group=0 --numeric-owner -czf ${id}_chopped_pdbs.tar.gz -C chopped_pdbs .
+    ${params.chop_pdb_script} --consensus ${consensus_chunk} --pdb-zip ${pdb_zip} ${index_arg} --output chopped_pdbs
+    ${params.chopped_archive_script} pack --input chopped_pdbs --output ${id}_chopped_pdbs.${params.chopped_format} --threads ${task.cpus} ${level_arg}
     rm -rf chopped_pdbs
     """
 }
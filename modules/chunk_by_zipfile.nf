@@ -7,19 +7,32 @@ process chunk_ids_by_zip {
     path   ids_file
     val    chunk_size
     path   script
+    path   sort_module          // external_sort.py, imported by the script
+    val    cost_model
+    val    cost_coefficients
+    val    giant_residues
+    val    giant_chunk_size
 
     output:
     path "chunk_mapping.tsv", emit: chunk_mapping
+    path "giant_chunk_mapping.tsv", emit: giant_chunk_mapping
 
     script:
+    def sort_args = params.sort_mode == 'external' ? "--max_memory_mb ${params.sort_memory_mb} --tmp_dir \$PWD/sort_tmp" : ''
     """
-    mkdir -p chunks
+    mkdir -p chunks sort_tmp
 
     python3 ${script} \
         --input_file ${ids_file} \
         --chunk_size ${chunk_size} \
         --outdir \$PWD/chunks \
-        --file_list chunk_mapping.tsv
+        --file_list chunk_mapping.tsv \
+        --cost_model ${cost_model} \
+        --cost_coefficients ${cost_coefficients} \
+        --giant_residues ${giant_residues} \
+        --giant_chunk_size ${giant_chunk_size} \
+        --giant_file_list giant_chunk_mapping.tsv ${sort_args} ${params.chunk_plan ? '--plan' : ''}
+    rm -rf sort_tmp
     """
 }
 
@@ -1,7 +1,7 @@
 process collect_results_final {
     label 'sge_low'
     container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}" 
-    publishDir "${params.results_dir}" , mode: 'copy'
+    publishDir "${params.results_dir}" , mode: 'copy', enabled: !params.previous_results // incremental mode publishes the merged results instead
 
     input:
     path combine_script // Takes input from fromPath in the workflow. This is NOT params.combine_script
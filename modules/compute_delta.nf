@@ -0,0 +1,29 @@
+// Incremental mode: compares the new input manifest with the previous run (its delta index, or its final_results.tsv)
+// and keeps only the ids that are new or whose structure changed. delta.tsv lists every new, changed and removed id,
+// and delta_index.npz indexes the new input for the next incremental run.
+process compute_delta {
+    label 'sge_low'
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+    publishDir "${params.results_dir}", mode: 'copy', pattern: 'delta*'
+
+    input:
+    path manifest
+    path previous_results
+    path previous_index
+
+    output:
+    path 'delta_mapping.tsv', emit: mapping
+    path 'delta.tsv', emit: delta
+    path 'delta_index.npz', emit: index
+
+    script:
+    def previous_arg = previous_index ? "--previous_index ${previous_index}" : "--previous_results ${previous_results}"
+    """
+    ${params.delta_results_script} delta \\
+        ${previous_arg} \\
+        --manifest ${manifest} \\
+        --mapping delta_mapping.tsv \\
+        --delta delta.tsv \\
+        --index_out delta_index.npz
+    """
+}
@@ -9,10 +9,12 @@ process create_md5 {
     tuple val(id), path("output_${id}.tsv") 
     
     // added id to intermediate files and dos2unix to recognise end of lines correctly.
+    // chopped archives are tar (.tar.gz/.tar/.tar.zst, GNU tar detects the compression) or zip
     script:
+    def extract = chopped_pdb_tar_file.name.endsWith('.zip') ? "unzip -q ${chopped_pdb_tar_file} -d pdb" : "tar -xf ${chopped_pdb_tar_file} -C pdb"
     """
     mkdir -p pdb
-    tar -xzf ${chopped_pdb_tar_file} -C pdb
+    ${extract}
     cath-af-cli pdb-to-md5 -d ./pdb -o output_${id}_tmp.tsv
     dos2unix -n output_${id}_tmp.tsv output_${id}.unsorted.tsv || tr -d '\\r' < output_${id}_tmp.tsv > output_${id}.unsorted.tsv
     head -n 1 output_${id}.unsorted.tsv > output_${id}.tsv
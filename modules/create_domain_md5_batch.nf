@@ -0,0 +1,17 @@
+// Sequence md5s read straight from the chopped archive with the batch engine in pdb_to_md5.py
+// (byte-level scan, process pool over task.cpus). Same output schema and sort order as create_md5.
+process create_md5_batch {
+    label 'sge_low'
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+
+    input:
+    tuple val(id), path(chopped_pdb_tar_file)
+
+    output:
+    tuple val(id), path("output_${id}.tsv")
+
+    script:
+    """
+    ${params.md5_script} -i ${chopped_pdb_tar_file} -o output_${id}.tsv --cpus ${task.cpus}
+    """
+}
@@ -0,0 +1,17 @@
+// Domain sequence md5s sliced from the parent chain sequence store with the consensus boundaries
+// (no chopped PDB files needed). Same output schema and sort order as create_md5.
+process create_md5_from_store {
+    label 'sge_low'
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+
+    input:
+    tuple val(id), path(consensus_chunk), path(sequence_store)
+
+    output:
+    tuple val(id), path("output_${id}.tsv")
+
+    script:
+    """
+    ${params.sequence_store_script} domains --store ${sequence_store} --consensus ${consensus_chunk} -o output_${id}.tsv --cpus ${task.cpus}
+    """
+}
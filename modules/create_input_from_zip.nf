@@ -6,14 +6,20 @@ process create_input_from_zip {
     input:
     path input_zip_dir
     path script
+    path manifest_modules   // zip_index.py and pdb_records.py, imported by the script
+    path manifest_cache     // per-zip manifests kept between launches (keyed by zip path, size and mtime)
 
     output:
-    path "input_mapping.tsv"
+    path "input_mapping.tsv", emit: mapping
+    path "input_manifest.tsv", emit: manifest
 
     script:
     """
     python3 ${script} \\
         --input_zip_dir ${input_zip_dir} \
-        --output input_mapping.tsv
+        --output input_mapping.tsv \
+        --manifest input_manifest.tsv \
+        --cache_dir ${manifest_cache} \
+        --cpus ${task.cpus} ${params.manifest_counts ? '--counts' : ''}
     """
 }
@@ -0,0 +1,67 @@
+// Fused per-chunk domain analysis (params.domain_analysis = 'fused'): the chopped archive is extracted once, to
+// params.domain_analysis_tmp (e.g. /dev/shm) or the task directory, and md5 (unless md5_engine = 'store'), STRIDE
+// summaries, globularity and pLDDT (unless plddt_mode = 'store') run concurrently on that copy. Each output is
+// post-processed and named exactly as in create_md5/create_md5_batch, run_stride, run_measure_globularity and run_plddt.
+process domain_analysis {
+    label 'sge_low'
+    tag "$id"
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-cath-af-cli:${params.container_tag_name}"
+
+    input:
+    tuple val(id), path(chopped_pdb_tar_file)
+    path stride_summary_script
+    path analysis_modules   // fetch_avg_plDDT.py, pdb_to_md5.py, secondary_structure.py, pdb_records.py, chopped_archive.py and zip_index.py
+
+    output:
+    tuple val(id), path("output_${id}.tsv"), emit: md5, optional: true
+    tuple val(id), path("stride_batch_${id}.summary"), emit: stride
+    tuple val(id), path("domain_globularity.tsv"), emit: globularity
+    tuple val(id), path("domain_avg_plddt.tsv"), emit: plddt, optional: true
+
+    script:
+    def extract_root = params.domain_analysis_tmp ?: '\$PWD'
+    def md5_command = ':'
+    if (params.md5_engine == 'python') {
+        md5_command = "python3 pdb_to_md5.py -i \"\$pdb\" -o output_${id}.tsv --cpus 1"
+    } else if (params.md5_engine != 'store') {
+        md5_command = """cath-af-cli pdb-to-md5 -d "\$pdb" -o output_${id}_tmp.tsv
+        dos2unix -n output_${id}_tmp.tsv output_${id}.unsorted.tsv || tr -d '\\r' < output_${id}_tmp.tsv > output_${id}.unsorted.tsv
+        head -n 1 output_${id}.unsorted.tsv > output_${id}.tsv
+        tail -n +2 output_${id}.unsorted.tsv | sort >> output_${id}.tsv"""
+    }
+    // chopped archives are tar (.tar.gz/.tar/.tar.zst, GNU tar detects the compression) or zip
+    def extract = chopped_pdb_tar_file.name.endsWith('.zip') ? "unzip -q ${chopped_pdb_tar_file} -d \"\$pdb\"" : "tar -xf ${chopped_pdb_tar_file} -C \"\$pdb\""
+    def plddt_command = params.plddt_mode == 'store' ? ':' : "python3 fetch_avg_plDDT.py \"\$pdb\" -o domain_avg_plddt.tsv"
+    """
+    pdb=\$(mktemp -d ${extract_root}/domain_analysis_${id}.XXXXXX)
+    trap 'rm -rf "\$pdb"' EXIT
+    ${extract}
+
+    # every analysis reads the same extracted copy; STRIDE gets the task's CPUs, the others one each
+    (
+        ${md5_command}
+    ) &
+    md5_pid=\$!
+    (
+        python3 ${stride_summary_script} -o stride_batch_${id}.summary --pdb_dir "\$pdb" --cpus ${task.cpus} --engine ${params.stride_engine}
+    ) &
+    stride_pid=\$!
+    (
+        ${params.globularity_script} --pdb_dir "\$pdb" --domain_globularity domain_globularity_tmp.tsv
+        dos2unix -n domain_globularity_tmp.tsv domain_globularity.unsorted.tsv || tr -d '\\r' < domain_globularity_tmp.tsv > domain_globularity.unsorted.tsv
+        head -n 1 domain_globularity.unsorted.tsv > domain_globularity.tsv
+        tail -n +2 domain_globularity.unsorted.tsv | sort >> domain_globularity.tsv
+    ) &
+    globularity_pid=\$!
+    (
+        ${plddt_command}
+    ) &
+    plddt_pid=\$!
+
+    # wait for each analysis separately, so any failure fails the task
+    wait \$md5_pid
+    wait \$stride_pid
+    wait \$globularity_pid
+    wait \$plddt_pid
+    """
+}
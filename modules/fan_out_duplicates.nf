@@ -0,0 +1,33 @@
+// Copies the segmentation rows of every representative in a segmentation chunk to its duplicates (see plan_deduplication),
+// so chopping, the consensus collection and the stores see every filtered chain. Emits the same shapes as run_ted_segmentation,
+// plus the chunk's ids including the duplicates.
+process fan_out_duplicates {
+    label 'sge_low'
+    tag "$chunk_id"
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+
+    input:
+    tuple val(chunk_id), path(id_file), val(id_slice), val(zip_name), path(chainsaw), path(merizo), path(unidoc), path(consensus)
+    path duplicates
+
+    output:
+    tuple val(chunk_id), path("fanned/chunk_ids.txt"), val(zip_name), emit: ids
+    tuple val(chunk_id), path("fanned/${chainsaw.name}"), emit: chainsaw
+    tuple val(chunk_id), path("fanned/${merizo.name}"), emit: merizo
+    tuple val(chunk_id), path("fanned/${unidoc.name}"), emit: unidoc
+    tuple val(chunk_id), path("fanned/${consensus.name}"), val(zip_name), emit: consensus
+
+    script:
+    // id_slice = [byte_offset, length] of this chunk in a single-file chunk plan, or [] for a whole chunk file
+    def read_ids = id_slice ? "tail -c +${id_slice[0] + 1} ${id_file} | head -c ${id_slice[1]}" : "cat ${id_file}"
+    """
+    ${read_ids} > chunk_ids.txt
+
+    ${params.dedup_script} fanout \\
+        --duplicates ${duplicates} \\
+        --zip_name ${zip_name} \\
+        --id_file chunk_ids.txt \\
+        --outdir fanned \\
+        ${chainsaw} ${merizo} ${unidoc} ${consensus}
+    """
+}
@@ -1,47 +1,42 @@
-// filter pdb files to only include those with > 25 residues. 10-Feb-26 added sort statement to for loop.
+// filter pdb files to only include single-model, single-chain structures with more than min_residues residues.
+// residue_counts.tsv (id <tab> residues) of the kept chains feeds cost-aware heavy chunking; with params.dedup a third
+// column holds the normalised coordinate hash of each chain, for plan_deduplication.
+// filter_reasons.tsv records the outcome (kept, or why it was skipped) and the counts for every id of the chunk.
+// With params.prescreen_min_mean_plddt / prescreen_min_fraction > 0, mostly disordered chains skip segmentation
+// (reason low_plddt) and no_domains.tsv holds their consensus rows without domains.
 process filter_pdb_from_zip {
     label 'sge_low'
+    tag "$chunk_id"
     container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
 
     input:
-    tuple(val(chunk_id), path(id_file), path(pdb_zip))
+    tuple(val(chunk_id), path(id_file), path(pdb_zip), val(id_slice), path(zip_index))
     val min_residues
 
     output:
-    tuple(val(chunk_id), path('filtered_ids.txt'), val(pdb_zip.name))
+    tuple(val(chunk_id), path('filtered_ids.txt'), val(pdb_zip.name), path('residue_counts.tsv')), emit: filtered
+    tuple val(chunk_id), path('filter_reasons.tsv'), emit: reasons
+    tuple val(chunk_id), path('no_domains.tsv'), emit: no_domains
 
     script:
+    // id_slice = [byte_offset, length] of this chunk in a single-file chunk plan, or [] for a whole chunk file
+    def read_ids = id_slice ? "tail -c +${id_slice[0] + 1} ${id_file} | head -c ${id_slice[1]}" : "cat ${id_file}"
+    def index_arg = zip_index ? "--zip_index ${zip_index}" : ''
     """
-    : > filtered_ids.txt
+    ${read_ids} > chunk_ids.txt
 
-    # Call each chain name in the id_file (e.g. A0A001) chain_id
-    while read -r chain_id; do
-        [ -z "\$chain_id" ] && continue
-        fname="\${chain_id}.pdb"
-        
-        # stream the data from the zip to pdb_wc file rather than unzipping 
-        read model_count chain_count residue_count < <(
-          unzip -p ${pdb_zip} "\$fname" 2>/dev/null | pdb_wc - 2>/dev/null | awk '
-            /^No\\. models:/   {m=\$3}
-            /^No\\. chains:/   {c=\$3}
-            /^No\\. residues:/ {r=\$3}
-            END {if (m=="" || c=="" || r=="") exit 1; print m, c, r} ') || { echo "WARNING: could not parse \$fname"; continue; }
-
-        if [ "\$model_count" -ne 1 ]; then
-            echo "WARNING: skipping \$fname, more than one model."
-            continue
-        fi
-
-        if [ "\$chain_count" -ne 1 ]; then
-            echo "WARNING: skipping \$fname, more than one chain."
-            continue
-        fi
-
-        if [ "\$residue_count" -gt ${min_residues} ]; then
-            echo "\$chain_id" >> filtered_ids.txt
-        else
-            echo "WARNING: Skipping \$fname, less than ${min_residues} residues."
-        fi
-    done < ${id_file}
+    # count models, chains and residues of every member in one pass over the zip (same counts as pdb_wc)
+    ${params.filter_chains_script} \\
+        --pdb_zip ${pdb_zip} ${index_arg} \\
+        --id_file chunk_ids.txt \\
+        --min_residues ${min_residues} \\
+        --filtered_ids filtered_ids.txt \\
+        --residue_counts residue_counts.tsv \\
+        --reasons filter_reasons.tsv \\
+        --min_mean_plddt ${params.prescreen_min_mean_plddt} \\
+        --plddt_cutoff ${params.prescreen_plddt_cutoff} \\
+        --min_fraction_above ${params.prescreen_min_fraction} \\
+        --no_domains no_domains.tsv ${params.dedup ? '--coordinate_hash' : ''} \\
+        --cpus ${task.cpus}
     """
 }
@@ -1,21 +1,28 @@
 process get_uniprot_data {
     label 'sge_low'
+    tag "$id"
     container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}" 
 
     input:
-    tuple(val(id), path(id_file))
+    tuple(val(id), path(id_file), val(id_slice))
 
     output:
     tuple val(id), path("uniprot_data.tsv")
 
     script:
+    // id_slice = [byte_offset, length] of this chunk in a single-file chunk plan, or [] for a whole chunk file
+    def read_ids = id_slice ? "tail -c +${id_slice[0] + 1} ${id_file} | head -c ${id_slice[1]}" : "cat ${id_file}"
     """
-    ${params.fetch_uniprot_script} -i ${id_file} -o uniprot_data.tsv
+    ${read_ids} > chunk_ids.txt
+    ${params.fetch_uniprot_script} -i chunk_ids.txt -o uniprot_data.tsv
     """
     
     stub:
+    // id_slice = [byte_offset, length] of this chunk in a single-file chunk plan, or [] for a whole chunk file
+    def read_ids = id_slice ? "tail -c +${id_slice[0] + 1} ${id_file} | head -c ${id_slice[1]}" : "cat ${id_file}"
     """
+    ${read_ids} > chunk_ids.txt
     echo -e "accession\tproteome_id\ttax_common_name\ttax_scientific_name\ttax_lineage" > uniprot_data.tsv
-    awk '{print \$1 "\tSTUB_PROTEOME\tStub common name\tStub scientific name\tcellular organisms; Stub lineage"}' ${id_file} >> uniprot_data.tsv
+    awk '{print \$1 "\tSTUB_PROTEOME\tStub common name\tStub scientific name\tcellular organisms; Stub lineage"}' chunk_ids.txt >> uniprot_data.tsv
     """
 }
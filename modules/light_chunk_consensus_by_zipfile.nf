@@ -7,21 +7,24 @@ process light_chunk_consensus_by_zip {
     tuple val(parent_chunk_id), path(consensus_file), val(zip_name)
     val  light_chunk_size
     path script
+    path sort_module    // external_sort.py, imported by the script
 
     output:
     tuple val(parent_chunk_id), path("light_chunk_mapping.tsv"), emit: light_chunk_mapping
 
 
     script:
+    def sort_args = params.sort_mode == 'external' ? "--max_memory_mb ${params.sort_memory_mb} --tmp_dir \$PWD/sort_tmp" : ''
     """
     awk -v zip_name="${zip_name}" 'NF { print \$0 "\t" zip_name }' ${consensus_file} > consensus_with_zip.tsv
 
-    mkdir -p light_chunks
+    mkdir -p light_chunks sort_tmp
 
     python3 ${script} \
         --consensus_file consensus_with_zip.tsv \
         --chunk_size ${light_chunk_size} \
         --outdir \$PWD/light_chunks \
-        --file_list light_chunk_mapping.tsv
+        --file_list light_chunk_mapping.tsv ${sort_args}
+    rm -rf sort_tmp
     """
 }
@@ -0,0 +1,33 @@
+// Splits the chains of a segmentation chunk into segmentation cache hits and misses, by the coordinate hash of each chain
+// (see docker/script/segmentation_cache.py). Only the misses are sent to run_ted_segmentation.
+process lookup_segmentation_cache {
+    label 'sge_low'
+    tag "$chunk_id"
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+
+    input:
+    tuple(val(chunk_id), path(id_file), path(pdb_zip), val(id_slice), path(zip_index))
+    path shards, stageAs: 'shards/*'   // cache shards written by earlier runs (immutable)
+    val cache_tag
+
+    output:
+    tuple val(chunk_id), path('misses.txt'), val(pdb_zip.name), emit: misses
+    tuple val(chunk_id), path('hits'), path('keys.tsv'), emit: hits
+
+    script:
+    // id_slice = [byte_offset, length] of this chunk in a single-file chunk plan, or [] for a whole chunk file
+    def read_ids = id_slice ? "tail -c +${id_slice[0] + 1} ${id_file} | head -c ${id_slice[1]}" : "cat ${id_file}"
+    def index_arg = zip_index ? "--zip_index ${zip_index}" : ''
+    def shard_args = shards ? "--shards ${shards.join(' ')}" : ''
+    """
+    ${read_ids} > chunk_ids.txt
+
+    ${params.segmentation_cache_script} lookup \\
+        --pdb_zip ${pdb_zip} ${index_arg} \\
+        --id_file chunk_ids.txt \\
+        --tag '${cache_tag}' ${shard_args} \\
+        --misses misses.txt \\
+        --keys keys.tsv \\
+        --hits_dir hits
+    """
+}
@@ -0,0 +1,31 @@
+// Incremental mode: streams the previous final results (without changed and removed chains) and the final results of
+// the delta into one final_results.tsv sorted by chain id. The delta's own results are kept as final_results.delta.tsv.
+process merge_final_results {
+    label 'sge_low'
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+    publishDir "${params.results_dir}", mode: 'copy'
+
+    input:
+    path previous_results, stageAs: 'previous/final_results.tsv'
+    path delta_results, stageAs: 'delta/final_results.tsv'
+    path delta
+
+    output:
+    path 'final_results.tsv', emit: merged
+    path 'final_results.delta.tsv', emit: delta_results
+
+    script:
+    """
+    mkdir -p sort_tmp
+    cp ${delta_results} final_results.delta.tsv
+
+    ${params.delta_results_script} merge \\
+        --previous ${previous_results} \\
+        --delta_results ${delta_results} \\
+        --delta ${delta} \\
+        --output final_results.tsv \\
+        --max_memory_mb ${params.sort_memory_mb} \\
+        --tmp_dir \$PWD/sort_tmp
+    rm -rf sort_tmp
+    """
+}
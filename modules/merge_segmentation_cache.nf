@@ -0,0 +1,27 @@
+// Merges the cached rows of a chunk's cache hits into the segmentation outputs of its misses (none if every chain was a hit),
+// in sorted order, and writes the new cache entries of the misses. Emits the same shapes as run_ted_segmentation.
+process merge_segmentation_cache {
+    label 'sge_low'
+    tag "$chunk_id"
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+
+    input:
+    tuple val(chunk_id), path(hits), path(keys), val(zip_name), path(segmented, stageAs: 'segmented/*')
+
+    output:
+    tuple val(chunk_id), path('output/chopping_chainsaw_sorted.txt'), emit: chainsaw
+    tuple val(chunk_id), path('output/chopping_merizo_sorted.txt'), emit: merizo
+    tuple val(chunk_id), path('output/chopping_unidoc_sorted.txt'), emit: unidoc
+    tuple val(chunk_id), path('output/consensus_sorted.tsv'), val(zip_name), emit: consensus
+    tuple val(chunk_id), path('new_entries.tsv'), emit: new_entries
+
+    script:
+    def segmented_arg = segmented ? '--segmented_dir segmented' : ''
+    """
+    ${params.segmentation_cache_script} merge \\
+        --hits_dir ${hits} ${segmented_arg} \\
+        --keys ${keys} \\
+        --outdir output \\
+        --new_entries new_entries.tsv
+    """
+}
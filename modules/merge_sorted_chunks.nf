@@ -0,0 +1,93 @@
+// Streaming replacement for toSortedList { it[0] }.flatMap {}.collectFile(...) (params.collect_mode = 'merge').
+// The per-chunk files, each already sorted, are merged with merge_sorted.py in batches of params.merge_batch_size
+// as soon as a batch of chunks is complete (partial), and the partial outputs are merged into the collected file
+// once every chunk is done (collected). Every merge holds one line per open file and reads at most
+// params.merge_max_open_files files at once, so memory and open handles stay bounded for any number of chunks.
+// The collected file is sorted as a whole, rather than concatenated in chunk order.
+
+process merge_sorted_batch {
+    label 'sge_low'
+    tag "${name} ${batch_id}"
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+
+    input:
+    tuple val(name), val(batch_id), path(chunk_files, stageAs: 'chunk_*/*'), val(merge_args)
+    path merge_script
+
+    output:
+    tuple val(name), val(batch_id), path("partial_${batch_id}_${name}")
+
+    script:
+    """
+    mkdir -p merge_tmp
+    python3 ${merge_script} --output partial_${batch_id}_${name} ${merge_args} \\
+        --max_open_files ${params.merge_max_open_files} --tmp_dir merge_tmp ${chunk_files}
+    rm -rf merge_tmp
+    """
+}
+
+process merge_sorted_collect {
+    label 'sge_low'
+    tag "${name}"
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+    publishDir "${publish_dir}", mode: 'copy'
+
+    input:
+    tuple val(name), path(partial_files, stageAs: 'partial_*/*'), val(merge_args), val(publish_dir)
+    path merge_script
+
+    output:
+    tuple val(name), path("${name}")
+
+    script:
+    """
+    mkdir -p merge_tmp
+    printf '%s\\n' partial_*/* > partial_files.txt
+    python3 ${merge_script} --output ${name} ${merge_args} --file_list partial_files.txt \\
+        --max_open_files ${params.merge_max_open_files} --tmp_dir merge_tmp
+    rm -rf merge_tmp
+    """
+}
+
+// Merges the chunks of several collected files at once. The chunks are tagged with the name of their collected file,
+// and every name is batched and collected on its own, as soon as its own chunks are done.
+workflow merge_sorted_chunks {
+    take:
+    chunk_ch        // [name, chunk_id, file], every file sorted
+    outputs         // [name: [merge_args: header and key options of merge_sorted.py, publish_dir: directory the
+                    // collected file is copied to]] for every name in chunk_ch
+
+    main:
+    merge_script = file("${workflow.projectDir}/../docker/script/merge_sorted.py", checkIfExists: true)
+
+    // each batch is tagged with its first chunk id, and its files are passed in chunk order
+    batch_ch = outputs
+        .collect { name, options ->
+            chunk_ch
+                .filter { it[0] == name }
+                .buffer(size: params.merge_batch_size, remainder: true)
+                .map { batch ->
+                    def chunks = batch.sort { a, b -> a[1] <=> b[1] }
+                    tuple(name, chunks[0][1], chunks.collect { it[2] }, options.merge_args)
+                }
+        }
+        .inject { a, b -> a.mix(b) }
+    partial_ch = merge_sorted_batch(batch_ch, merge_script)
+
+    collected_ch = merge_sorted_collect(
+        outputs
+            .collect { name, options ->
+                partial_ch
+                    .filter { it[0] == name }
+                    .map { batch_name, batch_id, partial_file -> partial_file }
+                    .collect()
+                    .map { partial_files -> tuple(name, partial_files, options.merge_args, options.publish_dir) }
+            }
+            .inject { a, b -> a.mix(b) },
+        merge_script,
+    )
+
+    emit:
+    partial = partial_ch        // [name, batch_id, partial file]
+    collected = collected_ch    // [name, collected file]
+}
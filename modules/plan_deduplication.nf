@@ -0,0 +1,26 @@
+// Groups the filtered chains of each zip by their normalised coordinate hash (from filter_pdb_from_zip with params.dedup)
+// and keeps one representative per group for segmentation. dedup_report.tsv summarises the segmentation work saved.
+process plan_deduplication {
+    label 'sge_low'
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+    publishDir "${params.results_dir}/intermediate", mode: 'copy', pattern: '*.tsv'
+
+    input:
+    path filtered_ids
+    val  cost_coefficients
+
+    output:
+    path 'representatives.txt', emit: representatives
+    path 'duplicates.tsv', emit: duplicates
+    path 'dedup_report.tsv', emit: report
+
+    script:
+    """
+    ${params.dedup_script} plan \\
+        --input ${filtered_ids} \\
+        --representatives representatives.txt \\
+        --duplicates duplicates.tsv \\
+        --report dedup_report.tsv \\
+        --cost_coefficients ${cost_coefficients}
+    """
+}
@@ -107,6 +107,7 @@ process prepare_pdb_from_af_bcif {
     input:
     tuple val(chunk_id), path(bcif_zip), path(afdb_ids_file)
   path converter_script
+  path zip_index_module     // zip_index.py, imported by the converter script
 
     output:
     tuple val(chunk_id), path("${chunk_id}.cif_files.zip"), path("${chunk_id}.pdb_files.zip")
@@ -0,0 +1,92 @@
+// Runs a batch of light per-chunk jobs of one task ('md5' as create_md5_batch, or 'plddt' as run_plddt) on
+// chopped archives in one task with chunk_worker.py, instead of a container and interpreter per chunk.
+// Every job writes the file of its per-chunk process into batch/<id>/, so the outputs are unchanged.
+process run_chunk_worker {
+    label 'sge_low'
+    tag "${task_name} x${ids.size()}"
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+
+    input:
+    tuple val(task_name), val(ids), path(chopped_pdb_files)
+
+    output:
+    path "batch/*/*"
+
+    script:
+    def archives = chopped_pdb_files instanceof List ? chopped_pdb_files : [chopped_pdb_files]
+    def jobs = [ids, archives].transpose().collect { id, archive ->
+        groovy.json.JsonOutput.toJson([task: task_name, id: "${id}", archive: archive.name, outdir: "batch/${id}", cpus: task.cpus])
+    }.join('\n')
+    """
+    cat > jobs.jsonl <<'EOF'
+${jobs}
+EOF
+    ${params.chunk_worker_script} --jobs jobs.jsonl
+    """
+}
+
+// Runs filter_pdb_from_zip on a batch of chunks of one input zip in one chunk_worker.py process. The zip, its index
+// and the id files (one chunk plan file with params.chunk_plan) are staged once per batch, and the zip index stays
+// open across the chunks. Every chunk's outputs are written to batch/<chunk id>/ under the names of filter_pdb_from_zip.
+process run_filter_worker {
+    label 'sge_low'
+    tag "${pdb_zip.name} x${chunk_ids.size()}"
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+
+    input:
+    tuple val(chunk_ids), val(id_file_names), path(id_files), val(id_slices), path(pdb_zip), path(zip_index)
+    val min_residues
+
+    output:
+    tuple val(pdb_zip.name), path("batch/*", type: 'dir')
+
+    script:
+    def jobs = [chunk_ids, id_file_names, id_slices].transpose().collect { chunk_id, id_file_name, id_slice ->
+        groovy.json.JsonOutput.toJson([
+            task: 'filter', id: "${chunk_id}", pdb_zip: pdb_zip.name, zip_index: zip_index ? zip_index.name : null,
+            id_file: id_file_name, id_slice: id_slice ?: null, min_residues: min_residues,
+            min_mean_plddt: params.prescreen_min_mean_plddt, plddt_cutoff: params.prescreen_plddt_cutoff,
+            min_fraction_above: params.prescreen_min_fraction, coordinate_hash: params.dedup as boolean,
+            cpus: task.cpus, outdir: "batch/${chunk_id}",
+        ])
+    }.join('\n')
+    """
+    cat > jobs.jsonl <<'EOF'
+${jobs}
+EOF
+    ${params.chunk_worker_script} --jobs jobs.jsonl
+    """
+}
+
+// Runs chop_pdb_from_zip on a batch of light chunks of one input zip in one chunk_worker.py process, reading every
+// chunk's domains through the same open zip index. The consensus files are staged in their own directories, as light
+// chunks of different parent chunks can share a file name. The archives are published as chop_pdb_from_zip does.
+process run_chop_worker {
+    label 'sge_low'
+    tag "${pdb_zip.name} x${ids.size()}"
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+    memory 8.GB
+    publishDir "${params.results_dir}/chopped_pdbs", mode: 'copy', saveAs: { filename -> file(filename).name }
+
+    input:
+    tuple val(ids), path(consensus_chunks, stageAs: 'consensus_*/*'), path(pdb_zip), path(zip_index)
+
+    output:
+    path "batch/*/*_chopped_pdbs.${params.chopped_format}"
+
+    script:
+    def consensus_files = consensus_chunks instanceof List ? consensus_chunks : [consensus_chunks]
+    def jobs = [ids, consensus_files].transpose().collect { id, consensus ->
+        groovy.json.JsonOutput.toJson([
+            task: 'chop', id: "${id}", consensus: "${consensus}", pdb_zip: pdb_zip.name,
+            zip_index: zip_index ? zip_index.name : null, format: params.chopped_format, level: params.chopped_level,
+            threads: task.cpus, outdir: "batch/${id}",
+        ])
+    }.join('\n')
+    """
+    cat > jobs.jsonl <<'EOF'
+${jobs}
+EOF
+    ${params.chunk_worker_script} --jobs jobs.jsonl
+    """
+}
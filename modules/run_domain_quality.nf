@@ -8,10 +8,12 @@ process run_domain_quality {
     output:
     tuple val(id), path("domain_quality.csv")
 
+    // chopped archives are tar (.tar.gz/.tar/.tar.zst, GNU tar detects the compression) or zip
     script:
+    def extract = chopped_pdb_tar_file.name.endsWith('.zip') ? "unzip -q ${chopped_pdb_tar_file} -d pdb" : "tar -xf ${chopped_pdb_tar_file} -C pdb"
     """
     mkdir -p pdb
-    tar -xzf ${chopped_pdb_tar_file} -C pdb
+    ${extract}
     ${params.domain_quality_script_setup}
     ${params.domain_quality_script} -d pdb/ -o domain_quality.unsorted.csv
     perl -i.bak -pe 's/\\r\\n/\\n/g' domain_quality.unsorted.csv
@@ -10,10 +10,12 @@ process run_measure_globularity {
     tuple val(id), path("domain_globularity.tsv") 
 
     // added an intermediate tmp file and dos2unix to recognise end of lines correctly.
+    // chopped archives are tar (.tar.gz/.tar/.tar.zst, GNU tar detects the compression) or zip
     script:
+    def extract = chopped_pdb_tar_file.name.endsWith('.zip') ? "unzip -q ${chopped_pdb_tar_file} -d pdb" : "tar -xf ${chopped_pdb_tar_file} -C pdb"
     """
     mkdir -p pdb
-    tar -xzf ${chopped_pdb_tar_file} -C pdb
+    ${extract}
     ${params.globularity_script} --pdb_dir ./pdb --domain_globularity domain_globularity_tmp.tsv
     dos2unix -n domain_globularity_tmp.tsv domain_globularity.unsorted.tsv || tr -d '\\r' < domain_globularity_tmp.tsv > domain_globularity.unsorted.tsv
     head -n 1 domain_globularity.unsorted.tsv > domain_globularity.tsv
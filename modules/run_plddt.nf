@@ -9,12 +9,9 @@ process run_plddt {
     output:
     tuple val(id), path("domain_avg_plddt.tsv")
 
+    // Members are read straight from the chopped archive (no extraction) and the output is written sorted.
     script:
     """
-    mkdir -p pdb
-    tar -xzf ${chopped_pdb_tar_file} -C pdb
-    ${params.plddt_script} ./pdb -o domain_avg_plddt.unsorted.tsv
-    sort domain_avg_plddt.unsorted.tsv > domain_avg_plddt.tsv
-    rm -rf pdb
+    ${params.plddt_script} ${chopped_pdb_tar_file} -o domain_avg_plddt.tsv
     """
-}
\ No newline at end of file
+}
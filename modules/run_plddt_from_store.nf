@@ -0,0 +1,17 @@
+// Domain pLDDT as a slice-and-mean over the parent chain pLDDT store (no chopped PDB files needed).
+process run_plddt_from_store {
+    label 'sge_low'
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+    publishDir "${params.results_dir}" , mode: 'copy', enabled: params.debug
+
+    input:
+    tuple val(id), path(consensus_chunk), path(plddt_store)
+
+    output:
+    tuple val(id), path("domain_avg_plddt.tsv")
+
+    script:
+    """
+    ${params.plddt_store_script} domains --store ${plddt_store} --consensus ${consensus_chunk} -o domain_avg_plddt.tsv
+    """
+}
@@ -1,37 +1,29 @@
 process run_stride {
     label 'sge_low'
+    tag "$id"
     container "ghcr.io/uclorengogroup/domain-annotation-pipeline-cath-af-cli:${params.container_tag_name}"
     publishDir "${params.results_dir}" , mode: 'copy', enabled: params.debug // only publish if run in debug mode
 
     input:
     tuple val(id), path(chopped_pdb_tar_file)
     path stride_summary_script
+    path stride_engine_modules // secondary_structure.py and pdb_records.py, imported by --engine numpy
 
     output:
     tuple val(id), path("stride_batch_${id}.summary") //path('*.stride')
 
+    // STRIDE is run across a process pool (one worker per task cpu) and each report is parsed from stdout,
+    // so no per-domain .stride files are written. The summary is written already sorted by id.
+    // params.stride_engine = 'numpy' counts secondary structure in-process without calling STRIDE.
+    // chopped archives are tar (.tar.gz/.tar/.tar.zst, GNU tar detects the compression) or zip
     script:
+    def extract = chopped_pdb_tar_file.name.endsWith('.zip') ? "unzip -q ${chopped_pdb_tar_file} -d pdb" : "tar -xf ${chopped_pdb_tar_file} -C pdb"
     """
     mkdir -p pdb
-    tar -xzf ${chopped_pdb_tar_file} -C pdb
-    cd pdb
+    ${extract}
 
-    for f in *.pdb; do
-        stride \$f > "../\${f%.pdb}.stride" 2> "../\${f%.pdb}.stride.err" || { 
-        echo "STRIDE failed on \$f, see ../\${f%.pdb}.stride.err" 
-        continue 
-        }
-    done
-    cd ..
-    
-    python3 ${stride_summary_script} -o stride_batch_${id}.unsorted.summary -d . --suffix .stride
+    python3 ${stride_summary_script} -o stride_batch_${id}.summary --pdb_dir pdb --cpus ${task.cpus} --engine ${params.stride_engine}
 
-    head -n 1 stride_batch_${id}.unsorted.summary > stride_batch_${id}.summary
-    tail -n +2 stride_batch_${id}.unsorted.summary | sort >> stride_batch_${id}.summary
-
-    find . -maxdepth 1 -name '*.stride.err' -size 0 -delete
     rm -rf pdb
-    rm -f *.stride
-    rm -f stride_batch_${id}.unsorted.summary
     """
 }
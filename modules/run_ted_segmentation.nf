@@ -1,9 +1,11 @@
 process run_ted_segmentation {
     label 'sge_gpu_high'
+    tag "$chunk_id"
     container "ghcr.io/uclorengogroup/domain-annotation-pipeline-ted-tools:${params.container_tag_name}"
 
     input:
-    tuple(val(chunk_id), path(filtered_id_file), path(pdb_zip))
+    tuple(val(chunk_id), path(filtered_id_file), path(pdb_zip), val(id_slice), path(zip_index))
+    path zip_index_module     // zip_index.py, run with the ted_consensus environment
 
     output:    
     tuple val(chunk_id), path('output/chopping_chainsaw_sorted.txt'), emit: chainsaw
@@ -13,14 +15,23 @@ process run_ted_segmentation {
     tuple val(chunk_id), path('output/consensus.tsv.changed.txt'), emit: consensus_changed
 
     script:
+    // id_slice = [byte_offset, length] of this chunk in a single-file chunk plan, or [] for a whole chunk file
+    def read_ids = id_slice ? "tail -c +${id_slice[0] + 1} ${filtered_id_file} | head -c ${id_slice[1]}" : "cat ${filtered_id_file}"
+    def extract_pdbs = "xargs -a pdb_list.txt -n 200 unzip -q ${pdb_zip} -d filtered_pdbs"
+    if (zip_index) {
+        extract_pdbs = "python3 ${zip_index_module} extract --zip ${pdb_zip} --index ${zip_index} --id_file chunk_ids.txt --outdir filtered_pdbs --suffix .pdb"
+    }
     """
+    ${read_ids} > chunk_ids.txt
+    ${params.run_segmentation_script_setup}
+
     #-- Extract from zip into filtered_pdbs (same logic as extract_pdb_from_zip but batches of 200 to improve efficiency) --
+    #-- with a sidecar zip index, members are read by direct seek instead (after setup, which provides numpy) --
     mkdir -p filtered_pdbs
-    awk 'NF {print \$0 ".pdb"}' ${filtered_id_file} > pdb_list.txt
-    xargs -a pdb_list.txt -n 200 unzip -q ${pdb_zip} -d filtered_pdbs
+    awk 'NF {print \$0 ".pdb"}' chunk_ids.txt > pdb_list.txt
+    ${extract_pdbs}
 
     # ---------- Run segmentation on filtered set ----------
-    ${params.run_segmentation_script_setup}
     
     which python3
     python3 -c "import torch; print('CUDA available:', torch.cuda.is_available())"
@@ -44,7 +55,10 @@ process run_ted_segmentation {
     """
 
     stub:
+    // id_slice = [byte_offset, length] of this chunk in a single-file chunk plan, or [] for a whole chunk file
+    def read_ids = id_slice ? "tail -c +${id_slice[0] + 1} ${filtered_id_file} | head -c ${id_slice[1]}" : "cat ${filtered_id_file}"
     """
+    ${read_ids} > chunk_ids.txt
     echo "Stub process for run_ted_segmentation"
     mkdir -p output
 
@@ -86,7 +100,7 @@ process run_ted_segmentation {
                 sub(/^[^\\t]+/, synthetic_id, row)
                 print row
             }
-        ' "output/\${f}" "${filtered_id_file}" > "output/\${f}.tmp"
+        ' "output/\${f}" "chunk_ids.txt" > "output/\${f}.tmp"
 
         mv "output/\${f}.tmp" "output/\${f}"
     done
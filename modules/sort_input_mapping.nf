@@ -0,0 +1,28 @@
+// Memory-bounded replacement for the unique/toSortedList/collectFile chain that builds all_ids_mapping.txt
+// (params.sort_mode = 'external'): trimmed id <TAB> zip_name rows, sorted and de-duplicated with spilled runs.
+process sort_input_mapping {
+    label 'sge_low'
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+    storeDir "${params.results_dir}/intermediate"
+
+    input:
+    path input_mapping
+    path script
+
+    output:
+    path "all_ids_mapping.txt"
+
+    script:
+    def head = (params.debug && params.max_entries) ? "--head ${params.max_entries}" : ''
+    """
+    mkdir -p sort_tmp
+    python3 ${script} \\
+        --input ${input_mapping} \\
+        --output all_ids_mapping.txt \\
+        --id_mapping \\
+        --unique \\
+        --max_memory_mb ${params.sort_memory_mb} \\
+        --tmp_dir sort_tmp ${head}
+    rm -rf sort_tmp
+    """
+}
@@ -0,0 +1,28 @@
+// Writes the new segmentation cache entries of this run to its own shard, <session id>.sqlite, in the cache directory.
+// Shards are never changed once written, so a resumed run looks up the same cache as the run it resumes.
+// With compact_shards (every earlier shard, once there are more than params.segmentation_cache_max_shards) their
+// entries are copied into this run's shard too, and <session id>.compacted.txt lists their names; the next run skips
+// and removes them, so lookups stage one shard instead of one per run.
+process update_segmentation_cache {
+    label 'sge_low'
+    container "ghcr.io/uclorengogroup/domain-annotation-pipeline-script:${params.container_tag_name}"
+    publishDir "${params.segmentation_cache_dir}", mode: 'copy'
+
+    input:
+    path entries, stageAs: 'entries/*'
+    val cache_tag
+    path compact_shards, stageAs: 'shards/*'
+
+    output:
+    path "${workflow.sessionId}.sqlite"
+    path "${workflow.sessionId}.compacted.txt", optional: true
+
+    script:
+    def compact_args = compact_shards ? "--compact ${compact_shards.join(' ')} --compacted_list ${workflow.sessionId}.compacted.txt" : ''
+    """
+    ${params.segmentation_cache_script} update \\
+        --tag '${cache_tag}' \\
+        --output ${workflow.sessionId}.sqlite \\
+        entries/* ${compact_args}
+    """
+}
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Recommend chunk sizes from the Nextflow trace of a previous run.
+
+Every chunked process is modelled per task as
+
+    realtime = overhead + per_structure * n        peak_rss = base + per_structure_rss * n
+
+where n is the number of structures in the task's chunk. n is read from the chunk
+manifests (chunk_mapping.tsv files written by chunk_by_zip.py, matched on the task
+tag, which is the chunk id) and otherwise taken to be the nominal chunk size of the
+run. The models are fitted by least squares over all completed tasks of each stage,
+and the largest chunk that keeps every process of a stage under the target task
+duration and memory is recommended:
+
+    chunk_size        <- filter    (filter_pdb_from_zip, get_uniprot_data)
+    heavy_chunk_size  <- segmentation (run_ted_segmentation)
+    light_chunk_size  <- chopping, stride, foldseek
+
+For a structure count (--n_structures, or the ids in --input_mapping) the predicted
+task counts and CPU hours of every stage are reported. With --write the recommended
+sizes are written as a Nextflow config that can be passed with -c.
+
+Usage:
+    python3 scripts/autotune_chunks.py --trace results/trace.txt \\
+        --heavy_manifest work/xx/chunk_mapping.tsv --chunk_size 1000 --heavy_chunk_size 50 \\
+        --light_chunk_size 500 --target_time 2h --target_memory 16GB \\
+        --input_mapping results/intermediate/input_mapping.tsv --write chunk_sizes.config
+"""
+
+import argparse
+import csv
+import math
+import os
+import re
+import statistics
+import sys
+from collections import defaultdict
+
+# stage -> (processes, chunk size parameter)
+STAGES = {
+    "filter": (("filter_pdb_from_zip", "get_uniprot_data"), "chunk_size"),
+    "segmentation": (("run_ted_segmentation",), "heavy_chunk_size"),
+    "chopping": (("chop_pdb_from_zip",), "light_chunk_size"),
+    "stride": (("run_stride",), "light_chunk_size"),
+    "foldseek": (("foldseek_create_db", "foldseek_run_foldseek", "foldseek_run_convertalis"), "light_chunk_size"),
+}
+DONE_STATUSES = ("COMPLETED", "CACHED")
+
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400}
+MEMORY_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+
+
+def parse_duration(text):
+    """Seconds from a trace duration ('1h 2m 3s', '450ms', or raw milliseconds); None for '-'."""
+    text = text.strip()
+    if not text or text == "-":
+        return None
+    if re.fullmatch(r"\d+", text):
+        return int(text) / 1000
+    parts = re.findall(r"([\d.]+)\s*(ms|s|m|h|d)", text)
+    if not parts:
+        raise ValueError(f"Unrecognised duration: {text}")
+    return sum(float(value) * DURATION_UNITS[unit] for value, unit in parts)
+
+
+def parse_memory(text):
+    """Bytes from a trace memory value ('2.3 GB', '512 MB', or raw bytes); None for '-'."""
+    text = text.strip().replace(" ", "").upper()
+    if not text or text == "-":
+        return None
+    if re.fullmatch(r"\d+", text):
+        return int(text)
+    match = re.fullmatch(r"([\d.]+)([KMGT]?B)", text)
+    if not match:
+        raise ValueError(f"Unrecognised memory value: {text}")
+    return float(match.group(1)) * MEMORY_UNITS[match.group(2)]
+
+
+def format_duration(seconds):
+    hours, rest = divmod(int(round(seconds)), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}h {minutes:02d}m {seconds:02d}s"
+
+
+def format_memory(num_bytes):
+    return f"{num_bytes / MEMORY_UNITS['GB']:.2f} GB"
+
+
+def split_task_name(name):
+    """Returns (process, tag) from a trace name such as 'annotate:run_stride (3_1)'."""
+    match = re.fullmatch(r"(.+?)(?: \((.*)\))?", name.strip())
+    process, tag = match.group(1), match.group(2)
+    return process.split(":")[-1], tag
+
+
+def read_trace(trace_files):
+    """Yields (process, tag, realtime seconds, peak_rss bytes, cpus) for every finished task."""
+    for trace_file in trace_files:
+        with open(trace_file) as f:
+            for row in csv.DictReader(f, delimiter="\t"):
+                if row.get("status") not in DONE_STATUSES:
+                    continue
+                realtime = parse_duration(row.get("realtime", "-"))
+                if realtime is None:
+                    continue
+                process, tag = split_task_name(row["name"])
+                peak_rss = parse_memory(row.get("peak_rss", "-"))
+                if row.get("cpus", "-").isdigit():
+                    cpus = int(row["cpus"])
+                else:
+                    # default trace fields have no cpus column; %cpu gives the cores actually used
+                    cpu_percent = row.get("%cpu", "-").rstrip("%")
+                    cpus = max(1.0, float(cpu_percent) / 100) if re.fullmatch(r"[\d.]+", cpu_percent) else 1
+                yield process, tag, realtime, peak_rss, cpus
+
+
+def read_manifest(manifest_files):
+    """Returns {chunk_id: number of ids} from chunk_mapping.tsv files (chunk_id, chunk_file, zip_name)."""
+    sizes = {}
+    for manifest in manifest_files:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest) as f:
+            for row in csv.DictReader(f, delimiter="\t"):
+                chunk_file = row["chunk_file"]
+                if not os.path.exists(chunk_file):
+                    chunk_file = os.path.join(base, "chunks", os.path.basename(chunk_file))
+                with open(chunk_file) as chunk:
+                    sizes[row["chunk_id"]] = sum(1 for line in chunk if line.strip())
+    return sizes
+
+
+def read_zip_counts(input_mapping):
+    """Returns the number of ids per zip from input_mapping.tsv (id, zip_name)."""
+    counts = defaultdict(int)
+    with open(input_mapping) as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) >= 2 and fields[0]:
+                counts[fields[1]] += 1
+    return dict(counts)
+
+
+def fit_linear(xs, ys):
+    """Least squares (intercept, slope) of ys on xs; through the origin when xs do not vary."""
+    if len(set(xs)) > 1:
+        slope, intercept = statistics.linear_regression(xs, ys)
+        if slope > 0 and intercept >= 0:
+            return intercept, slope
+    return 0.0, sum(ys) / sum(xs)
+
+
+def fit_memory(xs, ys):
+    """(base, per structure) of peak memory; constant at the observed peak unless it grows with chunk size."""
+    if not ys:
+        return 0.0, 0.0
+    if len(set(xs)) > 1:
+        slope, intercept = statistics.linear_regression(xs, ys)
+        if slope > 0 and intercept >= 0:
+            return intercept, slope
+    return max(ys), 0.0
+
+
+class ProcessModel:
+    """Per-task time and memory model of one process."""
+
+    def __init__(self, process, tasks):
+        sizes = [n for n, _, _, _ in tasks]
+        self.process = process
+        self.tasks = len(tasks)
+        self.overhead, self.per_structure = fit_linear(sizes, [t for _, t, _, _ in tasks])
+        rss = [(n, m) for n, _, m, _ in tasks if m is not None]
+        self.rss_base, self.rss_per_structure = fit_memory([n for n, _ in rss], [m for _, m in rss])
+        self.max_rss = max((m for _, m in rss), default=0.0)
+        self.cpus = statistics.mean(c for _, _, _, c in tasks)
+
+    def time(self, n):
+        return self.overhead + self.per_structure * n
+
+    def memory(self, n):
+        return self.rss_base + self.rss_per_structure * n
+
+    def max_chunk(self, target_time, target_memory):
+        """Largest chunk that fits the targets (at least 1)."""
+        by_time = (target_time - self.overhead) / self.per_structure if self.per_structure > 0 else math.inf
+        by_memory = (target_memory - self.rss_base) / self.rss_per_structure if self.rss_per_structure > 0 else math.inf
+        return max(1, int(min(by_time, by_memory)))
+
+
+def build_models(trace_files, manifest_sizes, nominal_sizes):
+    """Returns {stage: [ProcessModel, ...]} for every stage seen in the trace."""
+    tasks = defaultdict(list)
+    process_stage = {process: stage for stage, (processes, _) in STAGES.items() for process in processes}
+    for process, tag, realtime, peak_rss, cpus in read_trace(trace_files):
+        stage = process_stage.get(process)
+        if stage is None:
+            continue
+        n = manifest_sizes.get(tag) if stage in ("filter", "segmentation") else None
+        n = n or nominal_sizes[STAGES[stage][1]]
+        tasks[(stage, process)].append((n, realtime, peak_rss, cpus))
+    models = defaultdict(list)
+    for (stage, process), process_tasks in sorted(tasks.items()):
+        models[stage].append(ProcessModel(process, process_tasks))
+    return models
+
+
+def task_count(chunk, n_structures, zip_counts):
+    """Predicted chunks for a chunk size (chunks never span zips)."""
+    if zip_counts:
+        return sum(math.ceil(n / chunk) for n in zip_counts.values())
+    return math.ceil(n_structures / chunk)
+
+
+def recommend(models, target_time, target_memory, current_sizes):
+    """Returns {chunk size parameter: recommended size}."""
+    recommended = {}
+    for stage, stage_models in models.items():
+        param = STAGES[stage][1]
+        size = min(model.max_chunk(target_time, target_memory) for model in stage_models)
+        recommended[param] = min(size, recommended.get(param, size))
+    for param, size in current_sizes.items():
+        recommended.setdefault(param, size)
+    return recommended
+
+
+def write_config(path, sizes):
+    with open(path, "w") as out:
+        out.write("// Chunk sizes recommended by scripts/autotune_chunks.py\n")
+        out.write("params {\n")
+        for param in ("chunk_size", "heavy_chunk_size", "light_chunk_size"):
+            out.write(f"    {param} = {sizes[param]}\n")
+        out.write("}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recommend chunk sizes from a Nextflow trace.")
+    parser.add_argument("--trace", nargs="+", required=True, help="Nextflow trace.txt file(s)")
+    parser.add_argument("--manifest", "--heavy_manifest", dest="manifest", nargs="*", default=[],
+                        help="chunk_mapping.tsv files whose chunk ids match the filter/segmentation task tags")
+    parser.add_argument("--chunk_size", type=int, required=True, help="chunk_size of the traced run")
+    parser.add_argument("--heavy_chunk_size", type=int, required=True, help="heavy_chunk_size of the traced run")
+    parser.add_argument("--light_chunk_size", type=int, required=True, help="light_chunk_size of the traced run")
+    parser.add_argument("--target_time", type=parse_duration, default=parse_duration("1h"),
+                        help="Target task duration (default: 1h)")
+    parser.add_argument("--target_memory", type=parse_memory, default=parse_memory("8GB"),
+                        help="Target task memory (default: 8GB)")
+    parser.add_argument("--n_structures", type=int, default=None, help="Structures in the next run")
+    parser.add_argument("--input_mapping", default=None,
+                        help="input_mapping.tsv of the next run (id, zip_name); gives per-zip task counts")
+    parser.add_argument("--write", default=None, help="Write the recommended sizes as a Nextflow config")
+    args = parser.parse_args()
+
+    current = {
+        "chunk_size": args.chunk_size,
+        "heavy_chunk_size": args.heavy_chunk_size,
+        "light_chunk_size": args.light_chunk_size,
+    }
+    models = build_models(args.trace, read_manifest(args.manifest), current)
+    if not models:
+        sys.exit("No completed tasks of chunked processes found in the trace.")
+
+    sizes = recommend(models, args.target_time, args.target_memory, current)
+    zip_counts = read_zip_counts(args.input_mapping) if args.input_mapping else None
+    n_structures = sum(zip_counts.values()) if zip_counts else args.n_structures
+
+    print(f"Targets: {format_duration(args.target_time)} per task, {format_memory(args.target_memory)} per task")
+    print()
+    print("stage\tprocess\ttasks\toverhead_s\tper_structure_s\tmax_rss\tcpus")
+    for stage, stage_models in models.items():
+        for model in stage_models:
+            print(f"{stage}\t{model.process}\t{model.tasks}\t{model.overhead:.1f}\t{model.per_structure:.3f}\t"
+                  f"{format_memory(model.max_rss)}\t{model.cpus:.1f}")
+    print()
+    print("parameter\tcurrent\trecommended")
+    for param in ("chunk_size", "heavy_chunk_size", "light_chunk_size"):
+        print(f"{param}\t{current[param]}\t{sizes[param]}")
+
+    if n_structures:
+        print()
+        print(f"Predicted for {n_structures} structures:")
+        print("stage\tprocess\ttasks\ttask_time\ttask_memory\tcpu_hours")
+        total = 0.0
+        for stage, stage_models in models.items():
+            chunk = sizes[STAGES[stage][1]]
+            tasks = task_count(chunk, n_structures, zip_counts)
+            for model in stage_models:
+                cpu_hours = tasks * model.time(chunk) * model.cpus / 3600
+                total += cpu_hours
+                print(f"{stage}\t{model.process}\t{tasks}\t{format_duration(model.time(chunk))}\t"
+                      f"{format_memory(model.memory(chunk))}\t{cpu_hours:.1f}")
+        print(f"Total CPU hours: {total:.1f}")
+
+    if args.write:
+        write_config(args.write, sizes)
+        print(f"\nWrote recommended chunk sizes to '{args.write}' (use with -c {args.write})")
+
+
+if __name__ == "__main__":
+    main()
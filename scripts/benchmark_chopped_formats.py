@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark the chopped archive formats (params.chopped_format) on real chopped chunks.
+
+Every input (a chopped archive from results/chopped_pdbs, or a directory of chopped domain
+PDB files) is unpacked once, then packed in each format with docker/script/chopped_archive.py
+as chop_pdb_from_zip does, and read back the two ways the consumers do:
+
+    extract   shell extraction to a directory (`tar -xf` or `unzip -q`): create_md5, run_stride,
+              globularity, quality, foldseek and domain_analysis
+    read      members read in memory with chopped_archive.iter_members: run_plddt and create_md5_batch
+
+Throughput is in MB/s of uncompressed PDB data; each timing is the best of --repeats runs.
+Formats whose tools are missing (e.g. zstd) are skipped with a warning.
+
+Usage:
+    python3 scripts/benchmark_chopped_formats.py results/chopped_pdbs/*_chopped_pdbs.tar.gz \\
+        --threads 4 --repeats 3 --output chopped_formats.tsv
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "docker", "script"))
+
+from chopped_archive import FORMATS, archive_format, iter_members, pack, unpack  # noqa: E402
+
+COLUMNS = ("input", "format", "files", "raw_mb", "archive_mb", "ratio",
+           "pack_s", "pack_mb_s", "extract_s", "extract_mb_s", "read_s", "read_mb_s")
+REQUIRED_TOOLS = {"tar.gz": ("tar", "gzip"), "tar": ("tar",), "tar.zst": ("tar", "zstd"), "zip": ("unzip",)}
+
+
+def best_time(function, repeats):
+    """Returns the shortest wall time of repeats calls of function."""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def extract_command(archive, outdir):
+    """The extraction command of the shell consumers."""
+    if archive.endswith(".zip"):
+        return ["unzip", "-q", "-o", archive, "-d", outdir]
+    return ["tar", "-xf", archive, "-C", outdir]
+
+
+def benchmark(source_dir, label, formats, workdir, threads, level, repeats):
+    """Yields one result row per format for a directory of chopped PDB files."""
+    names = [name for name in os.listdir(source_dir) if os.path.isfile(os.path.join(source_dir, name))]
+    raw_mb = sum(os.path.getsize(os.path.join(source_dir, name)) for name in names) / 1e6
+
+    for fmt in formats:
+        archive = os.path.join(workdir, f"bench.{fmt}")
+        pack_s = best_time(lambda: pack(source_dir, archive, threads, level), repeats)
+
+        def extract():
+            outdir = os.path.join(workdir, "extract")
+            shutil.rmtree(outdir, ignore_errors=True)
+            os.makedirs(outdir)
+            subprocess.run(extract_command(archive, outdir), check=True)
+
+        def read():
+            for _ in iter_members(archive):
+                pass
+
+        extract_s = best_time(extract, repeats)
+        read_s = best_time(read, repeats)
+        archive_mb = os.path.getsize(archive) / 1e6
+        yield (label, fmt, len(names), f"{raw_mb:.2f}", f"{archive_mb:.2f}", f"{raw_mb / archive_mb:.2f}",
+               f"{pack_s:.3f}", f"{raw_mb / pack_s:.1f}", f"{extract_s:.3f}", f"{raw_mb / extract_s:.1f}",
+               f"{read_s:.3f}", f"{raw_mb / read_s:.1f}")
+        os.remove(archive)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chopped archive formats on chopped chunks.")
+    parser.add_argument("inputs", nargs="+", help="Chopped archives or directories of chopped PDB files")
+    parser.add_argument("--formats", default=",".join(FORMATS),
+                        help=f"Comma-separated formats to benchmark (default: {','.join(FORMATS)})")
+    parser.add_argument("--threads", type=int, default=1, help="zstd compression threads (default: 1)")
+    parser.add_argument("--level", type=int, default=None, help="Compression level (default: format default)")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per timing, best is kept (default: 3)")
+    parser.add_argument("--tmp_dir", default=None, help="Working directory (default: system temp)")
+    parser.add_argument("--output", default=None, help="Output TSV (default: stdout)")
+    args = parser.parse_args()
+
+    formats = []
+    for fmt in (f.strip() for f in args.formats.split(",") if f.strip()):
+        if fmt not in FORMATS:
+            parser.error(f"Unknown format {fmt!r} (expected one of {', '.join(FORMATS)})")
+        missing = [tool for tool in REQUIRED_TOOLS[fmt] if shutil.which(tool) is None]
+        if missing:
+            print(f"WARNING: skipping {fmt}, {' and '.join(missing)} not found", file=sys.stderr)
+            continue
+        formats.append(fmt)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    out.write("\t".join(COLUMNS) + "\n")
+    for source in args.inputs:
+        with tempfile.TemporaryDirectory(dir=args.tmp_dir) as workdir:
+            if os.path.isdir(source):
+                source_dir = source
+            elif archive_format(source):
+                source_dir = os.path.join(workdir, "source")
+                unpack(source, source_dir)
+            else:
+                parser.error(f"Not a chopped archive or directory: {source}")
+            for row in benchmark(source_dir, os.path.basename(source.rstrip("/")), formats, workdir,
+                                 args.threads, args.level, args.repeats):
+                out.write("\t".join(str(value) for value in row) + "\n")
+                out.flush()
+    if args.output:
+        out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark PDB parsing: pdb_records.parse_atoms against Biopython and gemmi.
+
+Every PDB file of the inputs (directories, chopped archives or zips of PDB files) is read into
+memory first, then parsed by each parser from the same bytes, so only parsing is timed:
+
+    numpy      pdb_records.parse_atoms (fixed-column vectorised parsing into a structured array)
+    biopython  Bio.PDB.PDBParser(QUIET=True).get_structure
+    gemmi      gemmi.read_pdb_string
+
+With --task ca_plddt each parser also computes the mean CA pLDDT of every file, as
+fetch_avg_plDDT.py does. The atom counts of all parsers are checked to agree. Each timing is
+the best of --repeats runs; parsers that are not installed are skipped with a warning.
+
+Usage:
+    python3 scripts/benchmark_pdb_parsing.py pdbs/results results/chopped_pdbs/chunk_1_chopped_pdbs.tar.gz \\
+        --repeats 3 --task ca_plddt
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "docker", "script"))
+
+from fetch_avg_plDDT import iter_pdb_files  # noqa: E402
+from pdb_records import ca_atoms, parse_atoms  # noqa: E402
+
+COLUMNS = ("parser", "task", "files", "atoms", "seconds", "files_per_s", "atoms_per_s", "speedup_vs_biopython")
+TASKS = ("parse", "ca_plddt")
+
+
+def numpy_parser(task):
+    def run(data):
+        atoms = parse_atoms(data)
+        if task == "ca_plddt":
+            ca = ca_atoms(atoms)
+            return atoms.size, float(ca["b_factor"].mean()) if ca.size else None
+        return atoms.size, None
+    return run
+
+
+def biopython_parser(task):
+    from Bio.PDB import PDBParser
+
+    parser = PDBParser(QUIET=True)
+
+    def run(data):
+        structure = parser.get_structure("x", io.StringIO(data.decode()))
+        atoms = list(structure.get_atoms())
+        if task == "ca_plddt":
+            plddt = [atom.get_bfactor() for atom in atoms if atom.get_id() == "CA"]
+            return len(atoms), sum(plddt) / len(plddt) if plddt else None
+        return len(atoms), None
+    return run
+
+
+def gemmi_parser(task):
+    import gemmi
+
+    def run(data):
+        structure = gemmi.read_pdb_string(data.decode())
+        count, plddt = 0, []
+        for chain in structure[0]:
+            for residue in chain:
+                count += len(residue)
+                if task == "ca_plddt":
+                    plddt.extend(atom.b_iso for atom in residue if atom.name == "CA")
+        return count, sum(plddt) / len(plddt) if plddt else None
+    return run
+
+
+PARSERS = {"numpy": numpy_parser, "biopython": biopython_parser, "gemmi": gemmi_parser}
+
+
+def time_parser(run, files, repeats):
+    """Returns (best seconds over repeats, [result per file])."""
+    best, results = None, None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        results = [run(data) for data in files]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDB parsing against Biopython and gemmi.")
+    parser.add_argument("inputs", nargs="+", help="Directories, chopped archives or zips of PDB files")
+    parser.add_argument("--parsers", default=",".join(PARSERS),
+                        help=f"Comma-separated parsers (default: {','.join(PARSERS)})")
+    parser.add_argument("--task", choices=TASKS, default="parse",
+                        help="parse: parse only; ca_plddt: also the mean CA pLDDT (default: parse)")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per parser, best is kept (default: 3)")
+    parser.add_argument("--max_files", type=int, default=None, help="Use at most this many files")
+    args = parser.parse_args()
+
+    files = [data for source in args.inputs for _, data in iter_pdb_files(source)][:args.max_files]
+    if not files:
+        parser.error("No PDB files found in the inputs")
+
+    timings, reference = {}, None
+    for name in (p.strip() for p in args.parsers.split(",") if p.strip()):
+        if name not in PARSERS:
+            parser.error(f"Unknown parser {name!r} (expected one of {', '.join(PARSERS)})")
+        try:
+            run = PARSERS[name](args.task)
+        except ImportError as e:
+            print(f"WARNING: skipping {name}: {e}", file=sys.stderr)
+            continue
+        seconds, results = time_parser(run, files, args.repeats)
+        counts = [count for count, _ in results]
+        if reference is None:
+            reference = (name, counts)
+        elif counts != reference[1]:
+            print(f"WARNING: atom counts of {name} differ from {reference[0]}", file=sys.stderr)
+        timings[name] = (seconds, sum(counts))
+
+    print("\t".join(COLUMNS))
+    baseline = timings.get("biopython", (None,))[0]
+    for name, (seconds, atoms) in timings.items():
+        speedup = f"{baseline / seconds:.1f}" if baseline else "NA"
+        print(f"{name}\t{args.task}\t{len(files)}\t{atoms}\t{seconds:.3f}\t{len(files) / seconds:.1f}\t"
+              f"{atoms / seconds:.0f}\t{speedup}")
+
+
+if __name__ == "__main__":
+    main()
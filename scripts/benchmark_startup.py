@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Check the cold-start cost of the per-chunk Python scripts against an import-time budget.
+
+Every script is started with `python -X importtime <script> --help`, which imports everything
+the script imports at module level and exits before doing any work. The import time is the
+sum of the cumulative times of the top-level imports reported by -X importtime (interpreter
+start-up imports included); the wall time of the whole process is reported alongside. Each
+figure is the best of --repeats runs.
+
+The heaviest top-level imports of every script are listed, and the exit status is 1 if any
+script's import time exceeds --budget_ms (or its wall time exceeds --wall_budget_ms), so the
+benchmark can guard against a heavy import (pandas, Biopython, gemmi, requests) creeping back
+into a script that only needs csv.
+
+Usage:
+    python3 scripts/benchmark_startup.py --budget_ms 150 --repeats 5
+    python3 scripts/benchmark_startup.py docker/script/filter_chains.py --budget_ms 400
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+SCRIPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "docker", "script")
+DEFAULT_SCRIPTS = (
+    "convert_merizo_unidoc_files.py",
+    "combine_results.py",
+    "transform_consensus.py",
+    "fetch_uniprot_data.py",
+)
+COLUMNS = ("script", "import_ms", "wall_ms", "budget_ms", "status", "heaviest_imports")
+# import time: <self us> | <cumulative us> | <nesting indent><module>
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)\s*$")
+
+
+def parse_importtime(stderr):
+    """Returns {top-level module: cumulative import time in ms} from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        # Top-level imports are indented by the single space after the separator
+        if match and len(match.group(3)) == 1:
+            modules[match.group(4)] = int(match.group(2)) / 1000
+    return modules
+
+
+def measure(script, script_args, repeats):
+    """Returns (best import ms, best wall ms, {module: ms} of the fastest import) of starting a script."""
+    script = os.path.abspath(script)
+    best_import, best_wall = None, None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", script] + script_args,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, cwd=os.path.dirname(script),
+        )
+        wall_ms = (time.perf_counter() - start) * 1000
+        if process.returncode != 0:
+            errors = [line for line in process.stderr.splitlines() if not line.startswith("import time:")]
+            raise RuntimeError(f"exited with status {process.returncode}: {' '.join(errors[-1:])}")
+        modules = parse_importtime(process.stderr)
+        if best_import is None or sum(modules.values()) < sum(best_import.values()):
+            best_import = modules
+        best_wall = wall_ms if best_wall is None else min(best_wall, wall_ms)
+    return sum(best_import.values()), best_wall, best_import
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of the per-chunk scripts against a budget.")
+    parser.add_argument("scripts", nargs="*",
+                        help=f"Scripts to start (default: {', '.join(DEFAULT_SCRIPTS)} in docker/script)")
+    parser.add_argument("--budget_ms", type=float, default=150,
+                        help="Maximum import time of a script in ms (default: 150)")
+    parser.add_argument("--wall_budget_ms", type=float, default=None,
+                        help="Maximum wall time of a script start in ms (default: not checked)")
+    parser.add_argument("--args", default="--help",
+                        help="Arguments passed to every script (default: --help)")
+    parser.add_argument("--repeats", type=int, default=3, help="Starts per script, best is kept (default: 3)")
+    parser.add_argument("--top", type=int, default=3, help="Heaviest top-level imports listed (default: 3)")
+    args = parser.parse_args()
+
+    scripts = args.scripts or [os.path.join(SCRIPT_DIR, name) for name in DEFAULT_SCRIPTS]
+    failed = []
+    print("\t".join(COLUMNS))
+    for script in scripts:
+        name = os.path.basename(script)
+        try:
+            import_ms, wall_ms, modules = measure(script, args.args.split(), args.repeats)
+        except RuntimeError as e:
+            print(f"{name}\tNA\tNA\t{args.budget_ms:.0f}\tERROR\t{e}")
+            failed.append(name)
+            continue
+        over = import_ms > args.budget_ms or (args.wall_budget_ms is not None and wall_ms > args.wall_budget_ms)
+        if over:
+            failed.append(name)
+        heaviest = sorted(modules.items(), key=lambda item: -item[1])[:args.top]
+        print(f"{name}\t{import_ms:.1f}\t{wall_ms:.1f}\t{args.budget_ms:.0f}\t{'OVER' if over else 'OK'}\t"
+              + ",".join(f"{module}:{ms:.1f}" for module, ms in heaviest))
+
+    if failed:
+        print(f"Over the start-up budget: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+#!/bin/bash
+# Compares the NumPy secondary structure engine with STRIDE on the fixture PDBs and writes
+# the agreement report (per-column agreement, then per-id counts from both engines).
+#
+# Needs stride on PATH, so run it in the cath-af-cli image from the repository root:
+#   docker build -t cath-af-cli docker/cath-af-cli
+#   docker run --rm -v "$PWD":/work -w /work cath-af-cli bash scripts/stride_agreement.sh
+
+set -euo pipefail
+
+FIXTURE_ZIP=${1:-assets/test_ids/30-ted-ids.zip}
+OUTPUT=${2:-assets/test_ids/ss_agreement.tsv}
+SCRIPT_DIR=docker/script
+
+WORK_DIR=$(mktemp -d)
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+python3 -c "import zipfile, sys; zipfile.ZipFile(sys.argv[1]).extractall(sys.argv[2])" "$FIXTURE_ZIP" "$WORK_DIR/pdb"
+
+python3 "$SCRIPT_DIR/create_stride_summary.py" -o "$WORK_DIR/stride_summary.tsv" \
+    --pdb_dir "$WORK_DIR/pdb" --engine stride
+python3 "$SCRIPT_DIR/secondary_structure.py" --pdb_dir "$WORK_DIR/pdb" -o "$WORK_DIR/numpy_summary.tsv" \
+    --stride_summary "$WORK_DIR/stride_summary.tsv" --agreement "$OUTPUT"
+
+echo "Wrote $OUTPUT"
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Entry point for docker/script/run_local.py from the repository root.
+
+The pipeline scripts are copied flat into /app in the script image and import each other
+as top-level modules, so this puts docker/script on the path and runs run_local.main.
+
+Usage:
+    python3 -m tools.run_local --pdb_zip proteome.zip --output_dir results_local ...
+"""
+
+import os
+import sys
+
+SCRIPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "docker", "script")
+
+
+def main():
+    sys.path.insert(0, os.path.abspath(SCRIPT_DIR))
+    import run_local
+
+    run_local.main()
+
+
+if __name__ == "__main__":
+    main()
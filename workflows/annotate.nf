@@ -31,8 +31,17 @@ include { create_input_from_zip } from '../modules/create_input_from_zip.nf'
 include { chunk_ids_by_zip as chunk_by_zip        } from '../modules/chunk_by_zipfile.nf'
 include { chunk_ids_by_zip as heavy_chunk_by_zip  } from '../modules/chunk_by_zipfile.nf'
 include { light_chunk_consensus_by_zip } from '../modules/light_chunk_consensus_by_zipfile.nf'
+include { sort_input_mapping } from '../modules/sort_input_mapping.nf'
+include { build_zip_index } from '../modules/build_zip_index.nf'
+include { plan_deduplication } from '../modules/plan_deduplication.nf'
+include { fan_out_duplicates } from '../modules/fan_out_duplicates.nf'
 // Domain prediction modules
 include { run_ted_segmentation } from '../modules/run_ted_segmentation.nf'
+include { run_ted_segmentation as run_ted_segmentation_giant } from '../modules/run_ted_segmentation.nf'
+include { lookup_segmentation_cache } from '../modules/lookup_segmentation_cache.nf'
+include { lookup_segmentation_cache as lookup_segmentation_cache_giant } from '../modules/lookup_segmentation_cache.nf'
+include { merge_segmentation_cache } from '../modules/merge_segmentation_cache.nf'
+include { update_segmentation_cache } from '../modules/update_segmentation_cache.nf'
 
 // Filtering and consensus modules - these are all unused as ted_segmentation takes care of all of this funtionality.
 //include { run_filter_domains } from '../modules/run_filter_domains.nf'
@@ -47,7 +56,13 @@ include { run_ted_segmentation } from '../modules/run_ted_segmentation.nf'
 //include { chop_pdb } from '../modules/chop_pdb.nf'
 include { chop_pdb_from_zip } from '../modules/chop_pdb_from_zip.nf'
 include { create_md5 } from '../modules/create_domain_md5.nf'
+include { create_md5_batch } from '../modules/create_domain_md5_batch.nf'
+include { run_chunk_worker as run_md5_worker; run_chunk_worker as run_plddt_worker } from '../modules/run_chunk_worker.nf'
+include { run_filter_worker; run_chop_worker } from '../modules/run_chunk_worker.nf'
+include { build_sequence_store } from '../modules/build_sequence_store.nf'
+include { create_md5_from_store } from '../modules/create_domain_md5_from_store.nf'
 include { run_stride } from '../modules/run_stride.nf'
+include { domain_analysis } from '../modules/domain_analysis.nf'
 //include { summarise_stride } from '../modules/summarise_stride.nf'
 include { transform_consensus } from '../modules/transform.nf'
 
@@ -55,11 +70,16 @@ include { transform_consensus } from '../modules/transform.nf'
 include { run_domain_quality } from '../modules/run_domain_quality.nf'
 include { run_measure_globularity } from '../modules/run_measure_globularity.nf'
 include { run_plddt } from '../modules/run_plddt.nf'
+include { build_plddt_store } from '../modules/build_plddt_store.nf'
+include { run_plddt_from_store } from '../modules/run_plddt_from_store.nf'
 include { join_plddt_md5 } from '../modules/join_plddt_md5.nf'
 
 // Final collection modules
 include { collect_results } from '../modules/collect_results_combine_chopping.nf'
 include { collect_results_final } from '../modules/collect_results_add_metadata.nf'
+include { compute_delta } from '../modules/compute_delta.nf'
+include { merge_final_results } from '../modules/merge_final_results.nf'
+include { merge_sorted_chunks } from '../modules/merge_sorted_chunks.nf'
 //include { run_AF_domain_id } from '../modules/run_create_AF_domain_id.nf'
 
 // Foldseek modules
@@ -92,6 +112,30 @@ def validateParameters() {
         error("--input_zip_dir must be specified.")
     }
 
+    if (!(params.chopped_format in ['tar.gz', 'tar', 'tar.zst', 'zip'])) {
+        error("--chopped_format must be one of tar.gz, tar, tar.zst or zip (got: ${params.chopped_format})")
+    }
+
+    if (!(params.worker_batch_size instanceof Integer) || params.worker_batch_size < 0) {
+        error("--worker_batch_size must be 0 (off) or a positive integer (got: ${params.worker_batch_size})")
+    }
+
+    if (!(params.segmentation_cache_max_shards instanceof Integer) || params.segmentation_cache_max_shards < 0) {
+        error("--segmentation_cache_max_shards must be 0 (never compact) or a positive integer (got: ${params.segmentation_cache_max_shards})")
+    }
+
+    if (!(params.collect_mode in ['sorted_list', 'merge'])) {
+        error("--collect_mode must be 'sorted_list' or 'merge' (got: ${params.collect_mode})")
+    }
+
+    if (!(params.merge_batch_size instanceof Integer) || params.merge_batch_size < 1) {
+        error("--merge_batch_size must be a positive integer (got: ${params.merge_batch_size})")
+    }
+
+    if (!(params.merge_max_open_files instanceof Integer) || params.merge_max_open_files < 2) {
+        error("--merge_max_open_files must be an integer of at least 2 (got: ${params.merge_max_open_files})")
+    }
+
     // Ensure results directory exists
     if (!file(params.results_dir).exists()) {
         file(params.results_dir).mkdirs()
@@ -135,7 +179,19 @@ def validateParameters() {
     Main chunk size     : ${params.chunk_size}
     Light chunk size    : ${params.light_chunk_size}
     Heavy chunk size    : ${params.heavy_chunk_size}
+    Chunk cost model    : ${params.chunk_cost_model}
+    Giant residues      : ${params.giant_residues ?: 'off'}
+    Sort mode           : ${params.sort_mode}
+    Chunk plan          : ${params.chunk_plan ? 'single file' : 'file per chunk'}
+    Zip index           : ${params.zip_index}
     Min chain residues  : ${params.min_chain_residues}
+    STRIDE engine       : ${params.stride_engine}
+    pLDDT mode          : ${params.plddt_mode}
+    MD5 engine          : ${params.md5_engine}
+    Domain analysis     : ${params.domain_analysis}
+    Chopped format      : ${params.chopped_format}
+    Worker batch size   : ${params.worker_batch_size ?: 'off'}
+    Collect mode        : ${params.collect_mode == 'merge' ? "merge (batches of ${params.merge_batch_size})" : params.collect_mode}
     Max entries (debug) : ${params.max_entries ?: 'N/A'}
     Results dir         : ${params.results_dir}
     Debug mode          : ${params.debug}
@@ -151,6 +207,11 @@ def validateParameters() {
     )
 }
 
+// [byte_offset, length] of a chunk inside chunk_plan.ids (params.chunk_plan), or [] when the chunk has its own file
+def planSlice(row) {
+    row.byte_offset ? [row.byte_offset as long, row.length as long] : []
+}
+
 // ===============================================
 // MAIN WORKFLOW
 // ===============================================
@@ -189,37 +250,64 @@ workflow {
     // A TSV file (two columns: id <TAB> zip_name) may be specified at runtime with param --uniprot_tsv_file to list ids and zip names.
     if (params.uniprot_tsv_file) {
         input_mapping_ch = Channel.fromPath(params.uniprot_tsv_file, checkIfExists: true)
+        input_manifest_ch = input_mapping_ch
     } else {
     // If not, create the ids and zip file channel directly from the zips in --input_zip_dir (mandatory runtime input).
-        input_mapping_ch = create_input_from_zip(file(params.input_zip_dir), file(params.create_input_from_zip_script))
-    }
-    // zip_id_ch splits the mapping file into [id, zip_name] tuples for downstream processing
-    zip_id_ch = input_mapping_ch                                    // Create a channel from the input
-        .splitCsv(sep: '\t')                                        // Split into individual values by row
-        .map { row -> tuple(row[0].trim(), row[1].trim()) }         // Assign the id from col 1 and the zip file from col 2
-        .filter { id, zip_name -> id != '' && zip_name != '' }      // Filter blank id rows
-        .unique()                                                   // Remove duplicates
-        .toSortedList { a, b -> a[0] <=> b[0] }                     // Sort by id for deterministic order
-        .flatMap { it }                                             // Flatten into a list to stream into the channel
-    // Resultant zip_id_ch is [id, zip_name]
-    
-    // Apply debug limit if enabled
-    if (params.debug && params.max_entries) {
-        zip_id_ch = zip_id_ch.take(params.max_entries)
+        // Per-zip manifests are cached in manifest_cache_dir, so only new or changed zips are read again.
+        def manifest_cache = file(params.manifest_cache_dir ?: "${params.results_dir}/intermediate/manifest_cache")
+        manifest_cache.mkdirs()
+        manifest_modules = files("${workflow.projectDir}/../docker/script/{zip_index,pdb_records}.py", checkIfExists: true)
+        input_ch = create_input_from_zip(file(params.input_zip_dir), file(params.create_input_from_zip_script), manifest_modules, manifest_cache)
+        input_mapping_ch = input_ch.mapping
+        input_manifest_ch = input_ch.manifest
     }
 
-    // Now create a file called all_ids_mapping.txt which contains two columns: [id, zip_name].
-    all_ids_mapping_ch = zip_id_ch
-        .map { id, zip -> "${id}\t${zip}" }
-        .collectFile(
-            name: 'all_ids_mapping.txt',
-            newLine: true,
-            sort: true,
-            storeDir: "${params.results_dir}/intermediate"
+    // Incremental mode: only ids that are new or whose structure changed since the previous run go through the pipeline,
+    // and their final results are merged into the previous final_results.tsv at the end (see merge_final_results).
+    if (params.previous_results) {
+        delta_ch = compute_delta(
+            input_manifest_ch,
+            file(params.previous_results, checkIfExists: true),
+            params.previous_index ? file(params.previous_index, checkIfExists: true) : [],
         )
+        input_mapping_ch = delta_ch.mapping
+    }
+    // Script imported by chunk_by_zip.py and chunk_consensus_by_zip.py, and run on its own in external sort mode
+    external_sort_script = file("${workflow.projectDir}/../docker/script/external_sort.py", checkIfExists: true)
+
+    if (params.sort_mode == 'external') {
+        // Sort and de-duplicate the mapping with spilled runs instead of holding every id in toSortedList.
+        all_ids_mapping_ch = sort_input_mapping(input_mapping_ch, external_sort_script)
+    } else {
+        // zip_id_ch splits the mapping file into [id, zip_name] tuples for downstream processing
+        zip_id_ch = input_mapping_ch                                    // Create a channel from the input
+            .splitCsv(sep: '\t')                                        // Split into individual values by row
+            .map { row -> tuple(row[0].trim(), row[1].trim()) }         // Assign the id from col 1 and the zip file from col 2
+            .filter { id, zip_name -> id != '' && zip_name != '' }      // Filter blank id rows
+            .unique()                                                   // Remove duplicates
+            .toSortedList { a, b -> a[0] <=> b[0] }                     // Sort by id for deterministic order
+            .flatMap { it }                                             // Flatten into a list to stream into the channel
+        // Resultant zip_id_ch is [id, zip_name]
+    
+        // Apply debug limit if enabled
+        if (params.debug && params.max_entries) {
+            zip_id_ch = zip_id_ch.take(params.max_entries)
+        }
+
+        // Now create a file called all_ids_mapping.txt which contains two columns: [id, zip_name].
+        all_ids_mapping_ch = zip_id_ch
+            .map { id, zip -> "${id}\t${zip}" }
+            .collectFile(
+                name: 'all_ids_mapping.txt',
+                newLine: true,
+                sort: true,
+                storeDir: "${params.results_dir}/intermediate"
+            )
+    }
     
     // chunk_ids_by_zip splits all_ids_mapping.txt into chunk_size chunks within zips, assigning a 3-part tuple [chunk_id, chunk_file, zip_name].
-    zip_chunks = chunk_by_zip(all_ids_mapping_ch, params.chunk_size, file(params.chunk_by_zip_script))
+    // With params.chunk_plan every chunk_file is the same chunk_plan.ids and each row also carries byte_offset and length.
+    zip_chunks = chunk_by_zip(all_ids_mapping_ch, params.chunk_size, file(params.chunk_by_zip_script), external_sort_script, params.chunk_cost_model, params.chunk_cost_coefficients, 0, 1)
 
     // Recreate the original chunked_ids_mapping_ch from the 3-part tuple output of chunk_by_zip. This feeds filter_pdb_from_zip.
     chunked_ids_mapping_ch = zip_chunks.chunk_mapping
@@ -228,26 +316,39 @@ workflow {
         tuple(
             row.chunk_id as int,
             file(row.chunk_file),
-            file("${params.input_zip_dir}/${row.zip_name}")
+            file("${params.input_zip_dir}/${row.zip_name}"),
+            planSlice(row)
         )
     }
-    // As a branch channel, create a 2-part tuple channel [chunk_id, chunk_file] just for get_uniprot_data
+    // As a branch channel, create a 3-part tuple channel [chunk_id, chunk_file, id_slice] just for get_uniprot_data
     chunked_tax_ids_ch = chunked_ids_mapping_ch
-        .map { chunk_id, id_file, zip_name ->
-        tuple(chunk_id, id_file) }
+        .map { chunk_id, id_file, zip_name, id_slice ->
+        tuple(chunk_id, id_file, id_slice) }
+
+    // With params.zip_index the central directory of each input zip is indexed once (storeDir, keyed by the zip's
+    // size and modification time), and every task that reads members from a zip gets that index as an extra path
+    // input. Otherwise the extra input is [].
+    zip_index_module = file("${workflow.projectDir}/../docker/script/zip_index.py", checkIfExists: true)
+    if (params.zip_index) {
+        zip_index_ch = build_zip_index(
+            chunked_ids_mapping_ch
+                .map { it[2] }
+                .unique()
+                .map { pdb_zip -> tuple(pdb_zip, "${pdb_zip.size()}_${pdb_zip.lastModified()}") }
+        )
+    }
+    def withZipIndex = { ch ->
+        if (!params.zip_index) {
+            return ch.map { t -> t + [[]] }
+        }
+        // key each tuple by the name of its zip (always the third element) to pick up that zip's index
+        ch.map { t -> [t[2].name] + t }
+            .combine(zip_index_ch, by: 0)
+            .map { t -> t[1..-1] }
+    }
 
-    // Get taxonomic data using the new chunked_tax_ids_ch which only has [chunk_id, chunk_file]
+    // Get taxonomic data using the new chunked_tax_ids_ch which only has [chunk_id, chunk_file, id_slice]
     uniprot_data_ch = get_uniprot_data(chunked_tax_ids_ch)
-    collected_taxonomy_ch = uniprot_data_ch
-        .toSortedList { it -> it[0] }
-        .flatMap{ it }
-        .collectFile(
-            name: 'all_taxonomy.tsv',
-            keepHeader: true,
-            skip: 1,
-            sort: false,
-            storeDir: params.results_dir,
-        ) { it[1] }
     
     // Determine which ZIP archive downstream should use.
     // If cif_mode is enabled, first convert the input CIF.GZ ZIP to a PDB ZIP. If not continue with PDB ZIP file.
@@ -260,19 +361,43 @@ workflow {
     //    pdb_zip_ch = input_zip_ch
     //}
     // Run filter_pdb_from_zip on the 3-part tuple chunked data channel (creates filtered lists) - removed pdb_zip_ch.
-    filtered_ids_ch = filter_pdb_from_zip(chunked_ids_mapping_ch, params.min_chain_residues)
+    if (params.worker_batch_size) {
+        // Chunks of the same zip are filtered in batches of params.worker_batch_size by one chunk_worker.py process,
+        // which stages the zip, its index and the id files once; the outputs are split back into per-chunk tuples.
+        filter_batches_ch = withZipIndex(chunked_ids_mapping_ch)
+            .map { chunk_id, id_file, pdb_zip, id_slice, zip_index -> tuple(pdb_zip.name, chunk_id, id_file, id_slice, pdb_zip, zip_index) }
+            .groupTuple(by: 0, size: params.worker_batch_size, remainder: true)
+            .map { zip_name, chunk_ids, id_files, id_slices, pdb_zips, zip_indexes ->
+                tuple(chunk_ids, id_files.collect { it.name }, id_files.unique(), id_slices, pdb_zips[0], zip_indexes[0])
+            }
+        filter_dirs_ch = run_filter_worker(filter_batches_ch, params.min_chain_residues)
+            .flatMap { zip_name, dirs -> (dirs instanceof List ? dirs : [dirs]).collect { dir -> tuple(dir.name as int, dir, zip_name) } }
+        filter_ch = [
+            filtered  : filter_dirs_ch.map { chunk_id, dir, zip_name -> tuple(chunk_id, dir.resolve('filtered_ids.txt'), zip_name, dir.resolve('residue_counts.tsv')) },
+            reasons   : filter_dirs_ch.map { chunk_id, dir, zip_name -> tuple(chunk_id, dir.resolve('filter_reasons.tsv')) },
+            no_domains: filter_dirs_ch.map { chunk_id, dir, zip_name -> tuple(chunk_id, dir.resolve('no_domains.tsv')) },
+        ]
+    } else {
+        filter_ch = filter_pdb_from_zip(withZipIndex(chunked_ids_mapping_ch), params.min_chain_residues)
+    }
+    filtered_ids_ch = filter_ch.filtered
     
     // =========================================
     // PHASE 2: Domain Prediction
     // =========================================
 
     // Rechunk for ted_segmentation using heavy_chunk_size. First, take the filtered output and return to 2-part tuple [chunk_id <tab> zip_name]
+    // The residue counts from the filter are carried as a third column for cost-aware chunking,
+    // and with params.dedup the coordinate hash as a fourth column.
     filtered_two_part_ch = filtered_ids_ch
-        .flatMap { chunk_id, filtered_file, zip_name ->
-            filtered_file.text
+        .flatMap { chunk_id, filtered_file, zip_name, residue_counts_file ->
+            residue_counts_file.text
                 .readLines()
                 .findAll { it.trim() }
-                .collect { id -> "${id.trim()}\t${zip_name}" }
+                .collect { line ->
+                    def cols = line.trim().split('\t')
+                    ([cols[0], zip_name] + cols.drop(1).toList()).join('\t')
+                }
         }
         .collectFile(
             name: 'filtered_af_ids.txt', // Write the chunks to an output file
@@ -281,68 +406,143 @@ workflow {
             storeDir: "${params.results_dir}/intermediate"
         )
 
+    // With params.dedup only one representative per coordinate hash (within a zip) is segmented.
+    segmentation_ids_ch = filtered_two_part_ch
+    if (params.dedup) {
+        dedup_ch = plan_deduplication(filtered_two_part_ch, params.chunk_cost_coefficients)
+        segmentation_ids_ch = dedup_ch.representatives
+    }
+
     // Use process chunk_ids_by_zip to split filtered_af_ids.txt into heavy_chunk_size chunks within zips, assigning the 3-part tuple [chunk_id, chunk_file, zip_name].
-    heavy_chunks = heavy_chunk_by_zip(filtered_two_part_ch, params.heavy_chunk_size, file(params.chunk_by_zip_script))
+    heavy_chunks = heavy_chunk_by_zip(segmentation_ids_ch, params.heavy_chunk_size, file(params.chunk_by_zip_script), external_sort_script, params.chunk_cost_model, params.chunk_cost_coefficients, params.giant_residues, params.giant_chunk_size)
     
     // Create heavy_chunk_ch as a channel from the process output
     heavy_chunk_ch = heavy_chunks.chunk_mapping
     .splitCsv(header: true, sep: '\t')
     .map { row ->
-        tuple(row.chunk_id as int, file(row.chunk_file), file("${params.input_zip_dir}/${row.zip_name}"))
+        tuple(row.chunk_id as int, file(row.chunk_file), file("${params.input_zip_dir}/${row.zip_name}"), planSlice(row))
     }
-    
+
+    // Chains above params.giant_residues are chunked separately (empty unless giant_residues > 0)
+    giant_chunk_ch = heavy_chunks.giant_chunk_mapping
+    .splitCsv(header: true, sep: '\t')
+    .map { row ->
+        tuple(row.chunk_id as int, file(row.chunk_file), file("${params.input_zip_dir}/${row.zip_name}"), planSlice(row))
+    }
+
     // Finally run the ted_segmentation which now includes the extract from zip code. Again removed pdb_zip_ch.
-    segmentation_ch = run_ted_segmentation(heavy_chunk_ch)
+    // Giant chunks run in their own lane (run_ted_segmentation_giant) with more memory and a longer time limit.
+    if (params.segmentation_cache_dir) {
+        // Every chain is looked up in the segmentation cache by its coordinate hash first. Only the misses are segmented,
+        // and the cached rows of the hits are merged back into each chunk's outputs; a chunk of hits only skips segmentation.
+        // The cache is the set of shards written by earlier runs; this run's new entries go to its own shard at the end.
+        def cache_dir = file(params.segmentation_cache_dir)
+        cache_dir.mkdirs()
+        def cache_tag = params.segmentation_cache_tag ?: params.container_tag_name
+        // Shards compacted into another run's shard (listed in its <session id>.compacted.txt) are skipped and removed.
+        // The list of this run is ignored, so a resumed run stages the same shards as the run it resumes.
+        def compacted_lists = files("${cache_dir}/*.compacted.txt").findAll {
+            it.name != "${workflow.sessionId}.compacted.txt" && file("${cache_dir}/${it.name - '.compacted.txt'}.sqlite").exists()
+        }
+        def compacted = compacted_lists.collectMany { it.readLines().findAll { name -> name } } as Set
+        def cache_shards = files("${cache_dir}/*.sqlite").findAll { it.baseName != "${workflow.sessionId}" }
+        cache_shards.findAll { it.name in compacted }.each { it.delete() }
+        compacted_lists.each { it.delete() }
+        cache_shards = cache_shards.findAll { !(it.name in compacted) }
+
+        // [chunk_id, hits, keys, misses, zip_name], split by whether any chain is left to segment
+        def splitLookup = { lookup ->
+            lookup.hits
+                .join(lookup.misses)
+                .branch { chunk_id, hits, keys, misses, zip_name ->
+                    segment: misses.size() > 0
+                    cached: true
+                }
+        }
+        def missesOf = { ch ->
+            ch.map { chunk_id, hits, keys, misses, zip_name -> tuple(chunk_id, misses, file("${params.input_zip_dir}/${zip_name}"), []) }
+        }
+        normal_lookup_ch = splitLookup(lookup_segmentation_cache(withZipIndex(heavy_chunk_ch), cache_shards, cache_tag))
+        giant_lookup_ch = splitLookup(lookup_segmentation_cache_giant(withZipIndex(giant_chunk_ch), cache_shards, cache_tag))
+
+        normal_segmentation_ch = run_ted_segmentation(withZipIndex(missesOf(normal_lookup_ch.segment)), zip_index_module)
+        giant_segmentation_ch = run_ted_segmentation_giant(withZipIndex(missesOf(giant_lookup_ch.segment)), zip_index_module)
+
+        segmented_ch = normal_segmentation_ch.chainsaw.mix(giant_segmentation_ch.chainsaw)
+            .join(normal_segmentation_ch.merizo.mix(giant_segmentation_ch.merizo))
+            .join(normal_segmentation_ch.unidoc.mix(giant_segmentation_ch.unidoc))
+            .join(normal_segmentation_ch.consensus.mix(giant_segmentation_ch.consensus).map { chunk_id, consensus_file, zip_name -> tuple(chunk_id, consensus_file) })
+            .map { chunk_id, chainsaw, merizo, unidoc, consensus -> tuple(chunk_id, [chainsaw, merizo, unidoc, consensus]) }
+        merged_ch = merge_segmentation_cache(
+            normal_lookup_ch.segment.mix(giant_lookup_ch.segment)
+                .map { chunk_id, hits, keys, misses, zip_name -> tuple(chunk_id, hits, keys, zip_name) }
+                .join(segmented_ch)
+                .mix(
+                    normal_lookup_ch.cached.mix(giant_lookup_ch.cached)
+                        .map { chunk_id, hits, keys, misses, zip_name -> tuple(chunk_id, hits, keys, zip_name, []) }
+                )
+        )
+        def max_shards = params.segmentation_cache_max_shards
+        def compact_shards = max_shards > 0 && cache_shards.size() + 1 > max_shards ? cache_shards : []
+        update_segmentation_cache(merged_ch.new_entries.map { it[1] }.collect(), cache_tag, compact_shards)
+
+        segmentation_ch = [
+            chainsaw : merged_ch.chainsaw,
+            merizo   : merged_ch.merizo,
+            unidoc   : merged_ch.unidoc,
+            consensus: merged_ch.consensus,
+        ]
+    } else {
+        normal_segmentation_ch = run_ted_segmentation(withZipIndex(heavy_chunk_ch), zip_index_module)
+        giant_segmentation_ch = run_ted_segmentation_giant(withZipIndex(giant_chunk_ch), zip_index_module)
+
+        segmentation_ch = [
+            chainsaw : normal_segmentation_ch.chainsaw.mix(giant_segmentation_ch.chainsaw),
+            merizo   : normal_segmentation_ch.merizo.mix(giant_segmentation_ch.merizo),
+            unidoc   : normal_segmentation_ch.unidoc.mix(giant_segmentation_ch.unidoc),
+            consensus: normal_segmentation_ch.consensus.mix(giant_segmentation_ch.consensus),
+        ]
+    }
+    segmentation_chunk_ch = heavy_chunk_ch.mix(giant_chunk_ch)
+
+    // Copy the results of every representative to its duplicates before chopping; from here on the chunks
+    // hold every filtered chain, as if each had been segmented (ids are read from the fanned-out id files).
+    if (params.dedup) {
+        fanned_ch = fan_out_duplicates(
+            segmentation_chunk_ch
+                .map { chunk_id, id_file, pdb_zip, id_slice -> tuple(chunk_id, id_file, id_slice, pdb_zip.name) }
+                .join(segmentation_ch.chainsaw)
+                .join(segmentation_ch.merizo)
+                .join(segmentation_ch.unidoc)
+                .join(segmentation_ch.consensus.map { chunk_id, consensus_file, zip_name -> tuple(chunk_id, consensus_file) }),
+            dedup_ch.duplicates,
+        )
+        segmentation_chunk_ch = fanned_ch.ids
+            .map { chunk_id, id_file, zip_name -> tuple(chunk_id, id_file, file("${params.input_zip_dir}/${zip_name}"), []) }
+        segmentation_ch = [
+            chainsaw : fanned_ch.chainsaw,
+            merizo   : fanned_ch.merizo,
+            unidoc   : fanned_ch.unidoc,
+            consensus: fanned_ch.consensus,
+        ]
+    }
 
     // =========================================
     // PHASE 3: Results Collection & Filtering
     // =========================================
 
-    // collect the results for chainsaw, merizo and unidoc output - now added sorting to each to help cache performance.
-    collected_chainsaw_ch = segmentation_ch.chainsaw
-        .toSortedList { it -> it[0] }
-        .flatMap { it }
-        .collectFile(
-            name: 'domain_assignments.chainsaw.tsv',
-            sort: false,
-            storeDir: params.results_dir,
-        ) { it[1] }
-
-    collected_merizo_ch = segmentation_ch.merizo
-        .toSortedList { it -> it[0] }
-        .flatMap { it }
-        .collectFile(
-            name: 'domain_assignments.merizo.tsv',
-            sort: false,
-            storeDir: params.results_dir,
-        ) { it[1] }
-
-    collected_unidoc_ch = segmentation_ch.unidoc
-        .toSortedList { it -> it[0] }
-        .flatMap { it }
-        .collectFile(
-            name: 'domain_assignments.unidoc.tsv',
-            sort: false,
-            storeDir: params.results_dir,
-        ) { it[1] }
-
-    // collect the results for the consensus output - note: this channel drives the rest of the workflow.
-    // TODO: current behaviour (storeDir) writes to a permanent file in results. Enhancement: update to use a cached work directory.
-    collected_consensus_ch = segmentation_ch.consensus
-        .toSortedList { it -> it[0] }
-        .flatMap { it }
-        .collectFile(
-            name: 'domain_assignments.consensus.tsv',
-            sort: false,
-            storeDir: params.results_dir,
-        ) { it[1] }
+    // The chainsaw, merizo, unidoc and consensus outputs are collected with the other per-chunk outputs (see PHASE 7).
+    // Chains dropped by the pLDDT pre-screen are added as consensus rows without domains (empty files when it is off).
+    consensus_chunks_ch = segmentation_ch.consensus
+        .map { chunk_id, consensus_file, zip_name -> tuple(chunk_id, consensus_file) }
+        .mix(filter_ch.no_domains)
 
     // =========================================
     // PHASE 4: Post-Consensus Processing
     // =========================================
     // Chunk consensus directly from cached segmentation outputs.
     // Avoid workflow-level collectFile/storeDir here so strict resume is not invalidated by rewritten result files.
-    light_chunks = light_chunk_consensus_by_zip(segmentation_ch.consensus, params.light_chunk_size, file(params.light_chunk_consensus_by_zip_script))
+    light_chunks = light_chunk_consensus_by_zip(segmentation_ch.consensus, params.light_chunk_size, file(params.light_chunk_consensus_by_zip_script), external_sort_script)
 
     // Rebuild the 3-part tuple [chunk_id, chunk_file, zip_file] from per-parent mapping files.
     // Prefix child chunk_id with parent chunk_id to keep IDs globally unique downstream.
@@ -363,86 +563,112 @@ workflow {
         }
 
     // Chop pdbs in parallel using chunks and extracting from zip on-the-fly. Removed pdb_zip_ch and replaced with the 3-part tuple
-    chopped_pdb_ch = chop_pdb_from_zip(light_chunk_ch)
+    // With params.worker_batch_size > 0 the light per-chunk tasks run in batches of that many chunks, each batch in one
+    // chunk_worker.py process; the outputs are split back into per-chunk tuples. Chopping is batched per input zip,
+    // which is staged once per batch and read through one open zip index.
+    def inWorkerBatches = { ch, task_name ->
+        ch.buffer(size: params.worker_batch_size, remainder: true)
+            .map { batch -> tuple(task_name, batch.collect { it[0] }, batch.collect { it[1] }) }
+    }
+    def perChunk = { ch ->
+        ch.flatMap { files -> (files instanceof List ? files : [files]).collect { f -> tuple(f.parent.name, f) } }
+    }
+    if (params.worker_batch_size) {
+        chop_batches_ch = withZipIndex(light_chunk_ch)
+            .map { id, consensus_chunk, pdb_zip, zip_index -> tuple(pdb_zip.name, id, consensus_chunk, pdb_zip, zip_index) }
+            .groupTuple(by: 0, size: params.worker_batch_size, remainder: true)
+            .map { zip_name, ids, consensus_chunks, pdb_zips, zip_indexes -> tuple(ids, consensus_chunks, pdb_zips[0], zip_indexes[0]) }
+        chopped_pdb_ch = perChunk(run_chop_worker(chop_batches_ch))
+    } else {
+        chopped_pdb_ch = chop_pdb_from_zip(withZipIndex(light_chunk_ch))
+    }
+
+    // Script and modules for STRIDE summaries (run_stride or domain_analysis)
+    stride_summary_script_ch = file(
+        "${workflow.projectDir}/../docker/script/create_stride_summary.py", // this becomes input:stride_summary_script
+        checkIfExists: true)
+
+    // With params.domain_analysis = 'fused' each chopped archive is extracted once and md5, STRIDE, globularity
+    // and pLDDT run concurrently in one task; its outputs replace those of the separate processes below.
+    if (params.domain_analysis == 'fused') {
+        analysis_modules_ch = files(
+            "${workflow.projectDir}/../docker/script/{fetch_avg_plDDT,pdb_to_md5,secondary_structure,pdb_records,chopped_archive,zip_index}.py",
+            checkIfExists: true)
+        domain_analysis_ch = domain_analysis(chopped_pdb_ch, stride_summary_script_ch, analysis_modules_ch)
+    }
         
     // Generate MD5 hashes for domains added a new file and script_ch - NEW CODE
-    md5_chunks_ch = create_md5(chopped_pdb_ch)
-    collected_md5_ch = md5_chunks_ch
-        .toSortedList { it -> it[0] }
-        .flatMap{ it }
-        .collectFile(
-            name: "all_md5.tsv",
-            keepHeader: true,
-            skip: 1,
-            sort: false,
-            storeDir: params.results_dir,
-        ) { it[1] }
+    if (params.md5_engine == 'store') {
+        // Chain sequences are extracted once per segmentation chunk, then every domain in that chunk's
+        // consensus is sliced out of its parent chain sequence with the consensus boundaries.
+        sequence_store_ch = build_sequence_store(withZipIndex(segmentation_chunk_ch))
+        md5_chunks_ch = create_md5_from_store(
+            segmentation_ch.consensus
+                .map { chunk_id, consensus_file, zip_name -> tuple(chunk_id, consensus_file) }
+                .join(sequence_store_ch)
+        )
+    } else if (params.domain_analysis == 'fused') {
+        md5_chunks_ch = domain_analysis_ch.md5
+    } else if (params.md5_engine == 'python' && params.worker_batch_size) {
+        md5_chunks_ch = perChunk(run_md5_worker(inWorkerBatches(chopped_pdb_ch, 'md5')))
+    } else if (params.md5_engine == 'python') {
+        md5_chunks_ch = create_md5_batch(chopped_pdb_ch)
+    } else {
+        md5_chunks_ch = create_md5(chopped_pdb_ch)
+    }
 
     // =========================================
     // PHASE 5: Structure Analysis
     // =========================================
 
     // Run STRIDE analysis
-    stride_summary_script_ch = file(
-        "${workflow.projectDir}/../docker/script/create_stride_summary.py", // this becomes input:stride_summary_script
-        checkIfExists: true)
-    
-    stride_summaries_ch = run_stride(chopped_pdb_ch, stride_summary_script_ch)
+    if (params.domain_analysis == 'fused') {
+        stride_summaries_ch = domain_analysis_ch.stride
+    } else {
+        // Modules imported by create_stride_summary.py when params.stride_engine = 'numpy'
+        stride_engine_modules_ch = files(
+            "${workflow.projectDir}/../docker/script/{secondary_structure,pdb_records}.py",
+            checkIfExists: true)
+
+        stride_summaries_ch = run_stride(chopped_pdb_ch, stride_summary_script_ch, stride_engine_modules_ch)
+    }
 
-    collected_stride_summaries_ch = stride_summaries_ch
-        .toSortedList { it -> it[0] }
-        .flatMap{ it }
-        .collectFile(
-            name: "all_stride_summaries.tsv",
-            keepHeader: true,
-            skip: 1,
-            sort: false,
-            storeDir: params.results_dir,
-        ) { it[1] } // use file name to collect
-    
     // Run globularity analysis
-    globularity_ch = run_measure_globularity(chopped_pdb_ch)
+    globularity_ch = params.domain_analysis == 'fused' ? domain_analysis_ch.globularity : run_measure_globularity(chopped_pdb_ch)
     // globularity_ch.view { "globularity_ch: " + it }
-    // no flatten as only a single file per chunk
-    collected_globularity_ch = globularity_ch
-        .toSortedList { it -> it[0] }
-        .flatMap{ it }
-        .collectFile(
-            name: "all_domain_globularity.tsv",
-            keepHeader: true,
-            skip: 1,
-            sort: false,
-            storeDir: params.results_dir,            
-        ) { it[1] } // use file name to collect
 
     // Run domain quality
     domain_quality_ch = run_domain_quality(chopped_pdb_ch)
 
-    collected_domain_quality_ch = domain_quality_ch
-        .toSortedList { it -> it[0] }
-        .flatMap{ it }
-        .collectFile(
-            name: "all_domain_quality.csv",
-            keepHeader: true,
-            skip: 1,
-            sort: false,
-            storeDir: params.results_dir,
-        ) { it[1] } // use file name to collect
-
     // Run pLDDT analysis
-    plddt_ch = run_plddt(chopped_pdb_ch)
+    if (params.plddt_mode == 'store') {
+        // Per-chain pLDDT vectors are extracted once per segmentation chunk, then each light chunk's
+        // domains are answered by slicing its parent chunk's store with the consensus boundaries.
+        plddt_store_ch = build_plddt_store(withZipIndex(segmentation_chunk_ch))
+        light_consensus_ch = light_chunks.light_chunk_mapping
+            .flatMap { parent_chunk_id, mapping_file ->
+                mapping_file
+                    .readLines()
+                    .drop(1)
+                    .findAll { line -> line.trim() }
+                    .collect { line ->
+                        def cols = line.split('\t')
+                        tuple(parent_chunk_id, "${parent_chunk_id}_${cols[0]}", file(cols[1]))
+                    }
+            }
+        plddt_ch = run_plddt_from_store(
+            light_consensus_ch
+                .combine(plddt_store_ch, by: 0)
+                .map { parent_chunk_id, id, consensus_chunk, plddt_store -> tuple(id, consensus_chunk, plddt_store) }
+        )
+    } else if (params.domain_analysis == 'fused') {
+        plddt_ch = domain_analysis_ch.plddt
+    } else if (params.worker_batch_size) {
+        plddt_ch = perChunk(run_plddt_worker(inWorkerBatches(chopped_pdb_ch, 'plddt')))
+    } else {
+        plddt_ch = run_plddt(chopped_pdb_ch)
+    }
     // plddt_ch.view { "plddt_ch: " + it }
-    // no flatten as only a single file per chunk
-    collected_plddt_ch = plddt_ch
-        .toSortedList { it -> it[0] }
-        .flatMap{ it }
-        .collectFile(
-            name: "all_plddt.tsv",
-            sort: false,
-            storeDir: params.results_dir,
-        ) { it[1] } // use file name to collect
-
-    collected_plddt_with_md5_ch = join_plddt_md5(collected_plddt_ch, collected_md5_ch)
 
     // =========================================
     // PHASE 6: Run foldseek
@@ -463,23 +689,72 @@ workflow {
     
     // Now pass the convertalis .m8 and python script as intputs to the parsing process
     fs_parsed_ch = foldseek_process_results(fs_m8_ch, ch_lookup_file, ch_parser_script)
-    
-    // Finally combine results together with a similar collectFile statement as used above
-    foldseek_ch = fs_parsed_ch
-        .toSortedList { it -> it[0] }
-        .flatMap{ it }
-        .collectFile( 
-            name: 'foldseek_parsed_results.tsv',
-            keepHeader: true,
-            skip: 1,
-            sort: false,
-            storeDir: params.results_dir,
-        ) { it[1] }
 
     // =========================================
     // PHASE 7: Final Assembly
     // =========================================
 
+    // Collects each output's per-chunk files [chunk_id, file] into one file named after it in its storeDir (default
+    // params.results_dir), keeping the header of the first file with keepHeader. With params.collect_mode 'sorted_list'
+    // the files are concatenated in chunk order. With 'merge' every output goes through one merge_sorted_chunks call,
+    // with --header and the output's mergeArgs. Returns [name: collected file channel].
+    def collectChunks = { outputs ->
+        if (params.collect_mode == 'merge') {
+            def merged = merge_sorted_chunks(
+                outputs
+                    .collect { spec -> spec.ch.map { chunk_id, chunk_file -> tuple(spec.name, chunk_id, chunk_file) } }
+                    .inject { a, b -> a.mix(b) },
+                outputs.collectEntries { spec ->
+                    [(spec.name): [
+                        merge_args : [spec.keepHeader ? '--header' : '', spec.mergeArgs ?: ''].join(' ').trim(),
+                        publish_dir: spec.storeDir ?: params.results_dir,
+                    ]]
+                },
+            )
+            return outputs.collectEntries { spec ->
+                [(spec.name): merged.collected.filter { it[0] == spec.name }.map { it[1] }]
+            }
+        }
+        outputs.collectEntries { spec ->
+            def options = [name: spec.name, sort: false, storeDir: spec.storeDir ?: params.results_dir]
+            if (spec.keepHeader) {
+                options += [keepHeader: true, skip: 1]
+            }
+            [(spec.name): spec.ch.toSortedList { it -> it[0] }.flatMap { it }.collectFile(options) { it[1] }]
+        }
+    }
+
+    // Collect the per-chunk outputs into one file each. The filter outcome of every input id (kept, or the reason
+    // it was skipped) is kept in the intermediate results. The consensus file drives the final assembly.
+    // TODO: current behaviour (storeDir) writes to a permanent file in results. Enhancement: update to use a cached work directory.
+    collected = collectChunks([
+        [ch: uniprot_data_ch, name: 'all_taxonomy.tsv', keepHeader: true],
+        [ch: filter_ch.reasons, name: 'filter_reasons.tsv', keepHeader: true, storeDir: "${params.results_dir}/intermediate"],
+        [ch: segmentation_ch.chainsaw, name: 'domain_assignments.chainsaw.tsv'],
+        [ch: segmentation_ch.merizo, name: 'domain_assignments.merizo.tsv'],
+        [ch: segmentation_ch.unidoc, name: 'domain_assignments.unidoc.tsv'],
+        [ch: consensus_chunks_ch, name: 'domain_assignments.consensus.tsv'],
+        [ch: md5_chunks_ch, name: 'all_md5.tsv', keepHeader: true],
+        [ch: stride_summaries_ch, name: 'all_stride_summaries.tsv', keepHeader: true],
+        [ch: globularity_ch, name: 'all_domain_globularity.tsv', keepHeader: true],
+        [ch: domain_quality_ch, name: 'all_domain_quality.csv', keepHeader: true, mergeArgs: '--field_sep , --key_field 1'],
+        [ch: plddt_ch, name: 'all_plddt.tsv'],
+        [ch: fs_parsed_ch, name: 'foldseek_parsed_results.tsv', keepHeader: true],
+    ])
+    collected_taxonomy_ch = collected['all_taxonomy.tsv']
+    collected_chainsaw_ch = collected['domain_assignments.chainsaw.tsv']
+    collected_merizo_ch = collected['domain_assignments.merizo.tsv']
+    collected_unidoc_ch = collected['domain_assignments.unidoc.tsv']
+    collected_consensus_ch = collected['domain_assignments.consensus.tsv']
+    collected_md5_ch = collected['all_md5.tsv']
+    collected_stride_summaries_ch = collected['all_stride_summaries.tsv']
+    collected_globularity_ch = collected['all_domain_globularity.tsv']
+    collected_domain_quality_ch = collected['all_domain_quality.csv']
+    collected_plddt_ch = collected['all_plddt.tsv']
+    foldseek_ch = collected['foldseek_parsed_results.tsv']
+
+    collected_plddt_with_md5_ch = join_plddt_md5(collected_plddt_ch, collected_md5_ch)
+
     // Transform consensus with structure data
     transformed_consensus_ch = transform_consensus(
         collected_consensus_ch,
@@ -510,6 +785,11 @@ workflow {
         foldseek_ch,
     )
 
+    // Incremental mode: final_results.tsv is the previous results updated with the results of the delta
+    if (params.previous_results) {
+        final_results_ch = merge_final_results(file(params.previous_results), final_results_ch, delta_ch.delta).merged
+    }
+
     // ==========================================
     // PHASE 8: Completion and output Information
     // ==========================================
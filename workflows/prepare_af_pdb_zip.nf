@@ -60,6 +60,7 @@ workflow {
     af_ids_ch = normalise_af_ids(channel.value(file(params.af_ids_file)))
     converter_script_ch = channel.value(file(params.bcif_zip_converter_script))
     download_script_ch = channel.value(file(params.bcif_download_script))
+    zip_index_module_ch = channel.value(file("${workflow.projectDir}/../docker/script/zip_index.py", checkIfExists: true))
 
     // Use either user-provided BCIF zip, or download from AlphaFold DB
     if (params.bcif_zip_file) {
@@ -72,7 +73,7 @@ workflow {
             .join(af_ids_for_conversion_ch)
             .map { chunk_id, bcif_zip, af_ids_for_conversion_file -> [chunk_id, bcif_zip, af_ids_for_conversion_file] }
 
-        prepare_pdb_from_af_bcif(prepare_input_ch, converter_script_ch)
+        prepare_pdb_from_af_bcif(prepare_input_ch, converter_script_ch, zip_index_module_ch)
     } else {
         chunked_af_ids_ch = af_ids_ch
             .splitText(by: prep_chunk_size, file: true)
@@ -89,7 +90,7 @@ workflow {
             [chunk_id, bcif_zip, downloaded_ids]
         }
 
-        prepare_pdb_from_af_bcif(prepare_input_ch, converter_script_ch)
+        prepare_pdb_from_af_bcif(prepare_input_ch, converter_script_ch, zip_index_module_ch)
         download_rows_ch = downloads_ch.toSortedList { row -> row[0] }
 
         download_rows_ch